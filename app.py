@@ -2,16 +2,32 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import os
-from datetime import date, timedelta
-from pyecharts import options as opts
-from pyecharts.charts import Tree
-from pyecharts.commons.utils import JsCode
-from streamlit_echarts import st_pyecharts
-import plotly.express as px
-import gspread
+import json
+import functools
+import logging
+from datetime import date, datetime, time, timedelta
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 차트 라이브러리(pyecharts, streamlit_echarts, plotly)와 gspread는 필요한 탭/백엔드에서만 import
+from celltracker import telemetry
+from celltracker.boxes import BOX_LAYOUTS, OccupancyIndex, position_grid, style_grid
+from celltracker.core import (ALL_SHEETS, BatchRejected, box_layouts, get_inventory, lineage_view, open_history,
+                              open_storage)
+from celltracker.inventory import SEPARATOR
+from celltracker.growth import (ExpansionPlan, GrowthTable, parse_densities, plan_grid, predict_schedule,
+                                simulate_expansion, time_to_reach_target)
+from celltracker.bulk import freeze_batch, read_upload, validate_batch
+from celltracker.lineage import (LineageIndex, build_tree, count_descendants, limit_tree, node_tooltip,
+                                 normalize_ids)
+from celltracker.rollups import Rollup
+from celltracker.schema import coerce
+from celltracker.search import SearchIndex
+from celltracker.table import PAGE_SIZES, page_bounds, style_by_status
+from celltracker.storage import empty_frame
+
+log = logging.getLogger("celltracker.app")
 
 # ------------------ CONFIG ------------------
-DATA_FILE = "tude_data.xlsx"
 st.set_page_config(
     page_title='Cell Line Manager', 
     layout='wide',
@@ -21,15 +37,38 @@ st.set_page_config(
     }
 )
 
+# ------------------ TELEMETRY ------------------
+def get_telemetry_conf() -> dict:
+    """[telemetry] admin = true, log = "telemetry.jsonl" | "stderr", level = "INFO", read_quota = 60, write_quota = 60
+    (환경변수 CELLTRACKER_ADMIN, CELLTRACKER_TELEMETRY_LOG 우선)"""
+    try:
+        conf = dict(st.secrets.to_dict().get("telemetry", {}))
+    except Exception:
+        conf = {}
+    if os.environ.get("CELLTRACKER_ADMIN"):
+        conf["admin"] = os.environ["CELLTRACKER_ADMIN"].lower() not in ("0", "false", "no")
+    if os.environ.get("CELLTRACKER_TELEMETRY_LOG"):
+        conf["log"] = os.environ["CELLTRACKER_TELEMETRY_LOG"]
+    return conf
+
+def session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else None
+
+# rerun마다 단계별 시간(span)과 Sheets API 호출을 기록 — 로그는 JSON 한 줄씩, 관리자 패널에서도 확인
+telemetry_conf = get_telemetry_conf()
+telemetry.set_session_provider(session_id)
+telemetry.configure(telemetry_conf.get("log"), telemetry_conf.get("level", "INFO"),
+                    telemetry_conf.get("read_quota"), telemetry_conf.get("write_quota"))
+telemetry.begin("rerun")
+
 # ------------ Cell Health Data ------------------
 growth_file = "growth_rate_20220907.csv"
-if os.path.exists(growth_file):
-    try:
-        growth_df = pd.read_csv(growth_file)
-    except:
-        growth_df = pd.read_csv(growth_file)
-else:
-    growth_df = pd.DataFrame()
+
+@st.cache_resource(show_spinner=False)
+def load_growth_table(path: str = growth_file) -> GrowthTable:
+    # Growth Prediction 탭을 처음 열 때 한 번만 읽고 model_name / model_id로 색인
+    return GrowthTable.from_csv(path)
 
 # ------------------ THEME & STYLING ------------------
 # Custom CSS for modern look
@@ -128,142 +167,255 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def connect_gsheet(sheet_name: str):
-    gc = gspread.service_account_from_dict(st.secrets["gspread"])
-    sh = gc.open_by_key("1as7cVD4JwZ5A7Vo8XmY2DEjEhQNHkWhg_8awtyx5M7E")
-    worksheet = sh.worksheet(sheet_name)
-    return worksheet
+def get_secrets() -> dict:
+    try:
+        return st.secrets.to_dict()
+    except Exception:  # secrets.toml 없음 -> 로컬 SQLite
+        return {}
+
+def get_storage():
+    """저장소 선택: [storage] backend = "gsheet" | "sqlite" (환경변수 CELLTRACKER_BACKEND 우선)"""
+    return open_storage(get_secrets())
+
+def get_tube_inventory():
+    # 변환된 프레임과 색인은 데이터 버전마다 한 번만 만들어 모든 세션(과 HTTP 서비스)이 공유
+    inventory = get_inventory(get_storage())
+    inventory.configure_boxes(*get_box_layouts())
+    # 모든 저장을 변경 기록(celltracker-history.db)에 남긴다
+    inventory.configure_history(open_history(get_secrets()))
+    return inventory
+
+def current_actor():
+    """사이드바에 입력한 이름 (변경 기록의 Actor)"""
+    return st.session_state.get("actor", "").strip() or None
+
+def get_google_sheet_names():
+    # Google Sheet(또는 로컬 DB) 내 시트 목록: 캐시된 목록을 바로 쓰고, 1분이 지나면 백그라운드에서 갱신
+    with telemetry.span("sheet_names"):
+        return get_tube_inventory().sheet_names()
 
 # ------------------ LOAD / SAVE ------------------
+ALL_SHEETS_LABEL = "🌐 All Cell Lines"
+
+def sheet_label(sheet_name: str) -> str:
+    return ALL_SHEETS_LABEL if sheet_name == ALL_SHEETS else sheet_name
+
+def load_tubes(sheet_name: str = "Default"):
+    """(typed frame, validation report) for a sheet. 프레임은 캐시와 공유되므로 직접 수정하지 말 것"""
+    with telemetry.span("load", sheet=sheet_name) as fields:
+        try:
+            df, report = get_tube_inventory().tubes(sheet_name)
+        except Exception as e:
+            # 할당량 초과(429) 등은 로그의 error 필드로 남는다
+            fields["error"] = str(e)
+            st.warning(f"⚠️ 데이터 로딩 실패: {e}")
+            df, report = coerce(empty_frame())
+        fields["rows"] = len(df)
+    return df, report
+
 def load_data(sheet_name: str = "Default") -> pd.DataFrame:
-    try:
-        ws = connect_gsheet(sheet_name)
-        data = ws.get_all_records()
-        df = pd.DataFrame(data)
-        if "Inuse" not in df.columns:
-            df["Inuse"] = "No"
-        return df
-    except Exception as e:
-        st.warning(f"⚠️ 데이터 로딩 실패: {e}")
-        columns = ["Tube ID", "Cell Name", "Passage", "Parent Tube", "Position", "Date", 
-                   "Tray", "Box", "Lot", "Mycoplasma", "Operator", "Info", "Inuse"]
-        return pd.DataFrame(columns=columns)
+    return load_tubes(sheet_name)[0]
 
-def save_data(df: pd.DataFrame, sheet_name: str = "Default"):
+def update_tubes(sheet_name: str, tube_ids, field: str, value) -> bool:
+    """Tube ID로 최신 프레임에 적용해서 저장 (이 rerun이 읽은 뒤 다른 세션이 바꾼 내용을 덮어쓰지 않음).
+    Google Sheets는 쓰기 큐를 거쳐 백그라운드에서 전송"""
     try:
-        ws = connect_gsheet(sheet_name)
-        
-        # ✅ Date 타입을 문자열로 변환
-        if "Date" in df.columns:
-            df["Date"] = df["Date"].astype(str)
-        
-        # ws.clear()  # 선택적으로 사용
-        ws.update([df.columns.values.tolist()] + df.values.tolist())
+        get_tube_inventory().update(sheet_name, tube_ids, field, value, actor=current_actor())
+        return True
+    except (KeyError, ValueError) as e:
+        st.error(f"❌ {e}")
     except Exception as e:
         st.error(f"❌ 저장 실패: {e}")
+    return False
 
-# ------------------ Cell Conf Cal ------------------
-def time_to_reach_target(initial_density: float,
-                         doubling_time: float,
-                         target_density: float) -> timedelta:
-    """초기 농도, doubling time, 목표 농도로부터 걸리는 시간 계산"""
-    n_doublings = np.log2(target_density / initial_density)
-    hours = n_doublings * doubling_time
-    return timedelta(hours=hours)
+def get_data_version(sheet_name: str):
+    try:
+        return get_tube_inventory().version(sheet_name)
+    except Exception:
+        return None
 
+def unless_version_unknown(cached):
+    """버전을 모르면(None) 캐시를 건너뛰고 바로 계산 — (시트, None) 항목은 데이터가 바뀌어도 계속 쓰이므로"""
+    @functools.wraps(cached.__wrapped__)
+    def call(sheet_name: str, data_version, *args, **kwargs):
+        func = cached if data_version is not None else cached.__wrapped__
+        return func(sheet_name, data_version, *args, **kwargs)
+    return call
 
-# ------------------ BUILD TREE ------------------
-def build_tree(df: pd.DataFrame) -> list:
-    nodes = {}
-    parent_map = {}
+def get_lineage_index(sheet_name: str, data_version, df: pd.DataFrame) -> LineageIndex:
+    # 데이터 버전이 바뀔 때만 다시 계산
+    return get_tube_inventory().lineage_index(sheet_name, data_version, df)
 
-    df = df.copy()
-    df["Tube ID"] = df["Tube ID"].astype(str).str.strip().str.upper()
-    df["Parent Tube"] = df["Parent Tube"].astype(str).str.strip().str.upper()
-    df["Parent Tube"] = df["Parent Tube"].replace(["NONE", "NAN", ""], np.nan)
+@unless_version_unknown
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_occupancy_chart(sheet_name: str, data_version, _occupancy: OccupancyIndex):
+    """(summary table, plotly figure) — 데이터 버전마다 한 번"""
+    import plotly.express as px
+    box_summary = _occupancy.summary()
+    if box_summary.empty:
+        return box_summary, None
+    fig = px.bar(
+        box_summary, 
+        x="Box", 
+        y=["Used", "Remaining"],
+        color_discrete_map={"Used": "#3498db", "Remaining": "#ecf0f1"},
+        title="Box Capacity Usage",
+        barmode="stack",
+        height=300,
+        labels={"value": "Tubes", "variable": "Status"},
+        facet_col="Tray" if box_summary["Tray"].nunique() > 1 else None
+    )
+    fig.update_layout(
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=20, r=20, t=60, b=20),
+    )
+    return box_summary, fig
 
+def resolve_tube(text: str, lineage: LineageIndex = None, view: pd.DataFrame = None) -> str:
+    """입력한 Tube ID (대소문자/공백 무시) -> 저장된 ID; 없거나 view 에서 걸러졌으면 경고하고 ""
+    (Tube ID 목록 전체를 selectbox 로 보내지 않기 위해 입력을 인덱스/프레임에서 찾는다)"""
+    tube_id = text.strip().upper()
+    if not tube_id:
+        return ""
+    if lineage is not None and tube_id not in lineage:
+        st.warning(f"Unknown Tube ID: {text.strip()}")
+        return ""
+    if view is not None:
+        ids = view["Tube ID"]
+        hits = np.flatnonzero((normalize_ids(ids) == tube_id).to_numpy())
+        if len(hits) == 0:
+            st.warning(f"{tube_id} is hidden by the current filters" if lineage is not None
+                       else f"Unknown Tube ID: {text.strip()}")
+            return ""
+        return str(ids.iat[hits[-1]])
+    return tube_id
 
-    for _, row in df.iterrows():
-        tube_id = row["Tube ID"]
-        parent_tube = row.get("Parent Tube", np.nan)
-        passage = int(row["Passage"])
+def show_dataframe(data, span: str = "dataframe", **kwargs):
+    """st.dataframe + 타이밍 span (Styler 적용과 직렬화 포함) 과 보내는 데이터 크기(근사치)"""
+    frame = getattr(data, "data", data)
+    with telemetry.span(span, rows=len(frame), payload_bytes=telemetry.frame_bytes(frame)):
+        return st.dataframe(data, **kwargs)
 
-        date_value = pd.to_datetime(row.get("Date", ""), errors='coerce')
-        date_str = date_value.strftime('%Y-%m-%d') if not pd.isna(date_value) else ""
+@unless_version_unknown
+@st.cache_resource(max_entries=64, show_spinner=False)
+def get_position_grid(sheet_name: str, data_version, tray: str, box: str, layout, _box_df: pd.DataFrame):
+    # (Tube ID 격자, 스타일 격자); Styler는 세션마다 새로 만든다
+    return position_grid(_box_df, layout)
 
-        # Enhanced tooltip with more detailed styling
-        tooltip = f"""
-        <div style='padding: 10px; font-size: 13px; line-height: 1.5; background-color: #f8f9fa; border-radius: 6px; border: 1px solid #e0e0e0;'>
-            <div style='font-weight: bold; font-size: 15px; margin-bottom: 5px; color: #2c3e50; border-bottom: 1px solid #e0e0e0; padding-bottom: 5px;'>
-                {tube_id} (P{passage})
-            </div>
-            <div style='display: grid; grid-template-columns: auto 1fr; gap: 5px;'>
-                <div style='color: #7f8c8d;'>Date:</div>
-                <div>{date_str}</div>
-                
-                <div style='color: #7f8c8d;'>Location:</div>
-                <div>{row.get("Tray", "")} / {row.get("Box", "")} / {row.get("Position", "")}</div>
-                
-                <div style='color: #7f8c8d;'>Lot:</div>
-                <div>{row.get("Lot", "")}</div>
-                
-                <div style='color: #7f8c8d;'>Mycoplasma:</div>
-                <div>{row.get("Mycoplasma", "")}</div>
-                
-                <div style='color: #7f8c8d;'>Operator:</div>
-                <div>{row.get("Operator", "")}</div>
-            </div>
-            <div style='margin-top: 5px; border-top: 1px solid #e0e0e0; padding-top: 5px;'>
-                <div style='color: #7f8c8d;'>Info:</div>
-                <div>{row.get("Info", "")}</div>
-            </div>
-        </div>
-        """
-
-        # 상태에 따라 색상 조정 - 더 세련된 색상
-        color = "#3498db"  # Basic blue
-        if str(row.get("Inuse", "")).lower() == "yes":
-            color = "#e74c3c"  # Use red
-        elif str(row.get("Inuse", "")).lower() == "no":
-            color = "#2ecc71"  # Not use green
-
-        nodes[tube_id] = {
-            "name": tube_id,
-            "value": tooltip,
-            "children": [],
-            "itemStyle": {"color": color, "borderColor": "#ffffff", "borderWidth": 2},
-            "emphasis": {
-                "itemStyle": {
-                    "borderColor": "#34495e",
-                    "borderWidth": 3,
-                    "shadowBlur": 12,
-                    "shadowColor": "rgba(0, 0, 0, 0.5)"
-                }
-            }
-        }
-
-        if pd.notna(parent_tube):
-            parent_map[tube_id] = parent_tube
-
-    for tube_id, parent in parent_map.items():
-        if parent in nodes:
-            nodes[parent]["children"].append(nodes[tube_id])
-
-    used_as_child = set(parent_map.keys())
-    all_ids = set(nodes.keys())
-    root_ids = all_ids - used_as_child
-    root_nodes = [nodes[tube_id] for tube_id in root_ids]
-
-    tree = [{
-        "name": "ROOT",
-        "value": "Virtual Root",
-        "children": root_nodes,
-        "itemStyle": {"color": "#9b59b6", "borderColor": "#ffffff", "borderWidth": 2}
-    }]
-    return tree
+def get_search_index(sheet_name: str, data_version, df: pd.DataFrame) -> SearchIndex:
+    return get_tube_inventory().search_index(sheet_name, data_version, df)
+
+def get_box_layouts():
+    """박스 규격: [boxes] default = "10x10", [boxes.layouts] "Tray-2/Box-A1" = "8x12" """
+    try:
+        conf = st.secrets.to_dict().get("boxes", {})
+    except Exception:
+        conf = {}
+    return box_layouts(conf)
+
+def get_occupancy(sheet_name: str, data_version, df: pd.DataFrame) -> OccupancyIndex:
+    # 등록할 때는 비트만 갱신하고, 다른 곳에서 데이터가 바뀌었을 때만 다시 만든다
+    return get_tube_inventory().occupancy(sheet_name, data_version, df)
+
+BOX_FILL_LINES = 20
+
+def get_rollup(sheet_name: str, data_version, df: pd.DataFrame) -> Rollup:
+    # 저장할 때 바뀐 행만 반영되는 집계 — 대시보드와 추이 차트는 시트를 다시 훑지 않는다
+    try:
+        return get_tube_inventory().rollup(sheet_name, data_version, df)
+    except Exception:
+        # 증분 집계의 버그를 숨기지 않도록 기록은 남기고, 화면은 전체 재집계로 그린다
+        log.exception("rollup of %s failed; recounting the whole sheet", sheet_name)
+        return Rollup.from_frame(df)
+
+@unless_version_unknown
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_trend_charts(sheet_name: str, data_version, _rollup: Rollup, _capacities: dict = None) -> dict:
+    """추이 차트와 표 — 데이터 버전마다 한 번"""
+    import plotly.express as px
+    layout = dict(margin=dict(l=20, r=20, t=50, b=20), height=320)
+    charts = {}
+    weekly = _rollup.weekly_frozen()
+    if not weekly.empty:
+        charts["weekly"] = px.bar(weekly, x="Week", y="Tubes", title="Tubes Frozen per Week",
+                                  color_discrete_sequence=["#3498db"]).update_layout(**layout)
+    passages = _rollup.passage_distribution()
+    if not passages.empty:
+        charts["passages"] = px.bar(passages, x="Passage", y="Tubes", color="Cell Name", barmode="group",
+                                    title="Passage Distribution per Cell Line").update_layout(**layout)
+    charts["mycoplasma"] = _rollup.mycoplasma_by_lot()
+    fill = _rollup.box_fill(_capacities)
+    if not fill.empty:
+        # 최근에 튜브가 들어간 박스만 (선이 수백 개면 읽을 수 없다)
+        fill["Tray/Box"] = fill["Tray"] + "/" + fill["Box"]
+        recent = fill.groupby("Tray/Box")["Week"].max().nlargest(BOX_FILL_LINES).index
+        fill = fill[fill["Tray/Box"].isin(recent)]
+        y = "Fill" if _capacities else "Tubes"
+        charts["boxes"] = px.line(fill, x="Week", y=y, color="Tray/Box", line_shape="hv", markers=True,
+                                  title=f"Box Fill over Time (last {len(recent)} boxes used)",
+                                  labels={"Fill": "Fill (share of capacity)"}).update_layout(**layout)
+    return charts
+
+def render_trends(selected_sheet: str, tube_df: pd.DataFrame, data_version, rollup: Rollup):
+    capacities = None
+    if selected_sheet != ALL_SHEETS:
+        # 박스 규격은 점유 인덱스에서 (전체 보기에서는 시트마다 같은 이름의 박스가 있을 수 있어 개수만 표시)
+        box_summary = get_occupancy(selected_sheet, data_version, tube_df).summary()
+        capacities = dict(zip(zip(box_summary["Tray"], box_summary["Box"]), box_summary["Capacity"]))
+    with telemetry.span("trends"):
+        charts = get_trend_charts(selected_sheet, data_version, rollup, capacities)
+    left, right = st.columns(2)
+    with left:
+        if "weekly" in charts:
+            st.plotly_chart(charts["weekly"], use_container_width=True)
+        st.markdown("##### 🦠 Mycoplasma-positive Rate per Lot")
+        show_dataframe(charts["mycoplasma"], span="trends.mycoplasma", use_container_width=True, hide_index=True,
+                       height=300, column_config={"Positive Rate": st.column_config.ProgressColumn(
+                           "Positive Rate", format="percent", min_value=0.0, max_value=1.0)})
+    with right:
+        if "passages" in charts:
+            st.plotly_chart(charts["passages"], use_container_width=True)
+        if "boxes" in charts:
+            st.plotly_chart(charts["boxes"], use_container_width=True)
+
+@st.fragment(run_every=2)
+def render_pending_sync(sheet_name: str):
+    storage = get_storage()
+    sync = storage.sync_status(sheet_name)
+    if sync.error:
+        st.error(f"❌ 동기화 실패: {sync.error}")
+        retry_col, discard_col = st.columns(2)
+        if retry_col.button("🔁 Retry sync", key="retry_sync", use_container_width=True):
+            storage.retry_sync(sheet_name)
+            st.rerun(scope="fragment")
+        if discard_col.button("🗑 Discard", key="discard_sync", use_container_width=True):
+            storage.discard_sync(sheet_name)
+            st.rerun()
+    elif sync.pending:
+        st.info(f"⏳ Pending sync ({sync.pending} change{'s' if sync.pending > 1 else ''})")
+    else:
+        # 다 보냈으면 전체를 다시 실행해서 폴링을 멈춘다 (새 데이터 버전도 반영)
+        st.rerun()
+
+def render_sync_status(sheet_name: str):
+    # 쓰기가 대기 중이거나 실패했을 때만 2초마다 확인 — 평소에는 세션마다 폴링하지 않는다
+    sync = get_storage().sync_status(sheet_name)
+    if sync.pending or sync.error:
+        render_pending_sync(sheet_name)
+    elif sync.last_synced:
+        st.caption("✅ All changes saved")
 
 # ------------------ RENDER CHART ------------------
-def render_tree_chart(tree_data: list, title: str = "Cell Lineage Tree"):
+# 노드에 마우스를 올리거나 클릭하면 Python 쪽으로 이벤트 전달 (툴팁은 필요할 때만 렌더링)
+TREE_EVENTS = {
+    "mouseover": "function(params){ return params.data.summaryOf ? null : 'hover:' + params.name; }",
+    "click": "function(params){ return 'open:' + (params.data.summaryOf || params.name); }",
+}
+
+def render_tree_chart(tree_data: list, title: str = "Cell Lineage Tree", key: str = "lineage_chart"):
+    from pyecharts import options as opts
+    from pyecharts.charts import Tree
+    from streamlit_echarts import st_pyecharts
     tree = (
         Tree(init_opts=opts.InitOpts(width="100%", height="700px", bg_color="#ffffff"))
         .add(
@@ -283,7 +435,7 @@ def render_tree_chart(tree_data: list, title: str = "Cell Lineage Tree"):
             ),
             tooltip_opts=opts.TooltipOpts(
                 trigger="item",
-                formatter=JsCode("function(params){ return params.data.value; }"),
+                formatter="{b}",
                 border_color="#e0e0e0",
                 border_width=1,
                 background_color="#ffffff",
@@ -312,11 +464,50 @@ def render_tree_chart(tree_data: list, title: str = "Cell Lineage Tree"):
             tooltip_opts=opts.TooltipOpts(trigger="item")
         )
     )
-    st_pyecharts(tree, height="700px")
+    nodes = sum(1 + count_descendants(node) for node in tree_data)
+    with telemetry.span("tree.render", nodes=nodes) as fields:
+        fields["payload_bytes"] = len(tree.dump_options())
+        return st_pyecharts(tree, height="700px", events=TREE_EVENTS, key=key)
+
+def chart_event(result) -> str:
+    """streamlit-echarts 0.7+ 는 {"chart_event": ...} 를, 이전 버전은 핸들러가 돌려준 문자열을 반환"""
+    if hasattr(result, "get"):
+        result = result.get("chart_event")
+    return result if isinstance(result, str) else ""
+
+@unless_version_unknown
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_tree_payload(sheet_name: str, data_version, view: tuple, depth: int, _vis_df: pd.DataFrame) -> list:
+    # view = (cell line, status, focus): 데이터 버전과 보기 설정이 같으면 다시 만들지 않음
+    return limit_tree(build_tree(_vis_df, with_tooltips=False), depth)
+
+def render_lineage_viewer(tree_data: list, vis_df: pd.DataFrame, title: str, focus: str):
+    """상위 depth 단계만 보내고, 숨긴 부분은 '+N more' 노드로 표시"""
+
+    chart_col, info_col = st.columns([4, 1])
+    with chart_col:
+        event = chart_event(render_tree_chart(tree_data, title=title))
+    with info_col:
+        st.markdown("#### 🔎 Tube Details")
+        kind, _, tube = event.partition(":")
+        # 마지막 이벤트 값은 rerun 후에도 그대로 돌아오므로 새 클릭만 처리 (아니면 'All'을 골라도 다시 열림)
+        if kind == "open" and event != st.session_state.get("lineage_event"):
+            st.session_state["lineage_event"] = event
+            if tube != "ROOT" and tube != focus:
+                # 클릭한 노드(또는 '+N more' 의 부모)를 중심으로 다시 그리기
+                st.session_state["lineage_focus_request"] = tube
+                # 탭을 바꾼 직후처럼 전체 실행 중에 처음 본 클릭이면 fragment 범위로는 다시 실행할 수 없다
+                ctx = get_script_run_ctx(suppress_warning=True)
+                st.rerun(scope="fragment" if ctx and ctx.fragment_ids_this_run else "app")
+        if tube and tube != "ROOT":
+            st.markdown(node_tooltip(vis_df, tube), unsafe_allow_html=True)
+        else:
+            st.caption("Hover over a tube to see its details. Click a tube or a '+N more' node to open that subtree.")
 
 # ------------------ DASHBOARD METRICS ------------------
-def display_dashboard_metrics(df):
-    if len(df) > 0:
+def display_dashboard_metrics(rollup: Rollup):
+    # 집계(rollup)의 숫자만 읽는다 — 시트 크기와 무관
+    if rollup.total > 0:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
@@ -325,10 +516,10 @@ def display_dashboard_metrics(df):
                 <div class="metric-value">{}</div>
                 <div class="metric-label">Total Tubes</div>
             </div>
-            """.format(len(df)), unsafe_allow_html=True)
+            """.format(rollup.total), unsafe_allow_html=True)
             
         with col2:
-            in_use_count = len(df[df["Inuse"].str.lower() == "yes"])
+            in_use_count = rollup.in_use
             st.markdown("""
             <div class="metric-card">
                 <div class="metric-value" style="color: #e74c3c;">{}</div>
@@ -337,7 +528,7 @@ def display_dashboard_metrics(df):
             """.format(in_use_count), unsafe_allow_html=True)
             
         with col3:
-            available_count = len(df[df["Inuse"].str.lower() == "no"])
+            available_count = rollup.available
             st.markdown("""
             <div class="metric-card">
                 <div class="metric-value" style="color: #2ecc71;">{}</div>
@@ -346,7 +537,7 @@ def display_dashboard_metrics(df):
             """.format(available_count), unsafe_allow_html=True)
             
         with col4:
-            unique_cell_lines = df["Cell Name"].nunique()
+            unique_cell_lines = rollup.n_cell_lines
             st.markdown("""
             <div class="metric-card">
                 <div class="metric-value" style="color: #9b59b6;">{}</div>
@@ -354,59 +545,38 @@ def display_dashboard_metrics(df):
             </div>
             """.format(unique_cell_lines), unsafe_allow_html=True)
 
-# ------------------ BOX VISUALIZATION ------------------
-def render_box_position_map(filtered_df, row_letters, col_numbers):
-    # Create empty position map
-    position_map = pd.DataFrame('', index=row_letters, columns=col_numbers)
-    
-    # Fill in the tubes
-    for _, row in filtered_df.iterrows():
-        pos = str(row['Position']).strip().upper()
-        if len(pos) >= 2:
-            row_letter, col_number = pos[0], pos[1:]
-            if row_letter in position_map.index and col_number in position_map.columns:
-                position_map.loc[row_letter, col_number] = row['Tube ID']
-    
-    # Create style function
-    def style_cells(val):
-        if val == '':
-            return 'background-color: #f8f9fa'
-        
-        tube_info = filtered_df[filtered_df['Tube ID'] == val]
-        if not tube_info.empty and str(tube_info['Inuse'].values[0]).lower() == 'yes':
-            return 'background-color: rgba(231, 76, 60, 0.7); color: white; font-weight: bold; text-align: center'
-        else:
-            return 'background-color: rgba(46, 204, 113, 0.7); color: white; font-weight: bold; text-align: center'
-    
-    # Apply styling
-    styled_map = position_map.style.applymap(style_cells)
-    
-    return styled_map
-
 # ------------------ MAIN APP ------------------
 # Sidebar for navigation and app control
 with st.sidebar:
     st.title('Cell Line Manager')
     
-    # Google Sheet 내 시트 목록 불러오기
-    def get_google_sheet_names():
-        gc = gspread.service_account_from_dict(st.secrets["gspread"])
-        sh = gc.open_by_key("1as7cVD4JwZ5A7Vo8XmY2DEjEhQNHkWhg_8awtyx5M7E")  # 여기에 실제 스프레드시트 ID 넣기
-        return [ws.title for ws in sh.worksheets()]
-    
     sheet_list = get_google_sheet_names()
-    selected_sheet = st.selectbox("📑 Select Cell Line Sheet", sheet_list if sheet_list else ["Default"])
+    # 마지막 항목: 모든 시트를 합친 전체 보기 (조회 전용)
+    selected_sheet = st.selectbox("📑 Select Cell Line Sheet",
+                                  sheet_list + [ALL_SHEETS] if sheet_list else ["Default"], format_func=sheet_label)
+    st.text_input("👤 Your name", key="actor", placeholder="e.g., Johun",
+                  help="Saved with every change you make (see Tube Management → Change History)")
+    
+    tube_df, schema_report = load_tubes(sheet_name=selected_sheet)
+    data_version = get_data_version(selected_sheet)
+    rollup = get_rollup(selected_sheet, data_version, tube_df)
+    render_sync_status(selected_sheet)
     
-    tube_df = load_data(sheet_name=selected_sheet)
+    if not schema_report.ok:
+        st.warning(f"⚠️ {schema_report.bad_rows} row(s) failed validation")
+        with st.expander("Validation report"):
+            st.dataframe(schema_report.issues, use_container_width=True, hide_index=True)
 
     st.markdown("---")
     
     # Quick stats in sidebar
-    if len(tube_df) > 0:
+    if rollup.total > 0:
         st.markdown("### 📊 Quick Stats")
-        st.markdown(f"**Total Tubes:** {len(tube_df)}")
-        st.markdown(f"**In Use:** {len(tube_df[tube_df['Inuse'].str.lower() == 'yes'])}")
-        st.markdown(f"**Available:** {len(tube_df[tube_df['Inuse'].str.lower() == 'no'])}")
+        if selected_sheet == ALL_SHEETS:
+            st.markdown(f"**Sheets:** {rollup.sheets}")
+        st.markdown(f"**Total Tubes:** {rollup.total}")
+        st.markdown(f"**In Use:** {rollup.in_use}")
+        st.markdown(f"**Available:** {rollup.available}")
     
     st.markdown("---")
     st.markdown("### 📱 Contact")
@@ -417,16 +587,37 @@ st.title('Cell Line Tube Manager')
 st.markdown("Modern lab management system for organizing and tracking cell line samples")
 
 # Display dashboard metrics
-display_dashboard_metrics(tube_df)
+with telemetry.span("dashboard"):
+    display_dashboard_metrics(rollup)
 
+# 펼쳤을 때만 실행 (접으면 rerun) — 닫혀 있으면 차트를 만들지도 보내지도 않는다
+trends = st.expander("📈 Inventory Trends", key="trends", on_change="rerun")
+if trends.open and rollup.total > 0:
+    with trends:
+        render_trends(selected_sheet, tube_df, data_version, rollup)
+
+# 열린 탭만 실행 (탭을 바꾸면 rerun) — 안 보는 탭의 계산과 차트 라이브러리 로딩을 건너뜀
 tab1, tab2, tab3, tab4 = st.tabs([
     "➕ Tube Registration", 
     "📋 Tube Management", 
     "🌳 Lineage Visualization",
     "⏱ Growth Prediction"
-])
+], key="main_tab", on_change="rerun")
+
+def register_tubes(selected_sheet: str, batch: pd.DataFrame):
+    """검증 후 한 번에 append; 성공하면 등록된 행(위치 포함), 실패하면 오류를 표시하고 None"""
+    try:
+        return get_tube_inventory().register(selected_sheet, batch, actor=current_actor())
+    except BatchRejected as e:
+        st.error(f"❌ {e}")
+        st.dataframe(e.issues, use_container_width=True, hide_index=True)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+    except Exception as e:
+        st.error(f"❌ 저장 실패: {e}")
+    return None
 
-with tab1:
+def render_registration_forms(selected_sheet: str, tube_df: pd.DataFrame, occupancy: OccupancyIndex):
     st.markdown("## Add New Tube")
     
     # Form in a card-like container
@@ -440,14 +631,14 @@ with tab1:
                 tube_id = st.text_input("Tube ID", placeholder="e.g., P2_1")
                 cell_name = st.text_input("Cell Name", placeholder="e.g., A549")
                 passage = st.number_input("Passage", min_value=0, max_value=100, value=0)
-                parent_options = [""] + sorted(tube_df["Tube ID"].dropna().unique().tolist())
-                parent_tube = st.selectbox("Parent Tube", parent_options)
+                # 없는 부모 ID는 등록할 때 validate_batch 가 "parent not found" 로 알려준다
+                parent_tube = st.text_input("Parent Tube", placeholder="e.g., P1_1 (blank = none)")
             
             with col2:
                 date_val = st.date_input("Date", value=date.today())
                 tray = st.text_input("Tray", placeholder="e.g., Tray-2")
                 box = st.text_input("Box", placeholder="e.g., Box-A1")
-                position = st.text_input("Position", placeholder="e.g., A1")
+                position = st.text_input("Position", placeholder="e.g., A1 (blank = next free slot)")
             
             with col3:
                 lot = st.text_input("Lot", placeholder="e.g., L202403")
@@ -460,13 +651,15 @@ with tab1:
                 submitted = st.form_submit_button("✅ Register Tube", use_container_width=True)
             
             if submitted:
-                if tube_id and cell_name:
+                if not (tube_id and cell_name):
+                    st.error("Tube ID and Cell Name are required!")
+                else:
                     new_data = {
                         "Tube ID": tube_id,
                         "Cell Name": cell_name,
                         "Passage": passage,
                         "Parent Tube": parent_tube,
-                        "Position": position.upper().strip(),
+                        "Position": position,
                         "Date": date_val,
                         "Tray": tray,
                         "Box": box,
@@ -476,15 +669,73 @@ with tab1:
                         "Info": info,
                         "Inuse": "No"
                     }
-                    tube_df = pd.concat([tube_df, pd.DataFrame([new_data])], ignore_index=True)
-                    save_data(tube_df, sheet_name=selected_sheet)
-                    st.success(f"✅ Successfully registered tube {tube_id}!")
-                    st.rerun()
-                else:
-                    st.error("Tube ID and Cell Name are required!")
+                    # 위치를 비워두면 박스의 다음 빈 칸을 자동으로 배정 (이미 차 있는 칸이면 오류)
+                    registered = register_tubes(selected_sheet, pd.DataFrame([new_data]))
+                    if registered is not None:
+                        st.success(f"✅ Successfully registered tube {tube_id} at {registered['Position'].iat[0]}!")
+                        st.rerun()
         
         st.markdown('</div>', unsafe_allow_html=True)
     
+    # Bulk registration: one validated batch -> one append
+    with st.expander("📥 Bulk Import / Freeze-down"):
+        upload_tab, freeze_tab = st.tabs(["Upload xlsx / CSV", "Freeze vials from parent"])
+        batch = None
+        
+        with upload_tab:
+            uploaded = st.file_uploader("Tube list (same columns as tude_data.xlsx)", type=["xlsx", "csv"],
+                                        key="bulk_upload")
+            if uploaded is not None:
+                try:
+                    batch = read_upload(uploaded.getvalue(), uploaded.name, selected_sheet)
+                except Exception as e:
+                    st.error(f"❌ {e}")
+        
+        with freeze_tab:
+            freeze_col1, freeze_col2 = st.columns(2)
+            with freeze_col1:
+                freeze_parent = resolve_tube(st.text_input("Parent Tube", placeholder="e.g., P1_1",
+                                                           key="freeze_parent"), view=tube_df)
+                freeze_n = st.number_input("Vials", min_value=1, max_value=200, value=10, key="freeze_n")
+                freeze_date = st.date_input("Date", value=date.today(), key="freeze_date")
+                freeze_contiguous = st.checkbox("Contiguous slots", value=True, key="freeze_contiguous")
+            with freeze_col2:
+                freeze_tray = st.text_input("Tray", placeholder="e.g., Tray-2", key="freeze_tray")
+                freeze_box = st.text_input("Box", placeholder="e.g., Box-A1", key="freeze_box")
+                freeze_lot = st.text_input("Lot", key="freeze_lot")
+                freeze_operator = st.text_input("Operator", key="freeze_operator")
+            if freeze_parent and freeze_tray and freeze_box:
+                try:
+                    batch = freeze_batch(tube_df, freeze_parent, int(freeze_n), freeze_tray, freeze_box, occupancy,
+                                         contiguous=freeze_contiguous, freeze_date=freeze_date,
+                                         lot=freeze_lot, operator=freeze_operator)
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        
+        if batch is not None and len(batch) > 0:
+            typed_batch, batch_issues = validate_batch(tube_df, batch, occupancy)
+            st.dataframe(batch, use_container_width=True, hide_index=True, height=200)
+            if not batch_issues.empty:
+                st.error(f"❌ {batch_issues['Row'].nunique()} row(s) need fixing before import")
+                st.dataframe(batch_issues, use_container_width=True, hide_index=True)
+            elif st.button(f"✅ Register {len(batch)} tubes", key="bulk_register", use_container_width=True):
+                if register_tubes(selected_sheet, batch) is not None:
+                    st.success(f"✅ Registered {len(batch)} tubes")
+                    st.rerun()
+
+
+@st.fragment
+@telemetry.traced("tab.registration")
+def render_registration_tab(selected_sheet: str):
+    tube_df, _ = load_tubes(selected_sheet)
+    data_version = get_data_version(selected_sheet)
+    with telemetry.span("occupancy"):
+        occupancy = get_occupancy(selected_sheet, data_version, tube_df)
+    if selected_sheet == ALL_SHEETS:
+        st.info("🌐 전체 보기는 조회 전용입니다. 튜브를 등록하려면 사이드바에서 시트를 선택하세요.")
+    else:
+        render_registration_forms(selected_sheet, tube_df, occupancy)
+    
     # Box visualization section
     st.markdown("## 📦 Storage Management")
     
@@ -495,33 +746,33 @@ with tab1:
         st.markdown("### Box Occupancy Summary")
         
         if len(tube_df) > 0:
-            box_summary = (
-                tube_df.groupby(["Tray", "Box"])
-                .size()
-                .reset_index(name="Used")
-            )
-            box_summary["Remaining"] = 100 - box_summary["Used"]
+            with telemetry.span("occupancy.chart"):
+                box_summary, fig = get_occupancy_chart(selected_sheet, data_version, occupancy)
             
-            # Add visualization
-            if not box_summary.empty:
-                fig = px.bar(
-                    box_summary, 
-                    x="Box", 
-                    y=["Used", "Remaining"],
-                    color_discrete_map={"Used": "#3498db", "Remaining": "#ecf0f1"},
-                    title="Box Capacity Usage",
-                    barmode="stack",
-                    height=300,
-                    labels={"value": "Tubes", "variable": "Status"},
-                    facet_col="Tray" if box_summary["Tray"].nunique() > 1 else None
-                )
-                fig.update_layout(
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                    margin=dict(l=20, r=20, t=60, b=20),
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                # Add visualization
+                if fig is not None:
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            show_dataframe(box_summary, "box_summary.render", use_container_width=True, hide_index=True)
             
-            st.dataframe(box_summary, use_container_width=True, hide_index=True)
+            # 박스에는 있지만 칸에 놓이지 않은 튜브 (위치 없음/잘못된 위치/같은 칸 중복)
+            misplaced = occupancy.misplaced()
+            if not misplaced.empty:
+                with st.expander(f"⚠️ {len(misplaced)} tube(s) without a usable position"):
+                    show_dataframe(misplaced, "misplaced.render", use_container_width=True, hide_index=True)
+            
+            with st.expander("🔎 Find Free Slots"):
+                box_keys = [f"{t} / {b}" for t, b in zip(box_summary["Tray"], box_summary["Box"])]
+                if box_keys:
+                    target = st.selectbox("Box", box_keys, key="free_slot_box")
+                    n_slots = st.number_input("Number of vials", min_value=1, max_value=200, value=1, key="free_slot_n")
+                    contiguous = st.checkbox("Contiguous slots only", value=True, key="free_slot_contiguous")
+                    free_tray, free_box = target.split(" / ", 1)
+                    found = occupancy.free_slots(free_tray, free_box, int(n_slots), contiguous)
+                    if found:
+                        st.success(f"Free: {', '.join(found)}")
+                    else:
+                        st.warning(f"No room for {int(n_slots)} {'contiguous ' if contiguous else ''}vials in {target}")
         else:
             st.info("No tubes registered yet. Add tubes to see box occupancy.")
         
@@ -541,13 +792,20 @@ with tab1:
                 
                 filtered = tube_df[(tube_df["Tray"] == selected_tray) & (tube_df["Box"] == selected_box)]
                 
-                row_letters = list("ABCDEFGHIJ")
-                col_numbers = [str(i) for i in range(1, 11)]
+                # 설정된 박스 규격을 기본값으로
+                box_layout = occupancy.layout(selected_tray, selected_box)
+                choices = {f"{box_layout.name} ({box_layout.capacity})": box_layout, **BOX_LAYOUTS}
+                names = list(dict.fromkeys(n for n, l in choices.items() if l == box_layout)) + \
+                    [n for n, l in BOX_LAYOUTS.items() if l != box_layout]
+                layout = choices[st.selectbox("Box Layout", names,
+                                              key=f"box_layout_{selected_tray}_{selected_box}")]
                 
                 st.markdown(f"#### 📍 {selected_tray} / {selected_box}")
                 
-                styled_map = render_box_position_map(filtered, row_letters, col_numbers)
-                st.dataframe(styled_map, use_container_width=True)
+                with telemetry.span("position_map"):
+                    styled_map = style_grid(*get_position_grid(selected_sheet, data_version, selected_tray,
+                                                               selected_box, layout, filtered))
+                show_dataframe(styled_map, "position_map.render", use_container_width=True)
                 
                 # Legend
                 st.markdown(
@@ -574,7 +832,17 @@ with tab1:
         
         st.markdown('</div>', unsafe_allow_html=True)
 
-with tab2:
+if tab1.open is not False:
+    with tab1:
+        render_registration_tab(selected_sheet)
+
+
+@st.fragment
+@telemetry.traced("tab.management")
+def render_management_tab(selected_sheet: str):
+    tube_df, _ = load_tubes(selected_sheet)
+    data_version = get_data_version(selected_sheet)
+    read_only = selected_sheet == ALL_SHEETS
     st.markdown("## 📋 Tube Management")
     
     # Search and filter section
@@ -584,7 +852,12 @@ with tab2:
         search_col1, search_col2, search_col3 = st.columns(3)
         
         with search_col1:
-            search_term = st.text_input("🔍 Search by Tube ID or Cell Name", placeholder="Enter search term...")
+            search_term = st.text_input(
+                "🔍 Search", placeholder="e.g., A549 or cell:A549 box:Box-A1 inuse:no",
+                help="Plain words match Tube ID, Cell Name, Lot or Operator. "
+                     "Field filters: id, cell, lot, operator, parent, tray, box, pos, passage, myco, inuse "
+                     "(and sheet in the all-sheets view)."
+            )
         
         with search_col2:
             filter_status = st.selectbox("Filter by Status", ["All", "In Use", "Available"])
@@ -595,54 +868,53 @@ with tab2:
             else:
                 sort_by = "Tube ID"
         
-        # Apply filters
-        filtered_df = tube_df.copy()
-        
-        if search_term:
-            filtered_df = filtered_df[
-                filtered_df["Tube ID"].str.contains(search_term, case=False) | 
-                filtered_df["Cell Name"].str.contains(search_term, case=False)
-            ]
-        
+        # Apply filters & sorting (색인에서 행 위치만 골라온다)
+        query = search_term
         if filter_status == "In Use":
-            filtered_df = filtered_df[filtered_df["Inuse"].str.lower() == "yes"]
+            query += " inuse:yes"
         elif filter_status == "Available":
-            filtered_df = filtered_df[filtered_df["Inuse"].str.lower() == "no"]
+            query += " inuse:no"
         
-        # Apply sorting
-        if sort_by == "Date":
-            filtered_df = filtered_df.sort_values(by="Date", ascending=False)
-        else:
-            filtered_df = filtered_df.sort_values(by=sort_by)
+        with telemetry.span("search") as fields:
+            search_index = get_search_index(selected_sheet, data_version, tube_df)
+            rows = search_index.select(query, sort_by=sort_by, ascending=sort_by != "Date")
+            fields["matches"] = len(rows)
         
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Display tubes with enhanced styling
-    if len(filtered_df) > 0:
-        st.markdown(f"### Showing {len(filtered_df)} tubes")
+    if len(rows) > 0:
+        st.markdown(f"### Showing {len(rows)} tubes")
         
-        # Function to color rows based on status
-        def highlight_rows(row):
-            if str(row["Inuse"]).lower() == "yes":
-                return ['background-color: rgba(231, 76, 60, 0.1)'] * len(row)
-            else:
-                return ['background-color: rgba(46, 204, 113, 0.1)'] * len(row)
+        # 현재 페이지만 꺼내서 스타일 적용 (페이지 위치는 rerun 후에도 유지)
+        page_col1, page_col2, page_col3 = st.columns([1, 1, 2])
+        with page_col1:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key="tube_page_size")
+        page, n_pages, start, stop = page_bounds(len(rows), st.session_state.get("tube_page", 1), page_size)
+        st.session_state["tube_page"] = page
+        with page_col2:
+            st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, step=1, key="tube_page")
+        with page_col3:
+            st.caption(f"Rows {start + 1}–{stop} of {len(rows)}")
         
-        # Apply styling and display
-        styled_df = filtered_df.style.apply(highlight_rows, axis=1)
-        st.dataframe(styled_df, use_container_width=True, height=400)
+        page_rows = rows[start:stop]
+        filtered_df = tube_df.iloc[page_rows]
+        table_event = show_dataframe(style_by_status(filtered_df), "table.render", use_container_width=True,
+                                     height=400, on_select="rerun", selection_mode="multi-row", key="tube_table")
         
         # Tube status management
         st.markdown("### Update Tube Status")
+        if read_only:
+            st.caption("🌐 전체 보기는 조회 전용입니다. 상태를 바꾸려면 해당 시트를 선택하세요.")
         
         status_col1, status_col2 = st.columns(2)
         
         with status_col1:
             selected_tube = st.selectbox("Select Tube to Update", filtered_df["Tube ID"])
-            current_status = filtered_df.loc[filtered_df["Tube ID"] == selected_tube, "Inuse"].values[0]
+            current_status = bool(filtered_df.loc[filtered_df["Tube ID"] == selected_tube, "Inuse"].values[0])
             
-            current_status_display = "In Use" if str(current_status).lower() == "yes" else "Available"
-            status_color = "status-in-use" if str(current_status).lower() == "yes" else "status-available"
+            current_status_display = "In Use" if current_status else "Available"
+            status_color = "status-in-use" if current_status else "status-available"
             
             st.markdown(
                 f"""
@@ -657,22 +929,139 @@ with tab2:
             status_button_col1, status_button_col2 = st.columns(2)
             
             with status_button_col1:
-                if st.button("✅ Mark as In Use", key="mark_in_use", use_container_width=True):
-                    tube_df.loc[tube_df["Tube ID"] == selected_tube, "Inuse"] = "Yes"
-                    save_data(tube_df, sheet_name=selected_sheet)
-                    st.success(f"Status updated: {selected_tube} is now In Use")
-                    st.rerun()
+                if st.button("✅ Mark as In Use", key="mark_in_use", use_container_width=True,
+                             disabled=read_only):
+                    if update_tubes(selected_sheet, [selected_tube], "Inuse", True):
+                        st.success(f"Status updated: {selected_tube} is now In Use")
+                        st.rerun()
             
             with status_button_col2:
-                if st.button("🔄 Mark as Available", key="mark_available", use_container_width=True):
-                    tube_df.loc[tube_df["Tube ID"] == selected_tube, "Inuse"] = "No"
-                    save_data(tube_df, sheet_name=selected_sheet)
-                    st.success(f"Status updated: {selected_tube} is now Available")
+                if st.button("🔄 Mark as Available", key="mark_available", use_container_width=True,
+                             disabled=read_only):
+                    if update_tubes(selected_sheet, [selected_tube], "Inuse", False):
+                        st.success(f"Status updated: {selected_tube} is now Available")
+                        st.rerun()
+        
+        # Bulk update: 여러 튜브를 한 번의 저장(한 번의 batch update)과 한 번의 rerun으로 변경
+        st.markdown("### Bulk Update")
+        
+        bulk_col1, bulk_col2 = st.columns(2)
+        
+        with bulk_col1:
+            bulk_scope = st.radio("Apply to", ["Selected rows", "Search result", "Box", "Lineage subtree"],
+                                  horizontal=True, key="bulk_scope")
+            if bulk_scope == "Selected rows":
+                targets = page_rows[list(table_event.selection.rows)]
+                st.caption("Tick rows in the table above (current page).")
+            elif bulk_scope == "Search result":
+                targets = rows
+            elif bulk_scope == "Box":
+                located = tube_df.dropna(subset=["Tray", "Box"])
+                box_options = sorted({f"{t} / {b}" for t, b in zip(located["Tray"], located["Box"])})
+                bulk_box = st.selectbox("Box", box_options, key="bulk_box")
+                if bulk_box:
+                    bulk_tray, bulk_box = bulk_box.split(" / ", 1)
+                    targets = np.flatnonzero(((tube_df["Tray"] == bulk_tray) & (tube_df["Box"] == bulk_box)).to_numpy())
+                else:
+                    targets = np.array([], dtype=int)
+            else:
+                lineage = get_lineage_index(selected_sheet, data_version, tube_df)
+                bulk_root = resolve_tube(st.text_input("Subtree of", placeholder="Tube ID", key="bulk_root"), lineage)
+                targets = np.flatnonzero(lineage.subtree_mask(tube_df, bulk_root).to_numpy()) if bulk_root else []
+        
+        with bulk_col2:
+            bulk_field = st.selectbox("Field", ["Inuse", "Mycoplasma", "Operator", "Lot", "Info"], key="bulk_field")
+            if bulk_field == "Inuse":
+                bulk_value = st.radio("Status", ["In Use", "Available"], horizontal=True, key="bulk_status") == "In Use"
+            elif bulk_field == "Mycoplasma":
+                bulk_value = st.radio("Mycoplasma", ["No", "Yes"], horizontal=True, key="bulk_myco") == "Yes"
+            else:
+                bulk_value = st.text_input("New value", key="bulk_value")
+            
+            if st.button(f"✏️ Apply to {len(targets)} tube(s)", key="bulk_apply", disabled=len(targets) == 0 or read_only,
+                         use_container_width=True):
+                if update_tubes(selected_sheet, tube_df["Tube ID"].iloc[targets], bulk_field, bulk_value):
+                    st.success(f"Updated {bulk_field} for {len(targets)} tubes")
                     st.rerun()
     else:
         st.info("No tubes found matching your filters.")
+    
+    with st.expander("🕓 Change History"):
+        render_history(selected_sheet, tube_df)
 
-with tab3:
+def history_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, dict):  # add 이벤트: 등록한 행 전체
+        return ", ".join(f"{k}: {v}" for k, v in value.items() if v != "")
+    return str(value)
+
+def history_table(events: pd.DataFrame) -> pd.DataFrame:
+    # Old/New에는 숫자, 글자, 행 전체가 섞여 있으므로 글자로 표시
+    return events.drop(columns=["Seq", "Row"]).assign(Old=events["Old"].map(history_value),
+                                                      New=events["New"].map(history_value))
+
+def render_history(selected_sheet: str, tube_df: pd.DataFrame):
+    history = get_tube_inventory().history
+    if history is None:
+        st.caption("The change log is turned off ([history] enabled = false).")
+        return
+    view = st.radio("View", ["Tube history", "Operator activity", "Inventory as of"], horizontal=True,
+                    key="history_view")
+    if view == "Tube history":
+        placeholder = f"Sheet{SEPARATOR}Tube ID" if selected_sheet == ALL_SHEETS else "Tube ID"
+        tube = resolve_tube(st.text_input("Tube", placeholder=placeholder, key="history_tube"), view=tube_df)
+        if tube:
+            sheet = selected_sheet
+            if selected_sheet == ALL_SHEETS:
+                sheet, tube = tube.split(SEPARATOR, 1)
+            with telemetry.span("history.tube"):
+                events = history.tube_history(tube, sheet)
+            if events.empty:
+                st.caption("No recorded changes for this tube yet.")
+            else:
+                show_dataframe(history_table(events), "history.render", use_container_width=True, hide_index=True)
+    elif view == "Operator activity":
+        since = st.date_input("Since", value=date.today() - timedelta(days=30), key="history_since")
+        with telemetry.span("history.actors"):
+            summary = history.actor_summary(since=datetime.combine(since, time()))
+        if summary.empty:
+            st.caption("No changes recorded in this period.")
+            return
+        show_dataframe(summary, "history.render", use_container_width=True, hide_index=True)
+        actor = st.selectbox("Operator", summary["Actor"].tolist(), key="history_actor")
+        with telemetry.span("history.activity"):
+            events = history.activity(actor or None, since=datetime.combine(since, time()), limit=500)
+        st.caption(f"Latest {len(events)} change(s) by {actor or '(unnamed)'}")
+        show_dataframe(history_table(events), "history.render", use_container_width=True, hide_index=True)
+    else:
+        as_of_col1, as_of_col2 = st.columns(2)
+        with as_of_col1:
+            as_of_date = st.date_input("Date", value=date.today(), key="history_date")
+        with as_of_col2:
+            as_of_time = st.time_input("Time", value=time(0, 0), key="history_time")
+        try:
+            past_df, _ = get_tube_inventory().as_of(selected_sheet, datetime.combine(as_of_date, as_of_time))
+        except (KeyError, ValueError) as e:
+            st.info(f"No history for that time: {e}")
+            return
+        in_use_count = int(past_df["Inuse"].sum()) if "Inuse" in past_df.columns else 0
+        st.markdown(f"**{len(past_df)}** tubes · **{in_use_count}** in use · **{len(past_df) - in_use_count}** available")
+        show_dataframe(style_by_status(past_df.head(PAGE_SIZES[-1])), "history.render", use_container_width=True,
+                       height=300)
+        if len(past_df) > PAGE_SIZES[-1]:
+            st.caption(f"First {PAGE_SIZES[-1]} of {len(past_df)} tubes")
+
+if tab2.open is not False:
+    with tab2:
+        render_management_tab(selected_sheet)
+
+
+@st.fragment
+@telemetry.traced("tab.lineage")
+def render_lineage_tab(selected_sheet: str):
+    tube_df, _ = load_tubes(selected_sheet)
+    data_version = get_data_version(selected_sheet)
     st.markdown("## 🌳 Cell Lineage Visualization")
     
     if len(tube_df) == 0:
@@ -682,41 +1071,92 @@ with tab3:
         vis_col1, vis_col2 = st.columns(2)
         
         with vis_col1:
-            cell_names = ["All"] + sorted(tube_df["Cell Name"].unique().tolist())
+            cell_names = ["All"] + sorted(tube_df["Cell Name"].dropna().unique().tolist())
             selected_cell = st.selectbox("Filter by Cell Line", cell_names)
         
         with vis_col2:
             vis_status = st.selectbox("Show by Status", ["All", "In Use Only", "Available Only"])
         
         # Apply filters for visualization
-        vis_df = tube_df.copy()
-        
-        if selected_cell != "All":
-            vis_df = vis_df[vis_df["Cell Name"] == selected_cell]
-        
-        if vis_status == "In Use Only":
-            vis_df = vis_df[vis_df["Inuse"].str.lower() == "yes"]
-        elif vis_status == "Available Only":
-            vis_df = vis_df[vis_df["Inuse"].str.lower() == "no"]
+        lineage = get_lineage_index(selected_sheet, data_version, tube_df)
+        vis_in_use = {"All": None, "In Use Only": True, "Available Only": False}[vis_status]
+        vis_df = lineage_view(tube_df, lineage, None if selected_cell == "All" else selected_cell, vis_in_use)
         
-        tree_title = f"{selected_sheet} Lineage Tree"
+        tree_title = f"{sheet_label(selected_sheet)} Lineage Tree"
         if selected_cell != "All":
             tree_title += f" - {selected_cell}"
-            
+
+        # 큰 계보는 일부만 전송: 상위 N 단계 또는 특정 튜브의 subtree
+        if "lineage_focus_request" in st.session_state:
+            st.session_state["lineage_focus"] = st.session_state.pop("lineage_focus_request")
+        view_col1, view_col2 = st.columns(2)
+        with view_col1:
+            # Tube ID 목록 전체를 보내지 않고 입력한 ID를 인덱스에서 찾는다
+            focus = resolve_tube(st.text_input("Focus on Subtree", key="lineage_focus",
+                                               placeholder="Tube ID (blank: whole tree)"), lineage, vis_df) or "All"
+        with view_col2:
+            depth = st.slider("Levels to Show", min_value=1, max_value=20, value=4)
+
+        if focus != "All":
+            # 인덱스로 subtree만 잘라서 그리기 (선택한 튜브가 새 루트)
+            vis_df = lineage_view(vis_df, lineage, focus=focus)
+            tree_title += f" - {focus} subtree"
+
         # Build and render the tree
-        tree_data = build_tree(vis_df)
-        render_tree_chart(tree_data, title=tree_title)
+        with telemetry.span("tree.payload", depth=depth):
+            tree_data = get_tree_payload(selected_sheet, data_version, (selected_cell, vis_status, focus), depth,
+                                         vis_df)
+        render_lineage_viewer(tree_data, vis_df, tree_title, focus)
+
+        # Lineage queries (ancestry / descendants / generation)
+        with st.expander("🧬 Lineage Lookup"):
+            if lineage.orphans:
+                st.warning("Missing parent tubes: " + ", ".join(f"{t} → {p}" for t, p in lineage.orphans))
+            if lineage.cycles:
+                st.error("Parent cycles (hidden from the tree): "
+                         + "; ".join(" → ".join(c) for c in lineage.cycles))
+            lookup_col1, lookup_col2 = st.columns(2)
+            with lookup_col1:
+                lookup_tube = resolve_tube(st.text_input("Tube", key="lineage_lookup", placeholder="Tube ID"), lineage)
+            with lookup_col2:
+                other_tube = resolve_tube(st.text_input("Is it an ancestor of…", key="lineage_other",
+                                                        placeholder="Tube ID"), lineage)
+            if lookup_tube:
+                generation = lineage.generation(lookup_tube)
+                chain = lineage.ancestors(lookup_tube)
+                descendants = lineage.descendants(lookup_tube)
+                st.markdown(f"**Generation from master stock:** {generation if generation >= 0 else 'n/a (cycle)'}")
+                st.markdown("**Ancestry:** " + (" → ".join(chain) if chain else "n/a"))
+                st.markdown(f"**Descendants:** {len(descendants)}")
+                if other_tube:
+                    verdict = "is" if lineage.is_ancestor(lookup_tube, other_tube) else "is not"
+                    st.markdown(f"**{lookup_tube}** {verdict} an ancestor of **{other_tube}**")
+                if descendants:
+                    show_dataframe(tube_df[lineage.subtree_mask(tube_df, lookup_tube)], "descendants.render",
+                                   use_container_width=True, hide_index=True)
+
+if tab3.open is not False:
+    with tab3:
+        render_lineage_tab(selected_sheet)
 
 
-with tab4:
+@st.cache_data(max_entries=32, show_spinner="Simulating expansion...")
+def get_expansion_forecast(plan: ExpansionPlan, lines, n_trajectories: int, confidence: float,
+                           _growth: GrowthTable) -> pd.DataFrame:
+    return simulate_expansion(_growth, plan, lines, n_trajectories=n_trajectories, confidence=confidence)
+
+@st.fragment
+@telemetry.traced("tab.growth")
+def render_growth_tab():
+    growth = load_growth_table()
     st.header("⏱ Growth Time Prediction")
-    if growth_df.empty:
+    if not len(growth):
         st.warning("growth_rate_20220907.csv 파일을 업로드하거나 경로를 확인하세요.")
     else:
         # 4-1) 셀 라인 선택
         cell = st.selectbox(
             "Select Cell Line", 
-            growth_df["model_name"].unique().tolist()
+            growth.names
         )
         # 4-2) 초기/목표 Density 입력
         init_den = st.number_input(
@@ -729,11 +1169,139 @@ with tab4:
         )
         # 4-3) 버튼 누르면 계산
         if st.button("Predict Time"):
-            row = growth_df[growth_df["model_name"] == cell].iloc[0]
-            dbl_t = row.get("doubling_time_hours") or row.get("doubling_time")
-            delta = time_to_reach_target(init_den, dbl_t, target_den)
-            # 결과 표시
-            days, rem = delta.days, delta.seconds
-            hours = rem // 3600
-            minutes = (rem % 3600) // 60
-            st.success(f"▶️ 예상 소요 시간: {days}일 {hours}시간 {minutes}분")
+            dbl_t = growth.doubling_time([cell])[0]
+            if np.isnan(dbl_t):
+                st.warning(f"{cell}: doubling time을 구할 수 없습니다 (측정값 없음, day4/day1 ratio ≤ 1).")
+            else:
+                if growth.doubling_source[growth.locate([cell])[0]] != "measured":
+                    st.caption(f"Doubling time {dbl_t:.1f} h — day4/day1 ratio에서 계산한 값")
+                delta = time_to_reach_target(init_den, dbl_t, target_den)
+                # 결과 표시
+                days, rem = delta.days, delta.seconds
+                hours = rem // 3600
+                minutes = (rem % 3600) // 60
+                st.success(f"▶️ 예상 소요 시간: {days}일 {hours}시간 {minutes}분")
+
+        # 4-4) 여러 셀 라인 × 농도 조합을 한 번에 계산 (한 주 배양 계획)
+        st.markdown("---")
+        st.subheader("📅 Batch Schedule")
+        all_lines = st.checkbox(f"All cell lines ({len(growth)})", key="schedule_all")
+        lines = growth.names if all_lines else st.multiselect("Cell Lines", growth.names, key="schedule_lines")
+        col1, col2 = st.columns(2)
+        with col1:
+            seeding_text = st.text_input("Seeding Densities (cells/ml)", "1000, 5000", key="schedule_seeding")
+            start_day = st.date_input("Start Date", value=date.today(), key="schedule_date")
+        with col2:
+            target_text = st.text_input("Target Densities (cells/ml)", "100000, 1000000", key="schedule_target")
+            start_time = st.time_input("Start Time", value=time(9, 0), key="schedule_time")
+        try:
+            seeding, targets = parse_densities(seeding_text), parse_densities(target_text)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            seeding, targets = [], []
+        if lines and seeding and targets:
+            with telemetry.span("growth.schedule"):
+                schedule = predict_schedule(growth, plan_grid(lines, seeding, targets),
+                                            start=datetime.combine(start_day, start_time))
+            st.caption(f"{len(schedule):,} cultures · {(schedule['Note'] != '').sum():,} without a prediction")
+            show_dataframe(schedule, "schedule.render", use_container_width=True, hide_index=True, height=400)
+            st.download_button("⬇️ Download Schedule (CSV)", schedule.to_csv(index=False).encode("utf-8"),
+                               file_name=f"growth_schedule_{start_day.isoformat()}.csv", mime="text/csv")
+
+        # 4-5) 계대 확장 계획: 복제 실험의 편차를 반영한 Monte Carlo로 수확 시점의 신뢰구간 계산
+        st.markdown("---")
+        st.subheader("🧫 Expansion Planner")
+        st.caption("Seed one vessel, split 1:N at confluence and keep every vessel until the target cell count. "
+                   "Growth rates vary per passage by each line's replicate st_dev.")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            seed_cells = st.number_input("Seed Cells", min_value=1.0, value=1e6, format="%.3g", key="expand_seed")
+            split_ratio = st.selectbox("Split Ratio", [2, 3, 4, 5, 6, 8, 10], index=1,
+                                       format_func=lambda r: f"1:{r}", key="expand_split")
+        with col2:
+            confluent_cells = st.number_input("Cells per Vessel at Confluence", min_value=1.0, value=1e7,
+                                              format="%.3g", key="expand_confluent")
+            max_passages = st.number_input("Max Passages", min_value=0, value=10, step=1, key="expand_passages")
+        with col3:
+            target_cells = st.number_input("Target Cells", min_value=1.0, value=1e9, format="%.3g", key="expand_target")
+            confidence = st.select_slider("Confidence", [0.8, 0.9, 0.95], value=0.9, key="expand_confidence")
+        all_lines = st.checkbox(f"All cell lines ({len(growth)})", value=True, key="expand_all")
+        lines = None if all_lines else st.multiselect("Cell Lines", growth.names, key="expand_lines")
+        n_trajectories = st.select_slider("Trajectories per Line", [500, 1000, 2000, 5000], value=2000,
+                                          key="expand_trajectories")
+        if lines is None or lines:
+            plan = ExpansionPlan(seed_cells, confluent_cells, split_ratio, target_cells, int(max_passages))
+            with telemetry.span("growth.forecast", trajectories=n_trajectories):
+                forecast = get_expansion_forecast(plan, None if lines is None else tuple(lines),
+                                                  n_trajectories, confidence, growth)
+            if plan.splits_needed() > plan.max_passages:
+                st.warning(f"목표까지 {plan.splits_needed()}번 계대가 필요합니다 (최대 {plan.max_passages}번).")
+            show_dataframe(forecast.sort_values("Median (days)", na_position="last"), "forecast.render",
+                           use_container_width=True, hide_index=True, height=400)
+            st.download_button("⬇️ Download Forecast (CSV)", forecast.to_csv(index=False).encode("utf-8"),
+                               file_name="expansion_forecast.csv", mime="text/csv")
+
+if tab4.open is not False:
+    with tab4:
+        render_growth_tab()
+
+
+# ------------------ ADMIN: PERFORMANCE ------------------
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:,.0f} {unit}"
+        n /= 1024
+    return f"{n:,.1f} GB"
+
+def render_admin_panel():
+    """이번 rerun의 단계별 시간, 최근 rerun 목록, Sheets API 사용량 ([telemetry] admin = true 일 때만)"""
+    session = session_id()
+    traces = telemetry.history(session)
+    meter = telemetry.api_meter
+    with st.expander("🛠 Performance (admin)"):
+        if traces:
+            last = traces[-1]
+            st.markdown(f"**Last {last.name}:** {last.seconds * 1e3:,.0f} ms · {last.api_calls} API calls · "
+                        f"{format_bytes(last.api_bytes)}")
+            st.dataframe(pd.DataFrame({
+                "Stage": ["  " * s.depth + s.name for s in last.spans],
+                "ms": [round(s.seconds * 1e3, 1) for s in last.spans],
+                "Details": [", ".join(f"{k}={v}" for k, v in s.fields.items()) for s in last.spans],
+            }), use_container_width=True, hide_index=True)
+            st.markdown("**Recent runs**")
+            st.dataframe(pd.DataFrame({
+                "Time": [datetime.fromtimestamp(t.started_at).strftime("%H:%M:%S") for t in reversed(traces)],
+                "Run": [t.name + (" (interrupted)" if t.interrupted else "") for t in reversed(traces)],
+                "ms": [round(t.seconds * 1e3) for t in reversed(traces)],
+                "API calls": [t.api_calls for t in reversed(traces)],
+            }), use_container_width=True, hide_index=True)
+
+        st.markdown("**Sheets API — last minute**")
+        minute = meter.last_minute()
+        for kind, quota in meter.quotas.items():
+            st.progress(min(1.0, minute[kind] / quota), text=f"{kind.title()} requests: {minute[kind]} / {quota}")
+        if minute["errors"]:
+            st.warning(f"{minute['errors']} failed request(s) in the last minute")
+        mine, total = meter.session_totals(session), meter.totals()
+        st.caption(f"This session: {mine['calls']} calls · {format_bytes(mine['bytes'])} — "
+                   f"all sessions: {total['calls']} calls · {format_bytes(total['bytes'])}")
+        methods = meter.by_method()
+        if methods:
+            st.dataframe(pd.DataFrame({
+                "Method": list(methods),
+                "Calls": [c["calls"] for c in methods.values()],
+                "Bytes": [c["bytes"] for c in methods.values()],
+                "Errors": [c["errors"] for c in methods.values()],
+                "Avg ms": [round(c["ms"] / c["calls"], 1) for c in methods.values()],
+            }), use_container_width=True, hide_index=True)
+        if traces:
+            st.download_button("⬇️ Traces (JSON lines)",
+                               "\n".join(json.dumps(t.to_record(), default=str) for t in traces),
+                               file_name="telemetry.jsonl", mime="application/json")
+
+# 탭까지 모두 그린 뒤에 닫아야 전체 rerun 시간이 잡힌다 (st.rerun으로 중단된 run은 다음 begin에서 닫힘)
+telemetry.end()
+if telemetry_conf.get("admin"):
+    with st.sidebar:
+        render_admin_panel()
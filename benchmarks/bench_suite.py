@@ -0,0 +1,217 @@
+"""Benchmark suite: the app's hot paths on synthetic inventories.
+
+    python -m benchmarks.bench_suite                            # 10k and 100k tubes
+    python -m benchmarks.bench_suite 1000000 --depth 8 --fan-out 2 --fill 0.6
+    python -m benchmarks.bench_suite 100000 --only load save    # scenario name prefixes
+    python -m benchmarks.bench_suite --json results.json        # keep results for later
+    python -m benchmarks.bench_suite --baseline results.json    # exit 1 on regressions
+
+Each scenario is timed (best of --repeat runs), then run once more under
+tracemalloc for its peak memory. Load/save scenarios go through GSheetBackend
+against benchmarks.fake_sheets, which counts Sheets API calls and payload bytes.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmarks.fake_sheets import FakeConnection
+from benchmarks.synthetic import sheet_rows, synthetic_inventory
+from celltracker.boxes import OccupancyIndex, position_grid, style_grid
+from celltracker.cache import frames
+from celltracker.events import EventLog
+from celltracker.lineage import LineageIndex, build_tree, limit_tree
+from celltracker.rollups import Rollup
+from celltracker.schema import append_rows, assign, coerce, in_use, to_storage
+from celltracker.search import SearchIndex
+from celltracker.storage import GSheetBackend
+from celltracker.table import style_by_status
+from celltracker.writer import write_queue
+
+SHEET = "Bench"
+PAGE_SIZE = 50
+TREE_DEPTH = 4
+REGRESSION_FLOOR = 0.005  # seconds; faster scenarios are too noisy to compare
+
+
+@dataclass
+class Scenario:
+    name: str
+    setup: Callable[["Inventory"], object]  # not timed; its result is passed to run
+    run: Callable[[object], object]
+    sheets: bool = False  # uses the fake Sheets connection
+
+
+class Inventory:
+    """One synthetic inventory plus the frames and indexes scenarios start from."""
+
+    def __init__(self, n: int, depth: int, fan_out: int, fill: float):
+        self.raw = synthetic_inventory(n, depth=depth, fan_out=fan_out, fill=fill)
+        self.rows = sheet_rows(self.raw)
+        self.typed, self.report = coerce(self.raw)
+        self.conn: Optional[FakeConnection] = None
+        self._tmp = tempfile.TemporaryDirectory()
+        self._logs = itertools.count()
+
+    def backend(self, warm: bool = True) -> GSheetBackend:
+        """A GSheetBackend over a fresh fake spreadsheet; warm = sheet already in the frame cache."""
+        self.conn = FakeConnection({SHEET: self.rows})
+        backend = GSheetBackend(self.conn)
+        frames.invalidate()
+        if warm:
+            backend.load(SHEET)
+        self.conn.meter.reset()
+        return backend
+
+    def history(self, changed_cells: int = 0) -> EventLog:
+        """A fresh change log that already holds the sheet (plus changed_cells edits of Info after it)."""
+        log = EventLog(os.path.join(self._tmp.name, f"history-{next(self._logs)}.db"))
+        log.record(SHEET, self.typed, self.typed, 0, 1, self.report)
+        if changed_cells:
+            edited = assign(self.typed, range(changed_cells), "Info", "thawed")
+            log.record(SHEET, self.typed, edited, 1, 2, self.report)
+        return log
+
+
+def _save(args):
+    backend, frame = args
+    ticket = backend.save(frame, SHEET)
+    write_queue.wait(backend._key(SHEET), ticket)
+
+
+def _first_box(typed: pd.DataFrame) -> pd.DataFrame:
+    tray, box = typed["Tray"].iat[0], typed["Box"].iat[0]
+    return typed[(typed["Tray"] == tray) & (typed["Box"] == box)]
+
+
+def _new_rows(inv: Inventory, k: int) -> pd.DataFrame:
+    rows = inv.raw.head(k).copy()
+    rows["Tube ID"] = [f"NEW_{i}" for i in range(k)]
+    return rows
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario("load sheet", lambda inv: inv.backend(warm=False), lambda b: b.load(SHEET), sheets=True),
+    Scenario("load cached", lambda inv: inv.backend(), lambda b: b.load(SHEET), sheets=True),
+    Scenario("coerce", lambda inv: inv.raw, coerce),
+    Scenario("search index", lambda inv: inv.typed, SearchIndex.from_frame),
+    Scenario("search query", lambda inv: SearchIndex.from_frame(inv.typed),
+             lambda idx: idx.select("a549 inuse:no", sort_by="Date", ascending=False)),
+    Scenario("table page", lambda inv: (inv.typed, SearchIndex.from_frame(inv.typed).select("box:box-1")),
+             lambda a: style_by_status(a[0].iloc[a[1][:PAGE_SIZE]]).to_html()),
+    Scenario("dashboard", lambda inv: inv.typed,
+             lambda df: (len(df), int(in_use(df).sum()), df["Cell Name"].nunique())),
+    Scenario("dashboard rollup", lambda inv: Rollup.from_frame(inv.typed),
+             lambda r: (r.total, r.in_use, r.available, r.n_cell_lines)),
+    Scenario("rollup build", lambda inv: inv.typed, Rollup.from_frame),
+    Scenario("rollup apply 1 cell", lambda inv: (Rollup.from_frame(inv.typed), inv.typed,
+                                                 assign(inv.typed, [0], "Inuse", True)),
+             lambda a: a[0].copy().apply(a[1], a[2], [0], range(0))),
+    Scenario("trends", lambda inv: Rollup.from_frame(inv.typed),
+             lambda r: (r.weekly_frozen(), r.passage_distribution(), r.mycoplasma_by_lot(), r.box_fill())),
+    Scenario("occupancy index", lambda inv: inv.typed, OccupancyIndex.from_frame),
+    Scenario("box map", lambda inv: _first_box(inv.typed), lambda box: style_grid(*position_grid(box)).to_html()),
+    Scenario("lineage index", lambda inv: inv.typed, LineageIndex.from_frame),
+    Scenario("tree payload", lambda inv: inv.typed,
+             lambda df: limit_tree(build_tree(df, with_tooltips=False), TREE_DEPTH)),
+    Scenario("save 1 cell", lambda inv: (inv.backend(), to_storage(assign(inv.typed, [0], "Inuse", True), inv.report)),
+             _save, sheets=True),
+    Scenario("append 50", lambda inv: (inv.backend(), to_storage(append_rows(inv.typed, _new_rows(inv, 50)),
+                                                                 inv.report)),
+             _save, sheets=True),
+    Scenario("history 1 cell", lambda inv: (inv.history(), inv, assign(inv.typed, [0], "Inuse", True)),
+             lambda a: a[0].record(SHEET, a[1].typed, a[2], 1, 2, a[1].report)),
+    Scenario("history append 50", lambda inv: (inv.history(), inv, append_rows(inv.typed, _new_rows(inv, 50))),
+             lambda a: a[0].record(SHEET, a[1].typed, a[2], 1, 2, a[1].report)),
+    Scenario("history as-of", lambda inv: inv.history(changed_cells=500), lambda log: log.state(SHEET)),
+]
+
+
+def measure(scenario: Scenario, inv: Inventory, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        state = scenario.setup(inv)
+        start = time.perf_counter()
+        scenario.run(state)
+        best = min(best, time.perf_counter() - start)
+
+    state = scenario.setup(inv)
+    tracemalloc.start()
+    scenario.run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    meter = inv.conn.meter if scenario.sheets else None
+    return {
+        "seconds": best,
+        "peak_mb": peak / 1e6,
+        "calls": meter.total_calls if meter else 0,
+        "bytes": meter.total_bytes if meter else 0,
+    }
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    found = []
+    for key, now in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if now["seconds"] > max(before["seconds"] * tolerance, REGRESSION_FLOOR):
+            found.append(f"{key}: {before['seconds'] * 1e3:.1f} ms -> {now['seconds'] * 1e3:.1f} ms")
+        if now["calls"] > before["calls"]:
+            found.append(f"{key}: {before['calls']} -> {now['calls']} Sheets calls")
+        if now["bytes"] > before["bytes"] * tolerance:
+            found.append(f"{key}: {before['bytes']:,} -> {now['bytes']:,} payload bytes")
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000])
+    parser.add_argument("--depth", type=int, default=6, help="lineage generations per tree")
+    parser.add_argument("--fan-out", type=int, default=3, help="children per tube")
+    parser.add_argument("--fill", type=float, default=0.8, help="share of each box's slots in use")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="*", default=[], help="run scenarios starting with these names")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare with a --json file from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor")
+    args = parser.parse_args(argv)
+
+    write_queue.coalesce_delay = 0  # time the write itself, not the wait for more clicks
+    scenarios = [s for s in SCENARIOS if not args.only or any(s.name.startswith(p) for p in args.only)]
+    results = {}
+    for n in args.sizes:
+        start = time.perf_counter()
+        inv = Inventory(n, args.depth, args.fan_out, args.fill)
+        print(f"\n{n:,} tubes (depth {args.depth}, fan-out {args.fan_out}, fill {args.fill:.0%}) "
+              f"— generated in {time.perf_counter() - start:.1f} s")
+        print(f"{'scenario':<20} {'time (ms)':>10} {'peak (MB)':>10} {'calls':>6} {'payload (B)':>12}")
+        for scenario in scenarios:
+            r = measure(scenario, inv, args.repeat)
+            results[f"{n}/{scenario.name}"] = r
+            calls = f"{r['calls']:>6}" if scenario.sheets else f"{'':>6}"
+            payload = f"{r['bytes']:>12,}" if scenario.sheets else f"{'':>12}"
+            print(f"{scenario.name:<20} {r['seconds'] * 1e3:>10.1f} {r['peak_mb']:>10.1f} {calls} {payload}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        print("\nregressions:" if found else "\nno regressions", *found, sep="\n  ")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
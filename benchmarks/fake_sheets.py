@@ -0,0 +1,104 @@
+"""In-process stand-ins for a gspread Worksheet and the shared SheetsConnection.
+
+They keep the sheet as a list of rows and count every API call and its
+payload (JSON bytes sent + received), so a benchmark can report what a load
+or save would cost against the real Sheets API without touching the network.
+"""
+import json
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, TypeVar
+
+from gspread.utils import a1_to_rowcol
+
+T = TypeVar("T")
+
+
+class ApiMeter:
+    """Call counts and payload bytes per API method."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.bytes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, *payloads):
+        size = sum(len(json.dumps(p, default=str)) for p in payloads)
+        with self._lock:
+            self.calls[method] += 1
+            self.bytes[method] += size
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes.clear()
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+
+class FakeWorksheet:
+    """The Worksheet methods the app uses, backed by a list of rows (header first)."""
+
+    def __init__(self, title: str, rows: List[list], meter: ApiMeter, on_write: Callable[[], None]):
+        self.title = title
+        self.rows = [list(map(str, r)) for r in rows]
+        self._meter = meter
+        self._on_write = on_write
+
+    def get_all_values(self) -> List[list]:
+        values = [list(r) for r in self.rows]
+        self._meter.record("values.get", values)
+        return values
+
+    def update(self, values: List[list], range_name: str = "A1"):
+        self._meter.record("values.update", values)
+        self.rows = [list(map(str, r)) for r in values]
+        self._on_write()
+
+    def batch_update(self, data: List[dict]):
+        self._meter.record("values.batchUpdate", data)
+        for item in data:
+            row, col = a1_to_rowcol(item["range"].split(":")[0])
+            for r, values in enumerate(item["values"], start=row - 1):
+                self.rows[r][col - 1:col - 1 + len(values)] = map(str, values)
+        self._on_write()
+
+    def append_rows(self, values: List[list], **kwargs):
+        self._meter.record("values.append", values)
+        self.rows.extend(list(map(str, r)) for r in values)
+        self._on_write()
+
+
+class FakeConnection:
+    """SheetsConnection look-alike: worksheets by title, a revision that changes on every write."""
+
+    def __init__(self, sheets: Dict[str, List[list]], spreadsheet_key: str = "fake"):
+        self.spreadsheet_key = spreadsheet_key
+        self.meter = ApiMeter()
+        self._revision = 0
+        self.worksheets = {name: FakeWorksheet(name, rows, self.meter, self._bump) for name, rows in sheets.items()}
+
+    def _bump(self):
+        self._revision += 1
+
+    def worksheet_titles(self) -> List[str]:
+        self.meter.record("spreadsheets.get")
+        return list(self.worksheets)
+
+    def revision(self) -> str:
+        self.meter.record("drive.files.get")
+        return str(self._revision)
+
+    def run(self, sheet_name: str, op: Callable[[FakeWorksheet], T]) -> T:
+        return op(self.worksheets[sheet_name])
+
+    def batch_values(self, sheet_names: List[str]) -> List[List[list]]:
+        grids = [[list(r) for r in self.worksheets[name].rows] for name in sheet_names]
+        self.meter.record("values.batchGet", grids)
+        return grids
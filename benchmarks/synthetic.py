@@ -0,0 +1,73 @@
+"""Synthetic tube inventories for the benchmarks.
+
+    synthetic_inventory(100_000, depth=6, fan_out=3, fill=0.8)
+
+Tubes form complete lineage trees (each tube has fan_out children down to
+`depth` generations) and fill 10x10 boxes to `fill` of their capacity. The
+frame holds sheet text ("Yes"/"No", ISO dates), like a freshly loaded sheet.
+"""
+from string import ascii_uppercase
+
+import numpy as np
+import pandas as pd
+
+from celltracker.storage import TUBE_COLUMNS
+
+BOX_ROWS, BOX_COLS = 10, 10
+BOXES_PER_TRAY = 20
+
+
+def lineage_parents(n: int, depth: int, fan_out: int) -> tuple:
+    """(parent index or -1, generation, tree number) for n tubes laid out tree by tree in BFS order."""
+    level_sizes = fan_out ** np.arange(depth)
+    level_starts = np.cumsum(level_sizes)
+    tree_size = int(level_starts[-1])
+    i = np.arange(n)
+    tree, k = np.divmod(i, tree_size)
+    generation = np.searchsorted(level_starts, k, side="right")
+    parent = np.where(k > 0, tree * tree_size + (k - 1) // fan_out, -1)
+    return parent, generation, tree
+
+
+def synthetic_inventory(n: int, depth: int = 6, fan_out: int = 3, fill: float = 0.8,
+                        in_use: float = 0.3, n_lines: int = 4, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    parent, generation, tree = lineage_parents(n, depth, fan_out)
+    passage = generation + 1
+    ids = np.char.add(np.char.add("P", passage.astype(str)), np.char.add("_", np.arange(1, n + 1).astype(str)))
+    ids = ids.astype(object)
+    parents = np.where(parent >= 0, ids[np.maximum(parent, 0)], "")
+
+    # 박스마다 capacity * fill 개의 칸을 무작위로 채움
+    capacity = BOX_ROWS * BOX_COLS
+    per_box = max(1, min(capacity, int(round(capacity * fill))))
+    box, k = np.divmod(np.arange(n), per_box)
+    n_boxes = int(box[-1]) + 1 if n else 0
+    slots = np.argsort(rng.random((n_boxes, capacity)), axis=1)[:, :per_box]
+    slot = slots[box, k]
+    rows = np.array(list(ascii_uppercase[:BOX_ROWS]), dtype=object)[slot // BOX_COLS]
+    positions = rows + (slot % BOX_COLS + 1).astype(str).astype(object)
+
+    lines = np.array(["A549", "U2OS", "HeLa", "MCF7", "HEK293", "Jurkat"][:max(1, n_lines)], dtype=object)
+    dates = pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 700, n), unit="D")
+    df = pd.DataFrame({
+        "Tube ID": ids,
+        "Cell Name": lines[tree % len(lines)],
+        "Passage": passage,
+        "Parent Tube": parents,
+        "Position": positions,
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Tray": np.char.add("Tray-", (box // BOXES_PER_TRAY + 1).astype(str)).astype(object),
+        "Box": np.char.add("Box-", (box % BOXES_PER_TRAY + 1).astype(str)).astype(object),
+        "Lot": rng.choice(["L202403", "L202404", "L202411"], n),
+        "Mycoplasma": np.where(rng.random(n) < 0.02, "Yes", "No").astype(object),
+        "Operator": rng.choice(["Chaeyoung", "Jihuyn", "Johun"], n),
+        "Info": "",
+        "Inuse": np.where(rng.random(n) < in_use, "Yes", "No").astype(object),
+    })
+    return df[TUBE_COLUMNS]
+
+
+def sheet_rows(df: pd.DataFrame) -> list:
+    """Header + rows of cell text, as get_all_values() returns them."""
+    return [list(df.columns)] + df.astype(str).to_numpy().tolist()
@@ -0,0 +1 @@
+"""Data layer for the Cell Line Manager app (no Streamlit imports here)."""
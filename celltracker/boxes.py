@@ -0,0 +1,242 @@
+"""Freezer box layouts and the per-box position grid."""
+from dataclasses import dataclass
+from string import ascii_uppercase
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from celltracker.schema import in_use as in_use_mask
+
+EMPTY_STYLE = 'background-color: #f8f9fa'
+IN_USE_STYLE = 'background-color: rgba(231, 76, 60, 0.7); color: white; font-weight: bold; text-align: center'
+AVAILABLE_STYLE = 'background-color: rgba(46, 204, 113, 0.7); color: white; font-weight: bold; text-align: center'
+
+
+def _row_label(i: int) -> str:
+    # A..Z, then AA, AB, ... for boxes with more than 26 rows
+    label = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        label = ascii_uppercase[r] + label
+    return label
+
+
+@dataclass(frozen=True)
+class BoxLayout:
+    n_rows: int = 10
+    n_cols: int = 10
+
+    @property
+    def capacity(self) -> int:
+        return self.n_rows * self.n_cols
+
+    @property
+    def row_labels(self) -> List[str]:
+        return [_row_label(i) for i in range(self.n_rows)]
+
+    @property
+    def col_labels(self) -> List[str]:
+        return [str(i) for i in range(1, self.n_cols + 1)]
+
+    @property
+    def name(self) -> str:
+        return f"{self.n_rows}x{self.n_cols}"
+
+    def slots(self, positions: pd.Series) -> np.ndarray:
+        """Flat slot number (row-major) for each Position like 'A1' / 'b10'; -1 if not in this box."""
+        parts = positions.astype(str).str.strip().str.upper().str.extract(r"^([A-Z]+)(\d+)$")
+        rows = pd.Index(self.row_labels).get_indexer(parts[0]).astype(np.int64)
+        cols = pd.to_numeric(parts[1], errors="coerce").fillna(0).to_numpy(dtype=np.int64) - 1
+        ok = (rows >= 0) & (cols >= 0) & (cols < self.n_cols)
+        return np.where(ok, rows * self.n_cols + cols, -1)
+
+    def label(self, slot: int) -> str:
+        r, c = divmod(int(slot), self.n_cols)
+        return f"{_row_label(r)}{c + 1}"
+
+
+DEFAULT_LAYOUT = BoxLayout(10, 10)
+
+# 자주 쓰는 박스 규격
+BOX_LAYOUTS: Dict[str, BoxLayout] = {
+    "10x10 (100)": DEFAULT_LAYOUT,
+    "9x9 (81)": BoxLayout(9, 9),
+    "8x12 (96)": BoxLayout(8, 12),
+    "5x5 (25)": BoxLayout(5, 5),
+}
+
+
+def position_grid(box_df: pd.DataFrame, layout: BoxLayout = DEFAULT_LAYOUT) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Tube IDs and cell styles for one box, computed in a single pass.
+
+    When two tubes claim the same slot the later row is shown.
+    """
+    slots = layout.slots(box_df["Position"])
+    placed = slots >= 0
+    slots = slots[placed]
+    ids = box_df["Tube ID"].astype(str).to_numpy()[placed]
+    in_use = in_use_mask(box_df)[placed]
+
+    tube_grid = np.full(layout.capacity, "", dtype=object)
+    style_grid = np.full(layout.capacity, EMPTY_STYLE, dtype=object)
+    last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]  # last row per slot
+    tube_grid[slots[last]] = ids[last]
+    style_grid[slots[last]] = np.where(in_use[last], IN_USE_STYLE, AVAILABLE_STYLE)
+
+    shape = (layout.n_rows, layout.n_cols)
+    index, columns = layout.row_labels, layout.col_labels
+    return (pd.DataFrame(tube_grid.reshape(shape), index=index, columns=columns),
+            pd.DataFrame(style_grid.reshape(shape), index=index, columns=columns))
+
+
+def style_grid(tubes: pd.DataFrame, styles: pd.DataFrame):
+    return tubes.style.apply(lambda _: styles, axis=None)
+
+
+def render_box_position_map(box_df: pd.DataFrame, layout: BoxLayout = DEFAULT_LAYOUT):
+    """Styled box grid: empty slots grey, tubes in use red, available tubes green."""
+    return style_grid(*position_grid(box_df, layout))
+
+
+def parse_layout(spec: str) -> BoxLayout:
+    """'10x10' / '8x12 (96)' -> BoxLayout."""
+    rows, _, cols = spec.split(" ")[0].lower().partition("x")
+    return BoxLayout(int(rows), int(cols))
+
+
+# ------------------ OCCUPANCY INDEX ------------------
+class OccupancyIndex:
+    """One occupancy bitmap per (Tray, Box): bit i is set when slot i is taken.
+
+    Collision checks and "next free slot" are a few integer bit operations,
+    and register/remove update a single bit, so the index can be kept
+    current between full rebuilds. Tubes in a box without a usable slot
+    (blank or invalid Position, or a slot another tube also claims) still
+    count towards the box and are listed by misplaced().
+    """
+
+    def __init__(self, layouts: Dict[Tuple[str, str], BoxLayout] = None,
+                 default_layout: BoxLayout = DEFAULT_LAYOUT):
+        self.layouts = dict(layouts or {})
+        self.default_layout = default_layout
+        self.bitmaps: Dict[Tuple[str, str], int] = {}
+        self.owners: Dict[Tuple[str, str], Dict[int, str]] = {}
+        self.counts: Dict[Tuple[str, str], int] = {}
+        # (Tray, Box) -> [(Tube ID, Position, problem)]
+        self.problems: Dict[Tuple[str, str], List[Tuple[str, str, str]]] = {}
+        self.version = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, layouts: Dict[Tuple[str, str], BoxLayout] = None,
+                   default_layout: BoxLayout = DEFAULT_LAYOUT) -> "OccupancyIndex":
+        index = cls(layouts, default_layout)
+        located = df.dropna(subset=["Tray", "Box"])
+        for (tray, box), group in located.groupby(["Tray", "Box"], sort=False, observed=True):
+            key = (str(tray), str(box))
+            layout = index.layout(*key)
+            slots = layout.slots(group["Position"])
+            ok = slots >= 0
+            taken, first, shared = np.unique(slots[ok], return_inverse=True, return_counts=True)
+            # bitmap from the set slots: pack to bytes once instead of OR-ing bit by bit
+            bits = np.zeros(layout.capacity, dtype=np.uint8)
+            bits[taken] = 1
+            index.bitmaps[key] = int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+            ids = group["Tube ID"].astype(str).to_numpy()
+            index.owners[key] = dict(zip(slots[ok].tolist(), ids[ok]))
+            index.counts[key] = len(group)
+            collided = np.zeros(len(group), dtype=bool)
+            collided[ok] = shared[first] > 1
+            if not ok.all() or collided.any():
+                positions = group["Position"].fillna("").astype(str).str.strip().to_numpy()
+                index.problems[key] = [
+                    (tube, pos, "no position" if not pos else
+                     f"not a slot of a {layout.name} box" if slot < 0 else f"{pos.upper()} is claimed twice")
+                    for tube, pos, slot in zip(ids[~ok | collided], positions[~ok | collided],
+                                               slots[~ok | collided])]
+        return index
+
+    def layout(self, tray: str, box: str) -> BoxLayout:
+        return self.layouts.get((str(tray), str(box)), self.default_layout)
+
+    def _slot(self, tray: str, box: str, position: str) -> int:
+        slot = int(self.layout(tray, box).slots(pd.Series([position]))[0])
+        if slot < 0:
+            raise ValueError(f"{position!r} is not a slot of a {self.layout(tray, box).name} box")
+        return slot
+
+    # ---- queries ----
+    def is_free(self, tray: str, box: str, position: str) -> bool:
+        slot = self._slot(tray, box, position)
+        return not (self.bitmaps.get((str(tray), str(box)), 0) >> slot) & 1
+
+    def occupant(self, tray: str, box: str, position: str) -> str:
+        slot = self._slot(tray, box, position)
+        return self.owners.get((str(tray), str(box)), {}).get(slot, "")
+
+    def occupied(self, tray: str, box: str) -> np.ndarray:
+        """Bool array over the box's slots (row-major), True where taken."""
+        capacity = self.layout(tray, box).capacity
+        bitmap = self.bitmaps.get((str(tray), str(box)), 0)
+        raw = np.frombuffer(bitmap.to_bytes((capacity + 7) // 8, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:capacity].astype(bool)
+
+    def used(self, tray: str, box: str) -> int:
+        return self.bitmaps.get((str(tray), str(box)), 0).bit_count()
+
+    def free_slots(self, tray: str, box: str, n: int = 1, contiguous: bool = False) -> List[str]:
+        """First n free positions (row-major); with contiguous=True they form one run within a single row."""
+        layout = self.layout(tray, box)
+        full = (1 << layout.capacity) - 1
+        free = ~self.bitmaps.get((str(tray), str(box)), 0) & full
+        if n <= 0 or not free:
+            return []
+        if contiguous:
+            if n > layout.n_cols:
+                return []
+            # 한 줄 끝에서 다음 줄로 넘어가지 않도록 시작 칸은 각 줄의 앞쪽 n_cols - n + 1칸으로 제한
+            row_starts = (1 << (layout.n_cols - n + 1)) - 1
+            starts = free & sum(row_starts << (r * layout.n_cols) for r in range(layout.n_rows))
+            for k in range(1, n):
+                starts &= free >> k
+            if not starts:
+                return []
+            first = (starts & -starts).bit_length() - 1
+            return [layout.label(s) for s in range(first, first + n)]
+        picked = []
+        while free and len(picked) < n:
+            low = free & -free
+            picked.append(layout.label(low.bit_length() - 1))
+            free ^= low
+        return picked if len(picked) == n else []
+
+    def summary(self) -> pd.DataFrame:
+        """Per box: every tube in it (Used), slots left, and how many of its tubes have no usable slot."""
+        rows = [(tray, box, used, self.layout(tray, box).capacity, len(self.problems.get((tray, box), ())))
+                for (tray, box), used in self.counts.items()]
+        out = pd.DataFrame(rows, columns=["Tray", "Box", "Used", "Capacity", "Misplaced"])
+        out.insert(4, "Remaining", (out["Capacity"] - out["Used"]).clip(lower=0))
+        return out.sort_values(["Tray", "Box"], ignore_index=True)
+
+    def misplaced(self) -> pd.DataFrame:
+        """Tubes counted in a box but not on its grid: blank or invalid Position, or a slot claimed twice."""
+        rows = [(tray, box, *problem) for (tray, box), problems in self.problems.items() for problem in problems]
+        out = pd.DataFrame(rows, columns=["Tray", "Box", "Tube ID", "Position", "Problem"])
+        return out.sort_values(["Tray", "Box", "Position"], ignore_index=True)
+
+    # ---- incremental updates ----
+    def add(self, tray: str, box: str, position: str, tube_id: str):
+        """Mark a slot taken; raises ValueError when another tube already holds it."""
+        key, slot = (str(tray), str(box)), self._slot(tray, box, position)
+        if (self.bitmaps.get(key, 0) >> slot) & 1:
+            raise ValueError(f"{position} in {tray}/{box} is already taken by {self.owners[key].get(slot, '?')}")
+        self.bitmaps[key] = self.bitmaps.get(key, 0) | (1 << slot)
+        self.owners.setdefault(key, {})[slot] = str(tube_id)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def remove(self, tray: str, box: str, position: str):
+        key, slot = (str(tray), str(box)), self._slot(tray, box, position)
+        self.bitmaps[key] = self.bitmaps.get(key, 0) & ~(1 << slot)
+        if self.owners.get(key, {}).pop(slot, None) is not None:
+            self.counts[key] -= 1
@@ -0,0 +1,123 @@
+"""Bulk tube registration: file uploads and freeze-down batches.
+
+A batch is validated as a whole against the current sheet and then appended
+in one save, so a 50-vial freeze-down is a single append instead of 50
+full rewrites.
+"""
+import io
+import re
+from datetime import date
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from celltracker.boxes import OccupancyIndex
+from celltracker.schema import ISSUE_COLUMNS, coerce
+
+REQUIRED_COLUMNS = ["Tube ID", "Cell Name"]
+
+
+def read_upload(data: bytes, filename: str, sheet_name: Optional[str] = None) -> pd.DataFrame:
+    """Tubes from an uploaded .csv or .xlsx (the worksheet named sheet_name, else the first)."""
+    if filename.lower().endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+    else:
+        sheets = pd.read_excel(io.BytesIO(data), sheet_name=None)
+        df = sheets.get(sheet_name, next(iter(sheets.values())))
+    df.columns = [str(c).strip() for c in df.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing column(s): {', '.join(missing)}")
+    return df
+
+
+def next_tube_ids(existing: pd.Series, passage: int, n: int) -> list:
+    """P{passage}_{k} names continuing after the highest k already used for that passage."""
+    pattern = re.compile(rf"^P{passage}_(\d+)$")
+    used = [int(m.group(1)) for m in map(pattern.match, existing.astype(str)) if m]
+    start = max(used, default=0) + 1
+    return [f"P{passage}_{k}" for k in range(start, start + n)]
+
+
+def freeze_batch(tubes: pd.DataFrame, parent_id: str, n: int, tray: str, box: str,
+                 occupancy: OccupancyIndex, contiguous: bool = True, freeze_date: date = None,
+                 lot: str = "", operator: str = "", info: str = "") -> pd.DataFrame:
+    """N vials frozen from one parent: next passage, fresh IDs, next free slots in the box."""
+    parent = tubes.loc[tubes["Tube ID"] == parent_id]
+    if parent.empty:
+        raise ValueError(f"parent tube {parent_id} not found")
+    parent = parent.iloc[-1]
+    passage = int(parent["Passage"]) + 1 if pd.notna(parent["Passage"]) else 1
+    positions = occupancy.free_slots(tray, box, n, contiguous)
+    if not positions:
+        raise ValueError(f"{tray}/{box} has no room for {n} {'contiguous ' if contiguous else ''}vials")
+    return pd.DataFrame({
+        "Tube ID": next_tube_ids(tubes["Tube ID"], passage, n),
+        "Cell Name": parent["Cell Name"],
+        "Passage": passage,
+        "Parent Tube": parent_id,
+        "Position": positions,
+        "Date": (freeze_date or date.today()).isoformat(),
+        "Tray": tray,
+        "Box": box,
+        "Lot": lot,
+        "Mycoplasma": "Yes" if parent["Mycoplasma"] else "No",
+        "Operator": operator,
+        "Info": info,
+        "Inuse": "No",
+    })
+
+
+def validate_batch(tubes: pd.DataFrame, batch: pd.DataFrame, occupancy: OccupancyIndex):
+    """(typed batch, issues) for new rows checked against the typed sheet `tubes`.
+
+    Issue rows use the batch's own row numbers (header = row 1), like SchemaReport.
+    """
+    batch = batch.reindex(columns=tubes.columns)
+    # JSON 등에서 온 목록/객체는 글자로 바꿔 저장하지 않는다 ("['A']" 같은 Tube ID 방지)
+    nested = batch.map(lambda v: isinstance(v, (list, tuple, dict, set)))
+    typed, report = coerce(batch)
+    problems = [report.issues]
+
+    def flag(mask, col: str, problem: str):
+        rows = np.flatnonzero(np.asarray(mask))
+        if len(rows):
+            problems.append(pd.DataFrame({"Row": rows + 2, "Tube ID": typed["Tube ID"].to_numpy()[rows],
+                                          "Column": col, "Value": typed[col].astype(object).to_numpy()[rows],
+                                          "Problem": problem}))
+
+    for col in nested.columns[nested.any().to_numpy()]:
+        flag(nested[col], col, "not a single value")
+    ids = typed["Tube ID"]
+    flag(ids.isin(tubes["Tube ID"]) & (ids != ""), "Tube ID", "Tube ID already exists")
+    flag(typed["Cell Name"].astype(object).fillna("").astype(str).str.strip() == "", "Cell Name", "missing Cell Name")
+
+    # 위치: 배치 안에서 겹치는지, 기존 튜브와 겹치는지, 박스 규격 안인지
+    located = (typed["Tray"].notna() & typed["Box"].notna()).to_numpy()
+    if located.any():
+        tray, box = typed["Tray"].astype(str).to_numpy(), typed["Box"].astype(str).to_numpy()
+        slots = np.full(len(typed), -1)
+        taken = np.zeros(len(typed), dtype=bool)
+        for key in set(zip(tray[located], box[located])):
+            in_box = located & (tray == key[0]) & (box == key[1])
+            box_slots = occupancy.layout(*key).slots(typed["Position"][in_box])
+            slots[in_box] = box_slots
+            taken[in_box] = (box_slots >= 0) & occupancy.occupied(*key)[np.maximum(box_slots, 0)]
+        flag(located & (slots < 0), "Position", "not a slot of this box")
+        flag(taken, "Position", "slot already taken")
+        slot_keys = pd.Series(list(zip(tray, box, slots)))
+        flag(located & (slots >= 0) & slot_keys.duplicated(keep=False).to_numpy(), "Position",
+             "same slot used twice in this batch")
+
+    # 부모: 기존 시트나 같은 배치 안에 있어야 하고, passage가 줄어들면 안 됨
+    parents = typed["Parent Tube"]
+    all_ids = pd.concat([tubes["Tube ID"], ids], ignore_index=True)
+    all_passages = pd.concat([tubes["Passage"], typed["Passage"]], ignore_index=True)
+    flag((parents != "") & ~parents.isin(all_ids), "Parent Tube", "parent not found")
+    parent_passage = parents.map(pd.Series(all_passages.to_numpy(), index=all_ids).groupby(level=0).last())
+    flag((typed["Passage"] < parent_passage).fillna(False), "Passage", "passage lower than its parent's")
+
+    problems = [p for p in problems if not p.empty]
+    issues = pd.concat(problems, ignore_index=True) if problems else pd.DataFrame(columns=ISSUE_COLUMNS)
+    return typed, issues[ISSUE_COLUMNS].sort_values(["Row", "Column"], ignore_index=True)
@@ -0,0 +1,172 @@
+"""Versioned, cross-session cache of worksheet DataFrames."""
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional
+
+import pandas as pd
+
+REVISION_CHECK_INTERVAL = 5.0  # seconds between revision probes for the same key
+
+
+@dataclass
+class CacheEntry:
+    frame: pd.DataFrame
+    revision: Optional[str]
+    version: int
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+class FrameCache:
+    """Keeps one DataFrame per key and refetches only when the revision changes.
+
+    `revision_fn` must be cheap (e.g. the spreadsheet's modified time); `fetch_fn`
+    is the full download and is called at most once per revision, even when many
+    sessions ask at the same time.
+    """
+
+    def __init__(self, check_interval: float = REVISION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries: Dict[Hashable, CacheEntry] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._guard = threading.Lock()  # _entries/_locks 의 모든 접근을 보호
+        self._batch_lock = threading.Lock()
+        self._versions = itertools.count(1)
+
+    def _lock_for(self, key) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _entry(self, key) -> Optional[CacheEntry]:
+        with self._guard:
+            return self._entries.get(key)
+
+    def get(self, key: Hashable,
+            revision_fn: Callable[[], Optional[str]],
+            fetch_fn: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+        with self._lock_for(key):
+            entry = self._entry(key)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked_at < self.check_interval:
+                return entry.frame.copy()
+            revision = revision_fn()
+            if entry is not None and revision is not None and revision == entry.revision:
+                entry.checked_at = now
+                return entry.frame.copy()
+            frame = fetch_fn()
+            self._store(key, frame, revision)
+            return frame.copy()
+
+    def get_many(self, keys: List[Hashable],
+                 revision_fn: Callable[[], Optional[str]],
+                 fetch_many_fn: Callable[[List[Hashable]], Dict[Hashable, pd.DataFrame]]) -> Dict[Hashable, pd.DataFrame]:
+        """get() for several keys that share one revision (e.g. the sheets of one spreadsheet).
+
+        The revision is probed once, and all stale keys are fetched together by a
+        single fetch_many_fn call. A refetched frame equal to the cached one keeps
+        its version, so caches derived from it stay valid.
+        """
+        with self._batch_lock:
+            now = time.monotonic()
+            out, stale = {}, []
+            for key in keys:
+                entry = self._entry(key)
+                if entry is not None and now - entry.checked_at < self.check_interval:
+                    out[key] = entry.frame.copy()
+                else:
+                    stale.append(key)
+            if not stale:
+                return out
+            revision = revision_fn()
+            fetch = []
+            for key in stale:
+                entry = self._entry(key)
+                if entry is not None and revision is not None and revision == entry.revision:
+                    entry.checked_at = now
+                    out[key] = entry.frame.copy()
+                else:
+                    fetch.append(key)
+            if fetch:
+                for key, frame in fetch_many_fn(fetch).items():
+                    with self._lock_for(key):
+                        entry = self._entry(key)
+                        same = entry is not None and entry.frame.equals(frame)
+                        with self._guard:
+                            # 비교하는 사이 invalidate/put 된 항목은 건드리지 않고 새로 저장
+                            if same and self._entries.get(key) is entry:
+                                entry.revision, entry.checked_at = revision, now
+                            else:
+                                self._store_locked(key, frame, revision)
+                    out[key] = frame.copy()
+            return out
+
+    def put(self, key: Hashable, frame: pd.DataFrame, revision: Optional[str] = None):
+        """Replace the cached frame right after a write so readers skip the refetch."""
+        with self._lock_for(key):
+            self._store(key, frame.copy(), revision)
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry]:
+        """Current entry without any revision check or fetch (None when absent)."""
+        return self._entry(key)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._guard:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def version(self, key: Hashable) -> int:
+        """Data version for key, unique across the cache (0 when nothing is cached)."""
+        entry = self._entry(key)
+        return entry.version if entry is not None else 0
+
+    def _store(self, key, frame: pd.DataFrame, revision: Optional[str]):
+        with self._guard:
+            self._store_locked(key, frame, revision)
+
+    def _store_locked(self, key, frame: pd.DataFrame, revision: Optional[str]):
+        # _guard 를 잡은 상태에서만 호출
+        self._entries[key] = CacheEntry(frame=frame, revision=revision, version=next(self._versions))
+
+
+# 모든 세션이 공유하는 캐시
+frames = FrameCache()
+
+
+class StaleWhileRevalidate:
+    """A single value served from memory and refreshed on a background thread.
+
+    The first get() blocks on fetch_fn; after that, a value older than max_age
+    is returned as-is while one background refresh runs. Refresh errors keep
+    the old value.
+    """
+
+    def __init__(self, fetch_fn: Callable[[], object], max_age: float = 60.0):
+        self.fetch_fn = fetch_fn
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._value = None
+        self._fetched_at: Optional[float] = None
+        self._refreshing = False
+        self.error: Optional[Exception] = None
+
+    def get(self):
+        with self._lock:
+            if self._fetched_at is None:
+                self._value, self._fetched_at = self.fetch_fn(), time.monotonic()
+            elif time.monotonic() - self._fetched_at > self.max_age and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, name="stale-while-revalidate", daemon=True).start()
+            return self._value
+
+    def _refresh(self):
+        try:
+            value, error = self.fetch_fn(), None
+        except Exception as e:
+            value, error = None, e
+        with self._lock:
+            if error is None:
+                self._value = value
+            self._fetched_at, self.error, self._refreshing = time.monotonic(), error, False
@@ -0,0 +1,428 @@
+"""Tube inventory operations without Streamlit, shared by app.py and the HTTP service.
+
+One Inventory per storage backend lives for the whole process. Everything
+derived from a sheet (typed frame, Tube ID / search / lineage / occupancy
+indexes) is cached per data version, so a warm lookup is an index probe
+rather than a reload, and a batch of registrations is one validated append.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from celltracker import telemetry
+from celltracker.boxes import DEFAULT_LAYOUT, BoxLayout, OccupancyIndex, parse_layout
+from celltracker.bulk import validate_batch
+from celltracker.cache import StaleWhileRevalidate
+from celltracker.delta import removed_rows
+from celltracker.events import HISTORY_FILE, SNAPSHOT_EVERY, EventLog, frame_changes, get_event_log
+from celltracker.inventory import merge_sheets
+from celltracker.lineage import LineageIndex, build_tree, limit_tree
+from celltracker.rollups import Rollup
+from celltracker.schema import SchemaReport, append_rows, assign, coerce, field_value, to_storage
+from celltracker.search import SearchIndex
+from celltracker.storage import DATA_FILE, DB_FILE, StorageBackend, get_backend, import_excel
+
+log = logging.getLogger("celltracker.core")
+
+ALL_SHEETS = "*"  # every sheet merged into one read-only view
+EDITABLE_FIELDS = ["Inuse", "Mycoplasma", "Operator", "Lot", "Info"]
+MAX_FRAMES = 64  # typed frames kept (one per sheet and data version)
+SHEET_NAMES_MAX_AGE = 60.0
+
+
+class BatchRejected(ValueError):
+    """New tubes that failed validation; issues has the SchemaReport columns (Row = batch row + 1)."""
+
+    def __init__(self, issues: pd.DataFrame):
+        self.issues = issues
+        super().__init__(f"{issues['Row'].nunique()} row(s) need fixing before import")
+
+
+# ------------------ configuration ------------------
+def open_storage(secrets: dict, environ=os.environ) -> StorageBackend:
+    """[storage] backend = "gsheet" | "sqlite" (CELLTRACKER_BACKEND wins); a new SQLite store imports tude_data.xlsx."""
+    conf = secrets.get("storage", {})
+    kind = (environ.get("CELLTRACKER_BACKEND") or conf.get("backend")
+            or ("gsheet" if "gspread" in secrets else "sqlite"))
+    storage = get_backend(kind, secrets.get("gspread"), conf.get("path", DB_FILE))
+    if kind == "sqlite" and not storage.sheet_names() and os.path.exists(DATA_FILE):
+        # 처음 실행: 엑셀 파일에서 한 번 가져오기
+        import_excel(storage, DATA_FILE)
+    return storage
+
+
+def open_history(secrets: dict) -> Optional[EventLog]:
+    """[history] path = "celltracker-history.db", snapshot_every = 1000; enabled = false turns the change log off."""
+    conf = secrets.get("history", {})
+    if not conf.get("enabled", True):
+        return None
+    return get_event_log(conf.get("path", HISTORY_FILE), int(conf.get("snapshot_every", SNAPSHOT_EVERY)))
+
+
+def box_layouts(conf: dict) -> Tuple[Dict[Tuple[str, str], BoxLayout], BoxLayout]:
+    """[boxes] default = "10x10", [boxes.layouts] "Tray-2/Box-A1" = "8x12" -> (layouts, default)."""
+    default = parse_layout(conf["default"]) if "default" in conf else DEFAULT_LAYOUT
+    layouts = {}
+    for name, spec in conf.get("layouts", {}).items():
+        tray, _, box = name.partition("/")
+        layouts[(tray, box)] = parse_layout(spec)
+    return layouts, default
+
+
+def lineage_view(df: pd.DataFrame, lineage: LineageIndex, cell: Optional[str] = None,
+                 in_use: Optional[bool] = None, focus: Optional[str] = None) -> pd.DataFrame:
+    """Tubes to draw: one cell line and/or status, optionally only the subtree under focus (as the new root)."""
+    if cell is not None:
+        df = df[df["Cell Name"] == cell]
+    if in_use is not None:
+        df = df[df["Inuse"] == in_use]
+    if focus is not None:
+        df = df[lineage.subtree_mask(df, focus)].copy()
+        df.loc[df["Tube ID"] == focus, "Parent Tube"] = ""
+    return df
+
+
+# ------------------ inventory ------------------
+class Inventory:
+    """Reads, indexes and writes for one storage backend; thread-safe and meant to be shared.
+
+    Frames returned by tubes()/snapshot() are shared with the cache: copy before
+    modifying them (schema.assign / append_rows already do).
+    """
+
+    def __init__(self, storage: StorageBackend, layouts: Dict[Tuple[str, str], BoxLayout] = None,
+                 default_layout: BoxLayout = DEFAULT_LAYOUT):
+        self.storage = storage
+        self.layouts = dict(layouts or {})
+        self.default_layout = default_layout
+        self._names = StaleWhileRevalidate(storage.sheet_names, max_age=SHEET_NAMES_MAX_AGE)
+        self._frames: "OrderedDict[tuple, Tuple[pd.DataFrame, SchemaReport]]" = OrderedDict()
+        self._indexes: Dict[tuple, tuple] = {}  # (kind, sheet) -> (version, index)
+        self._occupancy: Dict[str, OccupancyIndex] = {}
+        self._rollups: Dict[str, Rollup] = {}
+        self.history: Optional[EventLog] = None
+        self._lock = threading.Lock()
+        self._write_locks: Dict[str, threading.RLock] = {}
+
+    def configure_boxes(self, layouts: Dict[Tuple[str, str], BoxLayout], default_layout: BoxLayout):
+        if layouts != self.layouts or default_layout != self.default_layout:
+            with self._lock:
+                self.layouts, self.default_layout = dict(layouts), default_layout
+                self._occupancy.clear()
+
+    def configure_history(self, history: Optional[EventLog]):
+        """Record every save in this change log (None: no history)."""
+        self.history = history
+
+    # ---- sheets ----
+    def sheet_names(self) -> List[str]:
+        # 캐시된 목록을 바로 쓰고, 1분이 지나면 백그라운드에서 갱신
+        return list(self._names.get())
+
+    def has_sheet(self, sheet: str) -> bool:
+        # 캐시된 목록에 없으면 저장소에 한 번 더 물어봄 (방금 만든 시트를 1분 동안 거절하지 않도록)
+        return sheet == ALL_SHEETS or sheet in self.sheet_names() or sheet in self.storage.sheet_names()
+
+    def version(self, sheet: str) -> Hashable:
+        if sheet == ALL_SHEETS:
+            return tuple(self.storage.version(name) for name in self.sheet_names())
+        return self.storage.version(sheet)
+
+    def _typed(self, sheet: str, version, load: Callable[[], pd.DataFrame]) -> Tuple[pd.DataFrame, SchemaReport]:
+        key = (sheet, version)
+        with self._lock:
+            hit = self._frames.get(key)
+            if hit is not None:
+                self._frames.move_to_end(key)
+                return hit
+        raw = load()
+        with telemetry.span("coerce", sheet=sheet):
+            typed = coerce(raw)
+        with self._lock:
+            self._frames[key] = typed
+            while len(self._frames) > MAX_FRAMES:
+                self._frames.popitem(last=False)
+        return typed
+
+    def _load(self, sheet: str) -> Tuple[pd.DataFrame, SchemaReport]:
+        def load():
+            with telemetry.span("storage.load", sheet=sheet):
+                return self.storage.load(sheet)
+
+        if self.storage.exact_version:
+            # 버전만 보고 판단할 수 있으면 바뀌지 않은 시트는 다시 읽지 않는다
+            return self._typed(sheet, self.storage.version(sheet), load)
+        # Google Sheets: load()가 수정 시각을 확인해야 버전이 갱신된다
+        raw = load()
+        return self._typed(sheet, self.storage.version(sheet), lambda: raw)
+
+    def _load_all(self) -> Tuple[pd.DataFrame, SchemaReport]:
+        names = self.sheet_names()
+        with telemetry.span("storage.load_many", sheets=len(names)):
+            raws = self.storage.load_many(names)
+        parts = {name: self._typed(name, self.storage.version(name), lambda raw=raw: raw)
+                 for name, raw in raws.items()}
+        key = (ALL_SHEETS, self.version(ALL_SHEETS))
+        with self._lock:
+            hit = self._frames.get(key)
+        if hit is None:
+            with telemetry.span("merge"):
+                hit = merge_sheets(parts)
+            with self._lock:
+                self._frames[key] = hit
+        return hit
+
+    def tubes(self, sheet: str) -> Tuple[pd.DataFrame, SchemaReport]:
+        """(typed frame, validation report); ALL_SHEETS merges every sheet with sheet-qualified IDs."""
+        return self._load_all() if sheet == ALL_SHEETS else self._load(sheet)
+
+    def snapshot(self, sheet: str) -> Tuple[pd.DataFrame, SchemaReport, Hashable]:
+        """tubes() plus the data version they belong to (the key for the index methods)."""
+        df, report = self.tubes(sheet)
+        return df, report, self.version(sheet)
+
+    # ---- indexes (built once per data version) ----
+    def _index(self, kind: str, sheet: str, version, df: pd.DataFrame, build: Callable[[pd.DataFrame], object]):
+        key = (kind, sheet)
+        with self._lock:
+            hit = self._indexes.get(key)
+        if hit is not None and version is not None and hit[0] == version:
+            return hit[1]
+        with telemetry.span(f"index.{kind}", sheet=sheet, rows=len(df)):
+            index = build(df)
+        with self._lock:
+            self._indexes[key] = (version, index)
+        return index
+
+    def search_index(self, sheet: str, version, df: pd.DataFrame) -> SearchIndex:
+        return self._index("search", sheet, version, df, SearchIndex.from_frame)
+
+    def lineage_index(self, sheet: str, version, df: pd.DataFrame) -> LineageIndex:
+        return self._index("lineage", sheet, version, df, LineageIndex.from_frame)
+
+    def id_index(self, sheet: str, version, df: pd.DataFrame) -> pd.Series:
+        """Tube ID -> row position (the last row wins for a duplicated ID)."""
+        def build(frame):
+            positions = pd.Series(np.arange(len(frame)), index=frame["Tube ID"].astype(str).to_numpy())
+            return positions[~positions.index.duplicated(keep="last")]
+        return self._index("ids", sheet, version, df, build)
+
+    def occupancy(self, sheet: str, version, df: pd.DataFrame) -> OccupancyIndex:
+        # 등록할 때는 비트만 갱신하고, 다른 곳에서 데이터가 바뀌었을 때만 다시 만든다
+        with self._lock:
+            occ = self._occupancy.get(sheet)
+        if occ is None or version is None or occ.version != version:
+            with telemetry.span("index.occupancy", sheet=sheet, rows=len(df)):
+                occ = OccupancyIndex.from_frame(df, self.layouts, self.default_layout)
+            occ.version = version
+            with self._lock:
+                self._occupancy[sheet] = occ
+        return occ
+
+    def rollup(self, sheet: str, version, df: pd.DataFrame) -> Rollup:
+        """Dashboard aggregates; saves through this Inventory update them in place instead of a rebuild."""
+        if sheet == ALL_SHEETS:
+            # 시트별 집계를 더하기만 한다 (병합된 프레임을 다시 훑지 않음)
+            def combine(_):
+                parts = []
+                for name in self.sheet_names():
+                    part_df, _ = self.tubes(name)
+                    parts.append(self.rollup(name, self.storage.version(name), part_df))
+                return Rollup.combine(parts)
+            return self._index("rollup", sheet, version, df, combine)
+        with self._lock:
+            rollup = self._rollups.get(sheet)
+        if rollup is None or version is None or rollup.version != version:
+            with telemetry.span("index.rollup", sheet=sheet, rows=len(df)):
+                rollup = Rollup.from_frame(df)
+            rollup.version = version
+            with self._lock:
+                self._rollups[sheet] = rollup
+        return rollup
+
+    # ---- queries ----
+    def search(self, sheet: str, query: str = "", sort_by: Optional[str] = None, ascending: bool = True) -> pd.DataFrame:
+        """Matching tubes (search.parse_query syntax), in sort order when sort_by is given."""
+        df, _, version = self.snapshot(sheet)
+        return df.iloc[self.search_index(sheet, version, df).select(query, sort_by=sort_by, ascending=ascending)]
+
+    def lookup(self, sheet: str, tube_ids: Iterable[str]) -> Tuple[pd.DataFrame, List[str]]:
+        """(rows in the order asked for, IDs not found)."""
+        df, _, version = self.snapshot(sheet)
+        positions = self.id_index(sheet, version, df).reindex([str(t) for t in tube_ids])
+        missing = positions.index[positions.isna()].tolist()
+        return df.iloc[positions.dropna().to_numpy(dtype=np.int64)], missing
+
+    def lineage(self, sheet: str, tube_id: str) -> dict:
+        df, _, version = self.snapshot(sheet)
+        index = self.lineage_index(sheet, version, df)
+        if tube_id not in index:
+            raise KeyError(tube_id)
+        return {"tube_id": tube_id, "generation": index.generation(tube_id),
+                "ancestors": index.ancestors(tube_id), "descendants": index.descendants(tube_id)}
+
+    def tree(self, sheet: str, depth: int = 4, cell: Optional[str] = None, in_use: Optional[bool] = None,
+             focus: Optional[str] = None) -> list:
+        """ECharts tree nodes, cut at depth levels (hidden parts become '+N more' nodes)."""
+        df, _, version = self.snapshot(sheet)
+        view = lineage_view(df, self.lineage_index(sheet, version, df), cell, in_use, focus)
+        return limit_tree(build_tree(view, with_tooltips=False), depth)
+
+    # ---- history ----
+    def as_of(self, sheet: str, when) -> Tuple[pd.DataFrame, SchemaReport]:
+        """(typed frame, report) of a sheet at a past time, rebuilt from the change log.
+
+        ALL_SHEETS merges every sheet whose history covers that time. Raises KeyError / ValueError
+        when the log has nothing for that sheet or time.
+        """
+        if self.history is None:
+            raise ValueError("no change log configured ([history] enabled = false)")
+        with telemetry.span("history.as_of", sheet=sheet):
+            if sheet != ALL_SHEETS:
+                return coerce(self.history.state(sheet, when))
+            parts = {}
+            for name in self.history.sheets():
+                try:
+                    parts[name] = coerce(self.history.state(name, when))
+                except ValueError:  # 그 시점에는 아직 기록이 없던 시트
+                    continue
+            if not parts:
+                raise ValueError("no sheet has history that far back")
+            return merge_sheets(parts)
+
+    # ---- writes ----
+    def _write_lock(self, sheet: str) -> threading.RLock:
+        with self._lock:
+            return self._write_locks.setdefault(sheet, threading.RLock())
+
+    def save(self, sheet: str, df: pd.DataFrame, report: SchemaReport = None,
+             actor: Optional[str] = None) -> Optional[int]:
+        """Write a typed frame back (Google Sheets: queued, only the changed cells/rows are sent).
+
+        With a change log, the cells and rows that differ from the current frame are recorded under actor.
+        """
+        if sheet == ALL_SHEETS:
+            raise ValueError("the all-sheets view is read-only")
+        with self._write_lock(sheet), telemetry.span("save", sheet=sheet, rows=len(df)):
+            base, _, before = self.snapshot(sheet)
+            with self._lock:
+                rollup = self._rollups.pop(sheet, None)
+            if rollup is not None and (before is None or rollup.version != before):
+                rollup = None
+            changes = rollup_changes = removed = None
+            if rollup is not None or self.history is not None:
+                with telemetry.span("diff"):
+                    changes = rollup_changes = frame_changes(base, df)
+                    if changes is None and rollup is not None:
+                        # 행 삭제면 남은 행끼리 비교하고, 삭제된 행은 집계에서 뺀다
+                        removed = removed_rows(base, df)
+                        if removed is not None:
+                            kept = np.delete(np.arange(len(base)), removed)
+                            rollup_changes = frame_changes(base.iloc[kept], df)
+            # 시트 형식(Yes/No, 날짜 문자열)으로 되돌려서 저장, 손대지 않은 셀은 원래 값 유지
+            ticket = self.storage.save(to_storage(df, report), sheet)
+            after = self.version(sheet)
+            if rollup is not None and rollup_changes is not None:
+                # 바뀐 행만 빼고 다시 더한 사본으로 교체 (읽는 쪽은 이전 집계를 그대로 쓴다);
+                # 순서 변경이면 다음에 다시 집계
+                with telemetry.span("rollup.apply"):
+                    rollup = rollup.copy()
+                    rollup.apply(base, df, (r for r, _ in rollup_changes.cells), rollup_changes.appended,
+                                 () if removed is None else removed)
+                rollup.version = after if after != before else None
+                with self._lock:
+                    self._rollups[sheet] = rollup
+            if self.history is not None:
+                with telemetry.span("history.record") as fields:
+                    try:
+                        fields["events"] = self.history.record(sheet, base, df, before, after, report, actor,
+                                                               changes)
+                    except Exception:
+                        # 저장은 이미 끝났으므로 기록 실패로 저장을 되돌리지 않는다
+                        log.exception("could not record the change log of %s", sheet)
+            return ticket
+
+    @staticmethod
+    def _place(rows: pd.DataFrame, occupancy: OccupancyIndex) -> pd.DataFrame:
+        """Blank positions get the box's next free slots, skipping slots other rows of the batch ask for."""
+        rows = rows.reset_index(drop=True)
+        position = rows["Position"] if "Position" in rows.columns else pd.Series("", index=rows.index)
+        rows = rows.assign(Position=position.fillna("").astype(str).str.strip().str.upper())
+        if "Tray" not in rows.columns or "Box" not in rows.columns:
+            return rows
+        tray, box = rows["Tray"].fillna("").astype(str), rows["Box"].fillna("").astype(str)
+        located = (tray != "") & (box != "")
+        blank = located & (rows["Position"] == "")
+        for (t, b), group in rows[blank].groupby([tray[blank], box[blank]], sort=False):
+            asked = set(rows.loc[located & (tray == t) & (box == b), "Position"]) - {""}
+            layout = occupancy.layout(t, b)
+            free = [layout.label(s) for s in np.flatnonzero(~occupancy.occupied(t, b))]
+            free = [p for p in free if p not in asked]
+            if len(free) < len(group):
+                raise ValueError(f"{t}/{b} has room for {len(free)} more tube(s), not {len(group)}")
+            rows.loc[group.index, "Position"] = free[:len(group)]
+        return rows
+
+    def register(self, sheet: str, rows: pd.DataFrame, actor: Optional[str] = None) -> pd.DataFrame:
+        """Validate new tubes as one batch and append them in one save; returns them typed, positions filled in.
+
+        Raises BatchRejected (with the issue table) when any row is invalid; nothing is saved then.
+        """
+        if sheet == ALL_SHEETS:
+            raise ValueError("the all-sheets view is read-only")
+        with self._write_lock(sheet):
+            df, report, version = self.snapshot(sheet)
+            occupancy = self.occupancy(sheet, version, df)
+            rows = self._place(rows, occupancy)
+            typed, issues = validate_batch(df, rows, occupancy)
+            if not issues.empty:
+                raise BatchRejected(issues)
+            self.save(sheet, append_rows(df, rows), report, actor)
+            # 저장에 성공한 뒤에만 비트를 켠다 (실패하면 인덱스는 저장 전 그대로)
+            new_version = self.version(sheet)
+            occupancy.version = None
+            located = typed.dropna(subset=["Tray", "Box"])
+            for t, b, pos, tid in located[["Tray", "Box", "Position", "Tube ID"]].itertuples(index=False):
+                occupancy.add(t, b, pos, tid)
+            occupancy.version = new_version if new_version != version else None
+        return typed
+
+    def update(self, sheet: str, tube_ids: Iterable[str], field: str, value, actor: Optional[str] = None) -> int:
+        """Set one field on many tubes in a single save; raises KeyError when any ID is unknown.
+
+        Raises ValueError for a field that isn't editable or a value that doesn't fit it (see schema.field_value).
+        """
+        if field not in EDITABLE_FIELDS:
+            raise ValueError(f"{field!r} is not editable (use one of {', '.join(EDITABLE_FIELDS)})")
+        value = field_value(field, value)
+        if sheet == ALL_SHEETS:
+            raise ValueError("the all-sheets view is read-only")
+        tube_ids = [str(t) for t in tube_ids]
+        with self._write_lock(sheet):
+            df, report, version = self.snapshot(sheet)
+            positions = self.id_index(sheet, version, df).reindex(tube_ids)
+            missing = positions.index[positions.isna()].tolist()
+            if missing:
+                raise KeyError(f"unknown tube(s): {', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+            rows = np.flatnonzero(df["Tube ID"].astype(str).isin(tube_ids).to_numpy())
+            self.save(sheet, assign(df, rows, field, value), report, actor)
+        return len(rows)
+
+
+_inventories: Dict[int, Inventory] = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(storage: StorageBackend) -> Inventory:
+    """The process-wide Inventory for a storage backend (backends are process-wide too)."""
+    with _inventories_lock:
+        inventory = _inventories.get(id(storage))
+        if inventory is None or inventory.storage is not storage:
+            inventory = Inventory(storage)
+            _inventories[id(storage)] = inventory
+        return inventory
@@ -0,0 +1,244 @@
+"""Row/cell level diff between the cached sheet frame and the frame being saved."""
+import datetime as dt
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def to_cell(value):
+    """Convert a DataFrame value to what the Sheets API stores (and get_all_records returns)."""
+    if value is None:
+        return ""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        if np.isnan(value):
+            return ""
+        if value.is_integer():
+            return int(value)
+    if value is pd.NaT or value is pd.NA:
+        return ""
+    if isinstance(value, dt.datetime):  # includes pd.Timestamp
+        if pd.isna(value):
+            return ""
+        return value.date().isoformat() if value.time() == dt.time() else value.isoformat(sep=" ")
+    if isinstance(value, dt.date):
+        return value.isoformat()
+    return value
+
+
+def frame_to_rows(df: pd.DataFrame) -> List[list]:
+    return [[to_cell(v) for v in row] for row in df.itertuples(index=False, name=None)]
+
+
+class ConflictError(Exception):
+    """A save can't be replayed on the sheet's current content without overwriting someone else's change."""
+
+
+@dataclass
+class SheetDelta:
+    header: List[str]
+    base_rows: int = 0
+    append_rows: List[list] = field(default_factory=list)
+    # {(frame_row, frame_col): value}, zero-based positions in the base frame
+    cells: Dict[Tuple[int, int], Any] = field(default_factory=dict)
+    full_rewrite: Optional[List[list]] = None
+    # the frame the positions above refer to (None: unknown, only a full rewrite is possible)
+    base: Optional[pd.DataFrame] = field(default=None, repr=False, compare=False)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.full_rewrite is None and not self.append_rows and not self.cells
+
+    @property
+    def changed_cells(self) -> int:
+        if self.full_rewrite is not None:
+            return len(self.full_rewrite) * len(self.header)
+        return len(self.append_rows) * len(self.header) + len(self.cells)
+
+    @property
+    def cell_updates(self) -> List[dict]:
+        """Changed cells as Worksheet.batch_update ranges, one per contiguous run in a row."""
+        from gspread.utils import rowcol_to_a1  # gspread is only needed by the Sheets backend
+        updates = []
+        for r in sorted({r for r, _ in self.cells}):
+            cols = sorted(c for rr, c in self.cells if rr == r)
+            runs = np.split(np.array(cols), np.flatnonzero(np.diff(cols) != 1) + 1)
+            sheet_row = r + 2  # +1 header, +1 one-based
+            for run in runs:
+                first, last = int(run[0]), int(run[-1])
+                updates.append({
+                    "range": f"{rowcol_to_a1(sheet_row, first + 1)}:{rowcol_to_a1(sheet_row, last + 1)}",
+                    "values": [[self.cells[(r, c)] for c in range(first, last + 1)]],
+                })
+        return updates
+
+    def merge(self, later: "SheetDelta", frame: pd.DataFrame) -> "SheetDelta":
+        """Fold a delta computed on top of this one into a single pending mutation.
+
+        `frame` is the newest full frame; it is only used when a full rewrite is needed.
+        """
+        if (self.full_rewrite is not None or later.full_rewrite is not None
+                or later.header != self.header
+                or later.base_rows != self.base_rows + len(self.append_rows)):
+            return compute_delta(self.base, frame)
+        merged = SheetDelta(header=self.header, base_rows=self.base_rows,
+                            append_rows=[list(r) for r in self.append_rows], cells=dict(self.cells), base=self.base)
+        for (r, c), value in later.cells.items():
+            if r >= self.base_rows:
+                # edit of a row that is still waiting to be appended
+                merged.append_rows[r - self.base_rows][c] = value
+            else:
+                merged.cells[(r, c)] = value
+        merged.append_rows.extend(later.append_rows)
+        return merged
+
+    def apply(self, ws):
+        """Send the delta with at most two API calls (one batch update, one append).
+
+        Cells are addressed by row position, so the sheet must still hold `base`.
+        """
+        if self.full_rewrite is not None:
+            ws.update([self.header] + self.full_rewrite)
+            return
+        if self.cells:
+            ws.batch_update(self.cell_updates)
+        if self.append_rows:
+            ws.append_rows(self.append_rows)
+
+
+def compute_delta(base: Optional[pd.DataFrame], new: pd.DataFrame) -> SheetDelta:
+    """Diff `new` against `base`, the frame last read from / written to the sheet.
+
+    Rows are matched by position (the app only appends rows or edits them in
+    place). Anything else — no base, changed columns, removed or reordered
+    rows — falls back to a full rewrite.
+    """
+    header = [str(c) for c in new.columns]
+    if not edits_in_place(base, new):
+        return SheetDelta(header=header, full_rewrite=frame_to_rows(new), base=base)
+
+    n_base = len(base)
+    delta = SheetDelta(header=header, base_rows=n_base, append_rows=frame_to_rows(new.iloc[n_base:]), base=base)
+    for r, c in changed_cells(base, new):
+        # 후보 셀만 시트 값으로 바꿔 비교 (1.0 == 1, NaN == "" 등)
+        value = to_cell(new.iat[r, c])
+        if to_cell(base.iat[r, c]) != value:
+            delta.cells[(r, c)] = value
+    return delta
+
+
+def changed_cells(base: pd.DataFrame, new: pd.DataFrame) -> List[Tuple[int, int]]:
+    """(row, column) positions within base's rows where new differs, compared column by column.
+
+    Missing values (None, NaN, NA, NaT) equal each other; columns that are equal as a whole are skipped.
+    """
+    n = len(base)
+    cells = []
+    for c in range(new.shape[1]):
+        old_col, new_col = base.iloc[:, c], new.iloc[:n, c]
+        if old_col.dtype == new_col.dtype and old_col.reset_index(drop=True).equals(new_col.reset_index(drop=True)):
+            continue
+        old_values = old_col.astype(object).to_numpy(copy=True)
+        new_values = new_col.astype(object).to_numpy(copy=True)
+        old_values[pd.isna(old_values)] = None
+        new_values[pd.isna(new_values)] = None
+        cells.extend((int(r), c) for r in np.flatnonzero(~(old_values == new_values)))
+    cells.sort()
+    return cells
+
+
+def edits_in_place(base: Optional[pd.DataFrame], new: pd.DataFrame) -> bool:
+    """True when new is base with cells edited and/or rows appended (same columns, same Tube IDs in order)."""
+    return (base is not None and list(base.columns) == list(new.columns) and len(new) >= len(base)
+            and ("Tube ID" not in new.columns or _same_ids(base, new)))
+
+
+def removed_rows(base: Optional[pd.DataFrame], new: pd.DataFrame) -> Optional[np.ndarray]:
+    """Positions of base rows that new dropped, when new is base with those rows removed (Tube IDs in order).
+
+    None for anything else (reordering, appending in the same save, duplicate IDs, changed columns).
+    """
+    if (base is None or list(base.columns) != list(new.columns) or "Tube ID" not in new.columns
+            or len(new) >= len(base)):
+        return None
+    old_ids = base["Tube ID"].astype(str).to_numpy()
+    new_ids = new["Tube ID"].astype(str).to_numpy()
+    kept = np.flatnonzero(np.isin(old_ids, new_ids))
+    if len(kept) != len(new_ids) or not (old_ids[kept] == new_ids).all():
+        return None
+    return np.setdiff1d(np.arange(len(base)), kept)
+
+
+def _same_ids(base: pd.DataFrame, new: pd.DataFrame) -> bool:
+    old_ids = base["Tube ID"].astype(str).to_numpy()
+    new_ids = new["Tube ID"].iloc[:len(base)].astype(str).to_numpy()
+    return bool((old_ids == new_ids).all())
+
+
+def rebase(base: pd.DataFrame, new: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """Replay the edit base -> new on top of current (the sheet as it is now), matching rows by Tube ID.
+
+    Edited cells are written into the same tube's row, added tubes are appended
+    and removed ones dropped; everything else keeps current's content and order.
+    Raises ConflictError when current changed one of the edited cells too, no
+    longer has an edited tube, already has an added tube with other values, or
+    when columns or Tube IDs can't be matched.
+    """
+    if list(base.columns) != list(new.columns) or set(current.columns) != set(new.columns):
+        raise ConflictError("the sheet's columns changed since it was loaded")
+    if "Tube ID" not in new.columns:
+        raise ConflictError("rows can't be matched without a Tube ID column")
+    ids = {}
+    for name, frame in (("saved", base), ("new", new), ("current", current)):
+        ids[name] = frame["Tube ID"].astype(str)
+        if ids[name].duplicated().any():
+            dupes = ids[name][ids[name].duplicated()].unique().tolist()
+            raise ConflictError(f"duplicate Tube IDs in the {name} sheet: {', '.join(dupes[:5])}")
+    row_of = {name: pd.Series(np.arange(len(s)), index=s.to_numpy()) for name, s in ids.items()}
+    columns = list(new.columns)
+    out = current.astype(object).reset_index(drop=True)
+    out_col = {c: out.columns.get_loc(c) for c in columns}
+    conflicts = []
+
+    # 양쪽에 다 있는 튜브: 바뀐 셀만 현재 시트의 같은 튜브 행에 쓴다
+    kept = ids["new"][ids["new"].isin(row_of["saved"].index)].to_numpy()
+    old = base.iloc[row_of["saved"].loc[kept].to_numpy()].reset_index(drop=True)
+    edited = new.iloc[row_of["new"].loc[kept].to_numpy()].reset_index(drop=True)
+    for r, c in changed_cells(old, edited):
+        before, value = to_cell(old.iat[r, c]), to_cell(edited.iat[r, c])
+        if before == value:
+            continue
+        tube, column = kept[r], columns[c]
+        if tube not in row_of["current"].index:
+            conflicts.append(f"{tube} was removed")
+            continue
+        row = row_of["current"][tube]
+        now = to_cell(out.iat[row, out_col[column]])
+        if now != before and now != value:
+            conflicts.append(f"{tube} {column} is now {now!r}")
+            continue
+        out.iat[row, out_col[column]] = edited.iat[r, c]
+
+    # 추가한 튜브: 이미 같은 내용으로 있으면 (재시도 등) 건너뛴다
+    added = new[~ids["new"].isin(row_of["saved"].index).to_numpy()]
+    appended = []
+    for tube, row in zip(added["Tube ID"].astype(str), added[columns].itertuples(index=False, name=None)):
+        if tube in row_of["current"].index:
+            now = out.iloc[row_of["current"][tube]][columns]
+            if [to_cell(v) for v in now] != [to_cell(v) for v in row]:
+                conflicts.append(f"{tube} already exists")
+            continue
+        appended.append(row)
+
+    if conflicts:
+        raise ConflictError("the sheet was changed by someone else: " + "; ".join(conflicts[:10])
+                            + (" ..." if len(conflicts) > 10 else ""))
+    removed = ids["saved"][~ids["saved"].isin(row_of["new"].index)].to_numpy()
+    out = out[~ids["current"].isin(removed).to_numpy()]
+    if appended:
+        out = pd.concat([out, pd.DataFrame(appended, columns=columns)[list(out.columns)].astype(object)],
+                        ignore_index=True)
+    return out.reset_index(drop=True)
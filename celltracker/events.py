@@ -0,0 +1,313 @@
+"""Append-only change log of the tube sheets, with periodic snapshots.
+
+Every save is diffed against the frame it replaces and written as events:
+
+    add    a new row (the whole row, JSON)
+    set    one cell edited in place (old and new value)
+    reset  rows removed/reordered or columns changed; a snapshot follows
+    start  first save of a sheet; a snapshot of the sheet as found follows
+    sync   the sheet changed outside the app; a snapshot follows
+
+A snapshot is the whole sheet at one event, zlib-compressed. The sheet as of
+any time is the last snapshot before it plus the events after that, so a
+point-in-time query replays at most `snapshot_every` events. Rows are matched
+by position, as in delta.compute_delta; per-tube history does not follow a
+tube through a reset.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import pandas as pd
+
+from celltracker.delta import changed_cells, edits_in_place, frame_to_rows, to_cell
+from celltracker.schema import SchemaReport, coerce, to_storage
+
+log = logging.getLogger("celltracker.events")
+
+HISTORY_FILE = "celltracker-history.db"
+SNAPSHOT_EVERY = 1000  # events per sheet between snapshots
+
+EVENT_COLUMNS = ["Seq", "Time", "Sheet", "Event", "Row", "Tube ID", "Field", "Old", "New", "Actor"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq     INTEGER PRIMARY KEY,
+    ts      REAL NOT NULL,
+    sheet   TEXT NOT NULL,
+    kind    TEXT NOT NULL,
+    row_no  INTEGER,
+    tube_id TEXT,
+    field   TEXT,
+    old     TEXT,
+    new     TEXT,
+    actor   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_sheet ON events (sheet, seq);
+CREATE INDEX IF NOT EXISTS idx_events_tube  ON events (tube_id, seq);
+CREATE INDEX IF NOT EXISTS idx_events_actor ON events (actor, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts    ON events (ts);
+CREATE TABLE IF NOT EXISTS snapshots (
+    sheet   TEXT NOT NULL,
+    seq     INTEGER NOT NULL,
+    ts      REAL NOT NULL,
+    columns TEXT NOT NULL,
+    rows    BLOB NOT NULL,
+    PRIMARY KEY (sheet, seq)
+);
+CREATE TABLE IF NOT EXISTS heads (
+    sheet   TEXT PRIMARY KEY,
+    version TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class Changes:
+    """What a save did to a sheet: cells edited in place plus rows appended at the end."""
+
+    cells: List[Tuple[int, str]] = field(default_factory=list)  # (row, column)
+    appended: range = range(0)
+
+    @property
+    def empty(self) -> bool:
+        return not self.cells and not len(self.appended)
+
+
+def frame_changes(base: Optional[pd.DataFrame], new: pd.DataFrame) -> Optional[Changes]:
+    """Column-wise diff of two typed frames; None when rows were removed/reordered or columns changed."""
+    if not edits_in_place(base, new):
+        return None
+    return Changes(cells=[(r, new.columns[c]) for r, c in changed_cells(base, new)],
+                   appended=range(len(base), len(new)))
+
+
+def _timestamp(when) -> float:
+    """Unix time of a datetime / ISO string / number; naive times are local time."""
+    if when is None:
+        return time.time()
+    if isinstance(when, (int, float)):
+        return float(when)
+    return pd.Timestamp(when).to_pydatetime().timestamp()
+
+
+def _dump(value) -> str:
+    return json.dumps(to_cell(value), default=str)
+
+
+class EventLog:
+    """SQLite file holding the events and snapshots of every sheet; one connection per thread."""
+
+    def __init__(self, path: str = HISTORY_FILE, snapshot_every: int = SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self._local = threading.local()
+        self._heads: Dict[str, Tuple[str, pd.DataFrame]] = {}  # sheet -> (version, last frame recorded)
+        with self._db() as db:
+            db.executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    # ---- writing ----
+    def record(self, sheet: str, base: Optional[pd.DataFrame], new: pd.DataFrame, version_before: Hashable,
+               version_after: Hashable, report: SchemaReport = None, actor: Optional[str] = None,
+               changes: Optional[Changes] = None) -> int:
+        """Log the save that turned typed frame `base` (at version_before) into `new`; returns events written.
+
+        `changes` is frame_changes(base, new) when the caller already has it.
+        """
+        now = time.time()
+        if changes is None:
+            changes = frame_changes(base, new)
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")  # 다른 프로세스(HTTP 서비스)와 seq 순서를 맞춘다
+        try:
+            head = db.execute("SELECT version FROM heads WHERE sheet = ?", (sheet,)).fetchone()
+            if head is None:
+                self._write_snapshot(db, sheet, now, base, report, kind="start")
+            elif not self._in_sync(db, sheet, head[0], version_before, base):
+                self._write_snapshot(db, sheet, now, base, report, kind="sync")
+            if changes is None:
+                self._write_snapshot(db, sheet, now, new, report, kind="reset", actor=actor)
+                written = 1
+            else:
+                written = self._write_changes(db, sheet, now, base, new, changes, report, actor)
+            last = db.execute("SELECT coalesce(max(seq), 0) FROM snapshots WHERE sheet = ?", (sheet,)).fetchone()[0]
+            since = db.execute("SELECT count(*) FROM events WHERE sheet = ? AND seq > ?", (sheet, last)).fetchone()[0]
+            if since >= self.snapshot_every:
+                self._write_snapshot(db, sheet, now, new, report)
+            head = json.dumps(version_after, default=str)
+            db.execute("INSERT OR REPLACE INTO heads (sheet, version) VALUES (?, ?)", (sheet, head))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self._heads[sheet] = (head, new)
+        return written
+
+    def _in_sync(self, db, sheet: str, head: str, version, base: Optional[pd.DataFrame]) -> bool:
+        """Does the log's latest state equal base? Checks the version first, frames only when it differs."""
+        if head == json.dumps(version, default=str):
+            return True
+        if base is None:
+            return False
+        # Google Sheets는 쓰기가 끝나면 버전이 바뀌므로, 마지막으로 기록한 프레임과 비교
+        last = self._heads.get(sheet)
+        if last is not None and last[0] == head:
+            recorded = last[1]
+        else:
+            recorded = coerce(self._replay(db, sheet, time.time()))[0]
+        changes = frame_changes(recorded, base)
+        return changes is not None and changes.empty
+
+    def _write_changes(self, db, sheet: str, now: float, base: pd.DataFrame, new: pd.DataFrame,
+                       changes: Changes, report: Optional[SchemaReport], actor: Optional[str]) -> int:
+        # 저장과 같은 글자로 기록: report가 있으면 손대지 않은/되돌린 셀은 원래 글자("", "yes" 등)
+        ids = new["Tube ID"].astype(str).to_numpy() if "Tube ID" in new.columns else None
+        events = []
+        if changes.cells:
+            rows = sorted({r for r, _ in changes.cells})
+            old_text = to_storage(base, report, rows)
+            new_text = to_storage(new, report, rows)
+            at = {r: i for i, r in enumerate(rows)}
+            for r, col in changes.cells:
+                events.append((now, sheet, "set", r, ids[r] if ids is not None else None, col,
+                               _dump(old_text[col].iat[at[r]]), _dump(new_text[col].iat[at[r]]), actor))
+        if len(changes.appended):
+            added = to_storage(new, report, changes.appended)
+            operators = added["Operator"].astype(str) if "Operator" in added.columns else None
+            for i, row in enumerate(frame_to_rows(added)):
+                r = changes.appended.start + i
+                who = actor or (operators.iat[i] if operators is not None and operators.iat[i] else None)
+                events.append((now, sheet, "add", r, ids[r] if ids is not None else None, None, None,
+                               json.dumps(dict(zip(added.columns, row)), default=str), who))
+        db.executemany("INSERT INTO events (ts, sheet, kind, row_no, tube_id, field, old, new, actor) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+        return len(events)
+
+    def _write_snapshot(self, db, sheet: str, now: float, df: Optional[pd.DataFrame], report: SchemaReport = None,
+                        kind: Optional[str] = None, actor: Optional[str] = None):
+        """Snapshot df at the newest seq; kind adds a marker event (reset / sync) the snapshot belongs to."""
+        if kind is not None:
+            db.execute("INSERT INTO events (ts, sheet, kind, actor) VALUES (?, ?, ?, ?)", (now, sheet, kind, actor))
+        seq = db.execute("SELECT coalesce(max(seq), 0) FROM events").fetchone()[0]
+        if df is None:
+            columns, rows = [], []
+        else:
+            text = to_storage(df, report)
+            columns, rows = [str(c) for c in text.columns], frame_to_rows(text)
+        blob = zlib.compress(json.dumps(rows, default=str).encode())
+        db.execute("INSERT OR REPLACE INTO snapshots (sheet, seq, ts, columns, rows) VALUES (?, ?, ?, ?, ?)",
+                   (sheet, seq, now, json.dumps(columns), blob))
+
+    def compact(self, sheet: str, df: pd.DataFrame, report: SchemaReport = None):
+        """Snapshot the sheet now (df must be its current typed frame) so later queries replay from here."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_snapshot(db, sheet, time.time(), df, report)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    # ---- point-in-time ----
+    def _replay(self, db, sheet: str, ts: float) -> pd.DataFrame:
+        snap = db.execute("SELECT seq, columns, rows FROM snapshots WHERE sheet = ? AND ts <= ? "
+                          "ORDER BY seq DESC LIMIT 1", (sheet, ts)).fetchone()
+        if snap is None:
+            first = db.execute("SELECT min(ts) FROM snapshots WHERE sheet = ?", (sheet,)).fetchone()[0]
+            if first is None:
+                raise KeyError(sheet)
+            raise ValueError(f"history of {sheet} starts at {datetime.fromtimestamp(first):%Y-%m-%d %H:%M:%S}")
+        seq, columns, rows = snap[0], json.loads(snap[1]), json.loads(zlib.decompress(snap[2]))
+        positions = {c: i for i, c in enumerate(columns)}
+        for kind, r, col, new in db.execute("SELECT kind, row_no, field, new FROM events "
+                                            "WHERE sheet = ? AND seq > ? AND ts <= ? ORDER BY seq",
+                                            (sheet, seq, ts)):
+            if kind == "set":
+                rows[r][positions[col]] = json.loads(new)
+            elif kind == "add":
+                values = json.loads(new)
+                rows.append([values.get(c, "") for c in columns])
+        return pd.DataFrame(rows, columns=columns)
+
+    def state(self, sheet: str, when=None) -> pd.DataFrame:
+        """Sheet content (stored text, like StorageBackend.load) as of `when` (default: now).
+
+        Raises KeyError for a sheet with no history and ValueError for a time before it starts.
+        """
+        return self._replay(self._db(), sheet, _timestamp(when))
+
+    def sheets(self) -> List[str]:
+        return [r[0] for r in self._db().execute("SELECT DISTINCT sheet FROM snapshots ORDER BY sheet")]
+
+    # ---- audit ----
+    def _events(self, where: str, params: tuple, limit: Optional[int] = None) -> pd.DataFrame:
+        sql = ("SELECT seq, ts, sheet, kind, row_no, tube_id, field, old, new, actor FROM events "
+               f"WHERE {where} ORDER BY seq" + (" DESC LIMIT ?" if limit else ""))
+        rows = self._db().execute(sql, params + ((limit,) if limit else ())).fetchall()
+        if limit:
+            rows.reverse()
+        df = pd.DataFrame(rows, columns=EVENT_COLUMNS)
+        df["Time"] = pd.to_datetime([datetime.fromtimestamp(t) for t in df["Time"]])
+        for col in ["Old", "New"]:
+            df[col] = df[col].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+        return df
+
+    def tube_history(self, tube_id: str, sheet: Optional[str] = None) -> pd.DataFrame:
+        """Every add/set event of one tube, oldest first."""
+        if sheet is None:
+            return self._events("tube_id = ?", (str(tube_id).upper(),))
+        return self._events("tube_id = ? AND sheet = ?", (str(tube_id).upper(), sheet))
+
+    def activity(self, actor: Optional[str] = None, since=None, until=None,
+                 limit: Optional[int] = None) -> pd.DataFrame:
+        """Events in a time range, optionally by one actor (newest `limit` events when limit is given)."""
+        where, params = "ts >= ? AND ts <= ?", (_timestamp(since or 0), _timestamp(until))
+        if actor is not None:
+            where, params = "actor = ? AND " + where, (actor,) + params
+        return self._events(where, params, limit)
+
+    def actor_summary(self, since=None, until=None) -> pd.DataFrame:
+        """Events per actor and kind, plus the first and last time each actor changed something."""
+        rows = self._db().execute(
+            "SELECT coalesce(actor, ''), kind, count(*), min(ts), max(ts) FROM events "
+            "WHERE ts >= ? AND ts <= ? AND kind IN ('add', 'set') GROUP BY actor, kind",
+            (_timestamp(since or 0), _timestamp(until))).fetchall()
+        df = pd.DataFrame(rows, columns=["Actor", "Event", "Count", "First", "Last"])
+        if df.empty:
+            return pd.DataFrame(columns=["Actor", "Added", "Edited", "First", "Last"])
+        table = df.pivot_table(index="Actor", columns="Event", values="Count", aggfunc="sum", fill_value=0)
+        table = table.reindex(columns=["add", "set"], fill_value=0).rename(columns={"add": "Added", "set": "Edited"})
+        times = df.groupby("Actor").agg(First=("First", "min"), Last=("Last", "max"))
+        out = table.join(times).reset_index()
+        for col in ["First", "Last"]:
+            out[col] = pd.to_datetime([datetime.fromtimestamp(t) for t in out[col]])
+        return out.sort_values("Last", ascending=False, ignore_index=True)
+
+
+_logs: Dict[str, EventLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_event_log(path: str = HISTORY_FILE, snapshot_every: int = SNAPSHOT_EVERY) -> EventLog:
+    """Process-wide EventLog for a file."""
+    with _logs_lock:
+        history = _logs.get(path)
+        if history is None:
+            history = _logs[path] = EventLog(path, snapshot_every)
+        history.snapshot_every = snapshot_every
+        return history
@@ -0,0 +1,266 @@
+"""Growth-rate table and culture time predictions.
+
+The growth table (one or more rows per cell line, from growth_rate_*.csv) is
+compiled once into a GrowthTable keyed by model_name and model_id, so
+predictions for many lines and densities are array lookups plus one
+vectorized formula.
+
+Growth is handled as an exponential rate per hour. Lines without a measured
+doubling time get one from day4_day1_ratio (growth over 72 h), and the
+replicate st_dev of that ratio gives the spread used by the expansion
+Monte Carlo.
+"""
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import product
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+PLAN_COLUMNS = ["Cell Line", "Seeding Density", "Target Density"]
+
+RATIO_HOURS = 72.0  # day4_day1_ratio spans day 1 -> day 4
+DEFAULT_RATIO_CV = 0.1  # st_dev / ratio when no line in the table has replicates
+LN2 = np.log(2.0)
+
+
+def hours_to_target(initial_density, doubling_time, target_density) -> np.ndarray:
+    """Hours to grow from initial to target density; arguments broadcast like numpy arrays.
+
+    NaN where the doubling time is missing.
+    """
+    initial = np.asarray(initial_density, dtype=float)
+    target = np.asarray(target_density, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.log2(target / initial) * np.asarray(doubling_time, dtype=float)
+
+
+def doubling_from_ratio(ratio) -> np.ndarray:
+    """Doubling time (hours) from the day4/day1 growth ratio; NaN where the ratio shows no growth."""
+    ratio = np.asarray(ratio, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ratio > 1, RATIO_HOURS * LN2 / np.log(ratio), np.nan)
+
+
+def time_to_reach_target(initial_density: float,
+                         doubling_time: float,
+                         target_density: float) -> timedelta:
+    """초기 농도, doubling time, 목표 농도로부터 걸리는 시간 계산"""
+    return timedelta(hours=float(hours_to_target(initial_density, doubling_time, target_density)))
+
+
+class GrowthTable:
+    """One row per cell line, looked up by model name or model id (case-insensitive).
+
+    When a line was measured more than once, the first row with a measured
+    doubling time is used, else the first with a day4/day1 ratio.
+
+    Per line: rate (mean growth rate, 1/h; <= 0 when the line did not grow),
+    rate_sd (passage-to-passage spread of the rate), replicates, and doubling
+    (hours, NaN without net growth) with doubling_source saying where it came from.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.reset_index(drop=True)
+        doubling_col = "doubling_time_hours" if "doubling_time_hours" in df.columns else "doubling_time"
+        doubling = pd.to_numeric(df.get(doubling_col), errors="coerce").to_numpy(dtype=float)
+        ratio = pd.to_numeric(df.get("day4_day1_ratio"), errors="coerce").to_numpy(dtype=float)
+        measured, from_ratio = doubling > 0, ~(doubling > 0) & (ratio > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.select([measured, from_ratio], [LN2 / doubling, np.log(ratio) / RATIO_HOURS], np.nan)
+        # 측정된 doubling time → day4/day1 비율 → 둘 다 없음 순서로 (같은 그룹 안에서는 파일 순서 유지)
+        priority = np.select([measured, from_ratio], [0, 1], 2)
+        rows = df.assign(growth_rate=rate, doubling_source=np.select([measured, from_ratio],
+                                                                     ["measured", "day4/day1 ratio"], ""))
+        rows = rows.iloc[np.argsort(priority, kind="stable")]
+        self.models = rows.drop_duplicates("model_name").sort_index().reset_index(drop=True)
+
+        self.rate = self.models["growth_rate"].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.doubling = np.where(self.rate > 0, LN2 / self.rate, np.nan)
+        self.doubling_source = self.models["doubling_source"].to_numpy(dtype=object)
+
+        # 복제 실험의 st_dev → 비율의 변동계수 → 시간당 성장률의 표준편차
+        st_dev = pd.to_numeric(self.models.get("st_dev"), errors="coerce").to_numpy(dtype=float)
+        line_ratio = pd.to_numeric(self.models.get("day4_day1_ratio"), errors="coerce").to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cv = np.where((st_dev > 0) & (line_ratio > 0), st_dev / line_ratio, np.nan)
+        pooled_cv = float(np.nanmedian(cv)) if np.isfinite(cv).any() else DEFAULT_RATIO_CV
+        self.rate_sd = np.where(np.isnan(cv), pooled_cv, cv) / RATIO_HOURS
+        replicates = pd.to_numeric(self.models.get("replicates"), errors="coerce").to_numpy(dtype=float)
+        self.replicates = np.where(replicates >= 1, replicates, 1.0)
+
+        key_cols = [c for c in ("model_name", "model_id") if c in self.models.columns]
+        keys = pd.concat([self.models[c] for c in key_cols], ignore_index=True)
+        keys = keys.astype(str).str.strip().str.upper()
+        positions = np.tile(np.arange(len(self.models)), len(key_cols))
+        first = ~keys.duplicated().to_numpy()
+        self._keys = pd.Index(keys.to_numpy()[first])
+        self._positions = positions[first]
+
+    @classmethod
+    def from_csv(cls, path: str) -> "GrowthTable":
+        """The table in a growth_rate_*.csv; empty when the file is missing."""
+        if os.path.exists(path):
+            return cls(pd.read_csv(path))
+        return cls(pd.DataFrame(columns=["model_name", "model_id", "doubling_time_hours", "day4_day1_ratio",
+                                          "st_dev", "replicates"]))
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    @property
+    def names(self) -> list:
+        return self.models["model_name"].tolist()
+
+    def locate(self, cells: Iterable[str]) -> np.ndarray:
+        """Row position in self.models for each name/id; -1 when unknown."""
+        keys = pd.Series(list(cells), dtype=object).astype(str).str.strip().str.upper()
+        found = self._keys.get_indexer(keys)
+        return np.where(found >= 0, self._positions[found], -1)
+
+    def doubling_time(self, cells: Iterable[str]) -> np.ndarray:
+        """Doubling time (hours) per name/id; NaN when unknown or the line shows no growth."""
+        rows = self.locate(cells)
+        return np.where(rows >= 0, self.doubling[np.maximum(rows, 0)], np.nan)
+
+
+def parse_densities(text: str) -> list:
+    """'1000, 5e3 10000' -> [1000.0, 5000.0, 10000.0]; raises ValueError on anything else."""
+    values = []
+    for token in text.replace(",", " ").split():
+        try:
+            value = float(token)
+        except ValueError:
+            raise ValueError(f"{token!r} is not a number") from None
+        if not value > 0:
+            raise ValueError(f"density must be positive, got {token}")
+        values.append(value)
+    return values
+
+
+def plan_grid(cells: Iterable[str], seeding_densities: Iterable[float],
+              target_densities: Iterable[float]) -> pd.DataFrame:
+    """Every combination of cell line, seeding density and target density."""
+    return pd.DataFrame(list(product(cells, seeding_densities, target_densities)), columns=PLAN_COLUMNS)
+
+
+def predict_schedule(table: GrowthTable, plan: pd.DataFrame, start: Optional[datetime] = None) -> pd.DataFrame:
+    """Predicted growth time for each row of a plan (PLAN_COLUMNS), in one vectorized pass.
+
+    With start, a "Ready At" column gives when each culture reaches its target.
+    """
+    rows = table.locate(plan["Cell Line"])
+    known = rows >= 0
+    doubling = np.where(known, table.doubling[np.maximum(rows, 0)], np.nan)
+    seeding = pd.to_numeric(plan["Seeding Density"], errors="coerce").to_numpy(dtype=float)
+    target = pd.to_numeric(plan["Target Density"], errors="coerce").to_numpy(dtype=float)
+    valid = (seeding > 0) & (target > seeding)
+    hours = np.where(valid, hours_to_target(seeding, doubling, target), np.nan)
+
+    model_ids = table.models.get("model_id", pd.Series("", index=table.models.index)).to_numpy(dtype=object)
+    out = plan[PLAN_COLUMNS].reset_index(drop=True)
+    out["Model ID"] = np.where(known, model_ids[np.maximum(rows, 0)], "")
+    out["Doubling Time (h)"] = doubling.round(2)
+    out["Hours"] = hours.round(1)
+    out["Days"] = (hours / 24).round(2)
+    if start is not None:
+        out["Ready At"] = pd.Timestamp(start) + pd.to_timedelta(hours, unit="h").round("min")
+    out["Note"] = np.select(
+        [~known, np.isnan(doubling), ~valid],
+        ["unknown cell line", "no doubling time", "target must exceed seeding density"],
+        "",
+    )
+    return out
+
+
+# ------------------ EXPANSION PLANNER ------------------
+@dataclass(frozen=True)
+class ExpansionPlan:
+    """Grow seed_cells in one vessel; whenever a vessel reaches confluent_cells, split it 1:split_ratio
+    and keep every daughter vessel, until target_cells in total (at most max_passages splits)."""
+
+    seed_cells: float = 1e6
+    confluent_cells: float = 1e7
+    split_ratio: float = 3.0
+    target_cells: float = 1e9
+    max_passages: int = 10
+
+    def splits_needed(self) -> int:
+        if self.target_cells <= self.confluent_cells:
+            return 0
+        return int(np.ceil(np.log(self.target_cells / self.confluent_cells) / np.log(self.split_ratio) - 1e-9))
+
+    def phase_growth(self) -> np.ndarray:
+        """ln fold-growth of each growth phase between seeding, splits and harvest."""
+        if self.seed_cells >= self.target_cells:
+            return np.zeros(1)
+        splits = self.splits_needed()
+        first = np.log(max(min(self.confluent_cells, self.target_cells) / self.seed_cells, 1.0))
+        if splits == 0:
+            return np.array([first])
+        last = np.log(self.target_cells / (self.confluent_cells * self.split_ratio ** (splits - 1)))
+        return np.array([first] + [np.log(self.split_ratio)] * (splits - 1) + [last])
+
+
+EXPANSION_COLUMNS = ["Cell Line", "Doubling Time (h)", "Source", "Passages", "Reach Probability",
+                     "Median (days)", "CI Low (days)", "CI High (days)"]
+
+
+def simulate_expansion(table: GrowthTable, plan: ExpansionPlan, cells: Optional[Iterable[str]] = None,
+                       n_trajectories: int = 2000, confidence: float = 0.9, seed: int = 0,
+                       chunk_size: int = 4_000_000) -> pd.DataFrame:
+    """Monte Carlo harvest time of an expansion plan for each line (all lines by default).
+
+    Each trajectory draws the line's mean rate from its replicate standard error,
+    then one rate per growth phase from the passage-to-passage spread. Phases with
+    a non-positive rate never finish, so Reach Probability is the share of
+    trajectories that hit the target; the interval is over all trajectories and is
+    open-ended (inf) when fewer than its upper share do.
+    """
+    rows = np.arange(len(table)) if cells is None else table.locate(cells)
+    names = np.asarray(table.names, dtype=object)[np.maximum(rows, 0)] if cells is None else \
+        np.asarray(list(cells), dtype=object)
+    growth = plan.phase_growth()
+    passages = len(growth) - 1
+    growth = growth[growth > 0].astype(np.float32)  # seeding at/above confluence: no first phase
+    lo_q, hi_q = (1 - confidence) / 2, (1 + confidence) / 2
+
+    known = (rows >= 0) & np.isfinite(table.rate[np.maximum(rows, 0)])
+    stats = np.full((len(rows), 4), np.nan)  # reach, median, low, high (hours)
+    if passages <= plan.max_passages and known.any():
+        rng = np.random.default_rng(seed)
+        line_rows = rows[known]
+        rate, sd = table.rate[line_rows], table.rate_sd[line_rows]
+        se = sd / np.sqrt(table.replicates[line_rows])
+        per_chunk = max(1, chunk_size // (n_trajectories * max(len(growth), 1)))
+        out = np.empty((len(line_rows), 4))
+        for start in range(0, len(line_rows), per_chunk):
+            part = slice(start, start + per_chunk)
+            n = len(line_rows[part])
+            line_rate = rate[part, None] + se[part, None] * rng.standard_normal((n, n_trajectories))
+            # float32 in place: the (lines, trajectories, phases) block is the only large array
+            phase_rate = rng.standard_normal((n, n_trajectories, len(growth)), dtype=np.float32)
+            phase_rate *= sd[part, None, None].astype(np.float32)
+            phase_rate += line_rate[..., None].astype(np.float32)
+            hours = np.divide(growth, phase_rate, out=np.full_like(phase_rate, np.inf), where=phase_rate > 0)
+            hours = hours.sum(-1, dtype=np.float64)
+            out[part, 0] = np.isfinite(hours).mean(axis=1)
+            out[part, 1:] = np.quantile(hours, [0.5, lo_q, hi_q], axis=1, method="inverted_cdf").T
+        stats[known] = out
+    elif passages > plan.max_passages:
+        stats[known, 0] = 0.0
+
+    found = rows >= 0
+    result = pd.DataFrame({
+        "Cell Line": names,
+        "Doubling Time (h)": np.where(found, table.doubling[np.maximum(rows, 0)], np.nan).round(2),
+        "Source": np.where(found, table.doubling_source[np.maximum(rows, 0)], "unknown cell line"),
+        "Passages": passages,
+        "Reach Probability": stats[:, 0].round(3),
+    })
+    for col, values in zip(EXPANSION_COLUMNS[5:], stats[:, 1:].T):
+        result[col] = (values / 24).round(2)
+    return result[EXPANSION_COLUMNS]
@@ -0,0 +1,45 @@
+"""Whole-freezer inventory: every cell-line sheet merged into one typed frame.
+
+Tube IDs are only unique within a sheet (each line starts again at P1_1), so
+the merged frame qualifies them as "<sheet>/<Tube ID>", parents included, and
+keeps the sheet name in a Sheet column.
+"""
+from typing import Dict, Tuple
+
+import pandas as pd
+
+from celltracker.schema import CATEGORY_COLUMNS, ISSUE_COLUMNS, SchemaReport
+
+SHEET_COLUMN = "Sheet"
+SEPARATOR = "/"
+
+
+def qualify(sheet: str, ids: pd.Series) -> pd.Series:
+    """'P1_1' -> 'A549/P1_1'; blanks stay blank."""
+    ids = ids.astype(str)
+    return (sheet + SEPARATOR + ids).where(ids != "", "")
+
+
+def merge_sheets(parts: Dict[str, Tuple[pd.DataFrame, SchemaReport]]) -> Tuple[pd.DataFrame, SchemaReport]:
+    """One frame and one validation report for {sheet name: (typed frame, report)}."""
+    frames, issues = [], []
+    for sheet, (df, report) in parts.items():
+        df = df.assign(**{col: qualify(sheet, df[col]) for col in ("Tube ID", "Parent Tube") if col in df.columns})
+        df.insert(0, SHEET_COLUMN, sheet)
+        frames.append(df)
+        if not report.ok:
+            sheet_issues = report.issues.assign(**{"Tube ID": qualify(sheet, report.issues["Tube ID"])})
+            sheet_issues.insert(0, SHEET_COLUMN, sheet)
+            issues.append(sheet_issues)
+
+    if not frames:
+        return pd.DataFrame(columns=[SHEET_COLUMN]), SchemaReport()
+    merged = pd.concat(frames, ignore_index=True)
+    # 시트마다 카테고리가 달라서 concat 후에는 object가 되므로 다시 category로
+    for col in [SHEET_COLUMN] + CATEGORY_COLUMNS:
+        if col in merged.columns:
+            merged[col] = merged[col].astype("category")
+    report = SchemaReport()
+    if issues:
+        report.issues = pd.concat(issues, ignore_index=True)[[SHEET_COLUMN] + ISSUE_COLUMNS]
+    return merged, report
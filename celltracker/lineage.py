@@ -0,0 +1,369 @@
+"""Cell lineage tree for the ECharts Tree chart."""
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+# 노드 툴팁 (Tube 한 개당 한 번 format)
+TOOLTIP_TEMPLATE = """
+        <div style='padding: 10px; font-size: 13px; line-height: 1.5; background-color: #f8f9fa; border-radius: 6px; border: 1px solid #e0e0e0;'>
+            <div style='font-weight: bold; font-size: 15px; margin-bottom: 5px; color: #2c3e50; border-bottom: 1px solid #e0e0e0; padding-bottom: 5px;'>
+                {tube_id} (P{passage})
+            </div>
+            <div style='display: grid; grid-template-columns: auto 1fr; gap: 5px;'>
+                <div style='color: #7f8c8d;'>Date:</div>
+                <div>{date_str}</div>
+                
+                <div style='color: #7f8c8d;'>Location:</div>
+                <div>{tray} / {box} / {position}</div>
+                
+                <div style='color: #7f8c8d;'>Lot:</div>
+                <div>{lot}</div>
+                
+                <div style='color: #7f8c8d;'>Mycoplasma:</div>
+                <div>{mycoplasma}</div>
+                
+                <div style='color: #7f8c8d;'>Operator:</div>
+                <div>{operator}</div>
+            </div>
+            <div style='margin-top: 5px; border-top: 1px solid #e0e0e0; padding-top: 5px;'>
+                <div style='color: #7f8c8d;'>Info:</div>
+                <div>{info}</div>
+            </div>
+        </div>
+        """
+
+TOOLTIP_FIELDS = {
+    "tray": "Tray",
+    "box": "Box",
+    "position": "Position",
+    "lot": "Lot",
+    "mycoplasma": "Mycoplasma",
+    "operator": "Operator",
+    "info": "Info",
+}
+
+IN_USE_COLOR = "#e74c3c"     # Use red
+AVAILABLE_COLOR = "#2ecc71"  # Not use green
+UNKNOWN_COLOR = "#3498db"    # Basic blue
+ROOT_COLOR = "#9b59b6"
+SUMMARY_COLOR = "#bdc3c7"
+MAX_VISIBLE_CHILDREN = 30
+
+# Shared (read-only) style dicts: every node with the same status points at the same object
+_ITEM_STYLES = {
+    color: {"color": color, "borderColor": "#ffffff", "borderWidth": 2}
+    for color in (IN_USE_COLOR, AVAILABLE_COLOR, UNKNOWN_COLOR)
+}
+_EMPHASIS = {
+    "itemStyle": {
+        "borderColor": "#34495e",
+        "borderWidth": 3,
+        "shadowBlur": 12,
+        "shadowColor": "rgba(0, 0, 0, 0.5)"
+    }
+}
+
+
+def normalize_ids(values: pd.Series) -> pd.Series:
+    return values.astype(str).str.strip().str.upper()
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Parse a whole Date column at once; odd formats fall back to per-value parsing."""
+    dates = pd.to_datetime(values, errors="coerce")
+    retry = dates.isna() & values.notna() & (values.astype(str).str.strip() != "")
+    if retry.any():
+        dates = dates.copy()
+        dates[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return dates
+
+
+def _text_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    # same text as f"{row.get(col, '')}" per row
+    if col not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    values = df[col]
+    if pd.api.types.is_bool_dtype(values):  # typed Yes/No column
+        return np.where(values.to_numpy(dtype=bool), "Yes", "No").astype(object)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object).where(values.notna(), "")
+    return np.array([f"{v}" for v in values.astype(object).to_numpy()], dtype=object)
+
+
+# same template with positional slots, so each row is a single format(*values) call
+_TOOLTIP_FIELD_ORDER = ["tube_id", "passage", "date_str"] + list(TOOLTIP_FIELDS)
+_POSITIONAL_TOOLTIP = TOOLTIP_TEMPLATE.format(
+    **{name: "{%d}" % i for i, name in enumerate(_TOOLTIP_FIELD_ORDER)}
+)
+
+
+def render_tooltips(df: pd.DataFrame, tube_ids: np.ndarray, passages: np.ndarray,
+                    date_strs: np.ndarray) -> List[str]:
+    columns = [_text_column(df, col) for col in TOOLTIP_FIELDS.values()]
+    fmt = _POSITIONAL_TOOLTIP.format
+    return [fmt(*values) for values in zip(tube_ids, passages, date_strs, *columns)]
+
+
+def status_colors(df: pd.DataFrame) -> np.ndarray:
+    if "Inuse" not in df.columns:
+        return np.full(len(df), UNKNOWN_COLOR, dtype=object)
+    if pd.api.types.is_bool_dtype(df["Inuse"]):
+        return np.where(df["Inuse"].to_numpy(dtype=bool), IN_USE_COLOR, AVAILABLE_COLOR).astype(object)
+    status = df["Inuse"].astype(str).str.lower().to_numpy()
+    return np.where(status == "yes", IN_USE_COLOR,
+                    np.where(status == "no", AVAILABLE_COLOR, UNKNOWN_COLOR)).astype(object)
+
+
+def tube_tooltips(df: pd.DataFrame, tube_ids: np.ndarray) -> List[str]:
+    passages = df["Passage"].fillna(0).astype(int).to_numpy() if len(df) else np.array([], dtype=int)
+    if "Date" in df.columns:
+        date_strs = parse_dates(df["Date"]).dt.strftime('%Y-%m-%d').fillna("").to_numpy()
+    else:
+        date_strs = np.full(len(df), "", dtype=object)
+    return render_tooltips(df, tube_ids, passages, date_strs)
+
+
+def node_tooltip(df: pd.DataFrame, tube_id: str) -> str:
+    """Tooltip HTML for a single tube, rendered on demand (last row wins, as in the tree)."""
+    tube_ids = normalize_ids(df["Tube ID"]).to_numpy()
+    rows = np.flatnonzero(tube_ids == tube_id)
+    if len(rows) == 0:
+        return ""
+    row = df.iloc[rows[-1:]]
+    return tube_tooltips(row, tube_ids[rows[-1:]])[0]
+
+
+# ------------------ BUILD TREE ------------------
+def build_tree(df: pd.DataFrame, with_tooltips: bool = True) -> list:
+    """Lineage forest under a virtual ROOT, linked by Parent Tube.
+
+    Columns are normalized and parsed once, tooltips are rendered from one
+    template, and parent/child links come from an index lookup instead of a
+    per-row loop. Duplicate Tube IDs keep the last row; tubes whose parent is
+    missing or that sit on a cycle are not shown (same as before).
+    With with_tooltips=False node values are left empty (see node_tooltip).
+    """
+    tube_ids = normalize_ids(df["Tube ID"]).to_numpy()
+    parents = normalize_ids(df["Parent Tube"]).replace(["NONE", "NAN", ""], np.nan)
+    tooltips = tube_tooltips(df, tube_ids) if with_tooltips else [""] * len(df)
+    colors = status_colors(df)
+
+    # 중복 Tube ID는 마지막 행이 노드가 됨
+    id_index = pd.Index(tube_ids)
+    node_rows = np.flatnonzero(~id_index.duplicated(keep="last"))
+    node_ids = tube_ids[node_rows]
+    nodes = [
+        {
+            "name": tube_ids[i],
+            "value": tooltips[i],
+            "children": [],
+            "itemStyle": _ITEM_STYLES[colors[i]],
+            "emphasis": _EMPHASIS,
+        }
+        for i in node_rows
+    ]
+
+    # child -> parent: last non-empty parent per Tube ID, in first-seen order
+    has_parent = parents.notna().to_numpy()
+    linked = pd.Series(parents.to_numpy()[has_parent], index=tube_ids[has_parent])
+    first_seen = ~linked.index.duplicated(keep="first")
+    link_parent = linked.groupby(level=0, sort=False).last()
+    child_ids = linked.index[first_seen]
+    parent_ids = link_parent.reindex(child_ids).to_numpy()
+
+    node_pos = pd.Index(node_ids)
+    child_pos = node_pos.get_indexer(child_ids)
+    parent_pos = node_pos.get_indexer(parent_ids)
+    attach = parent_pos >= 0
+    for c, p in zip(child_pos[attach], parent_pos[attach]):
+        nodes[p]["children"].append(nodes[c])
+
+    is_child = np.zeros(len(nodes), dtype=bool)
+    is_child[child_pos] = True
+    root_nodes = [nodes[i] for i in np.flatnonzero(~is_child)]
+
+    tree = [{
+        "name": "ROOT",
+        "value": "Virtual Root",
+        "children": root_nodes,
+        "itemStyle": {"color": ROOT_COLOR, "borderColor": "#ffffff", "borderWidth": 2}
+    }]
+    return tree
+
+
+# ------------------ LINEAGE VIEW ------------------
+def count_descendants(node: dict) -> int:
+    count, stack = 0, list(node.get("children", []))
+    while stack:
+        child = stack.pop()
+        count += 1
+        stack.extend(child.get("children", []))
+    return count
+
+
+def summary_node(parent: dict, hidden: List[dict]) -> dict:
+    """Stand-in for hidden subtrees: shows how many tubes are folded away."""
+    n = len(hidden) + sum(count_descendants(node) for node in hidden)
+    return {
+        "name": f"+{n} more",
+        "value": n,
+        "summaryOf": parent["name"],
+        "children": [],
+        "symbol": "roundRect",
+        "itemStyle": {"color": SUMMARY_COLOR, "borderColor": "#ffffff", "borderWidth": 2},
+    }
+
+
+def limit_tree(tree: list, max_depth: int, max_children: int = MAX_VISIBLE_CHILDREN) -> list:
+    """Copy of the top `max_depth` tube levels under ROOT.
+
+    Subtrees below the cut, and siblings past the first `max_children`, are
+    folded into one summary node per parent, so the payload grows with what
+    is visible instead of with the whole lineage.
+    """
+    def shallow(node):
+        return {k: v for k, v in node.items() if k != "children"}
+
+    result = [shallow(n) for n in tree]
+    stack = [(src, dst, 0) for src, dst in zip(tree, result)]
+    while stack:
+        src, dst, depth = stack.pop()
+        children = src.get("children", [])
+        if not children:
+            dst["children"] = []
+        elif depth >= max_depth:
+            dst["children"] = [summary_node(src, children)]
+        else:
+            shown = children[:max_children]
+            dst["children"] = [shallow(c) for c in shown]
+            stack.extend((c, d, depth + 1) for c, d in zip(shown, dst["children"]))
+            if len(children) > max_children:
+                dst["children"].append(summary_node(src, children[max_children:]))
+    return result
+
+
+# ------------------ LINEAGE INDEX ------------------
+class LineageIndex:
+    """Euler-tour index over the Parent Tube forest, built once per data version.
+
+    Every reachable tube gets a preorder interval [tin, tout): a is an ancestor
+    of b iff tin[a] < tin[b] < tout[a], and a's descendants are the contiguous
+    slice order[tin[a] + 1:tout[a]]. Tubes whose parent is missing (orphans) start
+    their own tree; tubes on a parent cycle, and everything below them, are not
+    reachable from any root and are reported in `cycles` instead.
+    """
+
+    def __init__(self, tube_ids: np.ndarray, parent: np.ndarray, orphans: List[tuple]):
+        n = len(tube_ids)
+        self.ids = tube_ids
+        self._pos = dict(zip(tube_ids.tolist(), range(n)))
+        self.parent = parent
+        self.orphans = orphans
+
+        # children in CSR form: child positions grouped by parent
+        has_parent = parent >= 0
+        children = np.flatnonzero(has_parent)
+        by_parent = children[np.argsort(parent[children], kind="stable")].tolist()
+        starts = np.concatenate([[0], np.cumsum(np.bincount(parent[children], minlength=n))]).tolist()
+
+        tin = [-1] * n
+        depth = [-1] * n
+        order = []
+        for root in np.flatnonzero(~has_parent).tolist():
+            stack = [(root, 0)]
+            while stack:
+                v, d = stack.pop()
+                tin[v], depth[v] = len(order), d
+                order.append(v)
+                kids = by_parent[starts[v]:starts[v + 1]]
+                if kids:
+                    stack.extend((k, d + 1) for k in reversed(kids))
+        self.tin = np.array(tin, dtype=np.int64)
+        self.depth = np.array(depth, dtype=np.int64)
+        self.order = np.array(order, dtype=np.int64)
+
+        # subtree sizes bottom-up one depth level at a time, then tout = tin + size
+        reached = self.tin >= 0
+        size = reached.astype(np.int64)
+        for d in range(int(self.depth.max(initial=0)), 0, -1):
+            level = np.flatnonzero(self.depth == d)
+            np.add.at(size, parent[level], size[level])
+        self.tout = np.where(reached, self.tin + size, -1)
+
+        unreached = np.flatnonzero(~reached)
+        self.cycles = _find_cycles(tube_ids, parent, unreached) if len(unreached) else []
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "LineageIndex":
+        all_ids = normalize_ids(df["Tube ID"]).to_numpy()
+        parents = normalize_ids(df["Parent Tube"]).replace(["NONE", "NAN", ""], np.nan).to_numpy()
+        # same rules as build_tree: last row per Tube ID, last non-empty parent
+        tube_ids = all_ids[~pd.Index(all_ids).duplicated(keep="last")]
+        linked = pd.Series(parents, index=all_ids).dropna()
+        parent_ids = linked.groupby(level=0, sort=False).last().reindex(tube_ids).to_numpy()
+
+        parent = pd.Index(tube_ids).get_indexer(parent_ids)
+        orphan_rows = np.flatnonzero(pd.notna(parent_ids) & (parent < 0))
+        orphans = [(tube_ids[i], parent_ids[i]) for i in orphan_rows]
+        return cls(tube_ids, parent, orphans)
+
+    # ---- lookups ----
+    def _at(self, tube_id: str) -> int:
+        return self._pos[str(tube_id).strip().upper()]
+
+    def __contains__(self, tube_id: str) -> bool:
+        return str(tube_id).strip().upper() in self._pos
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def is_ancestor(self, ancestor: str, tube_id: str) -> bool:
+        a, b = self._at(ancestor), self._at(tube_id)
+        return bool(self.tin[a] >= 0 and self.tin[b] >= 0 and self.tin[a] < self.tin[b] < self.tout[a])
+
+    def descendants(self, tube_id: str, include_self: bool = False) -> List[str]:
+        a = self._at(tube_id)
+        if self.tin[a] < 0:
+            return []
+        start = self.tin[a] if include_self else self.tin[a] + 1
+        return self.ids[self.order[start:self.tout[a]]].tolist()
+
+    def ancestors(self, tube_id: str) -> List[str]:
+        """Ancestry chain from the master stock down to (and including) tube_id."""
+        v = self._at(tube_id)
+        if self.tin[v] < 0:
+            return []
+        path = []
+        while v >= 0:
+            path.append(self.ids[v])
+            v = self.parent[v]
+        return path[::-1]
+
+    def generation(self, tube_id: str) -> int:
+        """Generations from the master stock (a root is 0; -1 when on or below a cycle)."""
+        return int(self.depth[self._at(tube_id)])
+
+    def subtree_mask(self, df: pd.DataFrame, tube_id: str) -> pd.Series:
+        """Rows of df that are tube_id or one of its descendants."""
+        members = self.descendants(tube_id, include_self=True)
+        return normalize_ids(df["Tube ID"]).isin(members)
+
+
+def _find_cycles(tube_ids: np.ndarray, parent: np.ndarray, candidates: np.ndarray) -> List[List[str]]:
+    """Cycles in the child -> parent pointer graph among `candidates` (tubes no root reaches)."""
+    state = {}  # 1 on current walk, 2 done
+    cycles = []
+    for start in candidates.tolist():
+        if start in state:
+            continue
+        walk, v = [], start
+        while v >= 0 and v not in state:
+            state[v] = 1
+            walk.append(v)
+            v = int(parent[v])
+        if v >= 0 and state.get(v) == 1:
+            cycles.append(tube_ids[walk[walk.index(v):]].tolist())
+        for w in walk:
+            state[w] = 2
+    return cycles
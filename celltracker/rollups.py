@@ -0,0 +1,164 @@
+"""Dashboard aggregates kept current between rebuilds.
+
+A Rollup holds the counts behind the dashboard (totals, In Use, cell lines)
+and the trend tables (tubes frozen per week, passages per cell line,
+Mycoplasma-positive share per lot, box fill over time) as counters. A save
+subtracts the old version of the rows it touched or removed and adds the new one, so
+the dashboard never rescans the sheet; rebuilding from a frame is one
+groupby per counter.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from celltracker.schema import in_use
+
+WEEK_RULE = "W-SUN"  # weeks start on Monday
+
+
+def _week(dates: pd.Series) -> pd.Series:
+    return dates.dt.to_period(WEEK_RULE).dt.start_time
+
+
+def _counts(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """Rows per combination of columns, missing values skipped."""
+    if len(df) == 0 or any(c not in df.columns for c in columns):
+        return pd.Series(dtype=np.int64)
+    counts = df.groupby(columns, observed=True, dropna=True).size()
+    return counts[counts > 0]
+
+
+def _update(counter: Counter, counts: pd.Series, sign: int):
+    for key, n in counts.items():
+        counter[key] += sign * int(n)
+        if counter[key] <= 0:
+            del counter[key]
+
+
+class Rollup:
+    """Aggregates of one sheet (or several, combined); `version` is the data version they describe."""
+
+    def __init__(self):
+        self.total = 0
+        self.in_use = 0
+        self.sheets = 1
+        self.cell_lines: Counter = Counter()     # cell line -> tubes
+        self.frozen_weekly: Counter = Counter()  # week start -> tubes frozen (Date)
+        self.passages: Counter = Counter()       # (cell line, passage) -> tubes
+        self.mycoplasma: Counter = Counter()     # (lot, positive) -> tubes
+        self.box_weekly: Counter = Counter()     # (tray, box, week start) -> tubes frozen into the box
+        self.version = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Rollup":
+        rollup = cls()
+        rollup.add(df)
+        return rollup
+
+    @classmethod
+    def combine(cls, parts: Iterable["Rollup"]) -> "Rollup":
+        """Sum of several sheets' rollups (the all-sheets dashboard)."""
+        out = cls()
+        out.sheets = 0
+        for part in parts:
+            out.total += part.total
+            out.in_use += part.in_use
+            out.sheets += part.sheets
+            for name in ("cell_lines", "frozen_weekly", "passages", "mycoplasma", "box_weekly"):
+                getattr(out, name).update(getattr(part, name))
+        return out
+
+    def copy(self) -> "Rollup":
+        out = Rollup.combine([self])
+        out.version = self.version
+        return out
+
+    # ---- maintenance ----
+    def add(self, rows: pd.DataFrame, sign: int = 1):
+        """Count rows in (sign=1) or out (sign=-1)."""
+        self.total += sign * len(rows)
+        self.in_use += sign * int(in_use(rows).sum())
+        if "Date" in rows.columns:
+            rows = rows.assign(Week=_week(rows["Date"]))
+        _update(self.cell_lines, _counts(rows, ["Cell Name"]), sign)
+        _update(self.frozen_weekly, _counts(rows, ["Week"]), sign)
+        _update(self.passages, _counts(rows, ["Cell Name", "Passage"]), sign)
+        _update(self.mycoplasma, _counts(rows, ["Lot", "Mycoplasma"]), sign)
+        _update(self.box_weekly, _counts(rows, ["Tray", "Box", "Week"]), sign)
+
+    def apply(self, base: pd.DataFrame, new: pd.DataFrame, edited_rows: Iterable[int], appended: range,
+              removed: Iterable[int] = ()):
+        """Move from typed frame base to new: removed rows are counted out, edited rows out and back in
+        (a tube moved to another box leaves the old one), appended rows in.
+
+        `removed` are positions in base; edited_rows/appended are positions once those rows are dropped.
+        """
+        removed = sorted(set(removed))
+        if removed:
+            self.add(base.iloc[removed], -1)
+            kept = np.ones(len(base), dtype=bool)
+            kept[removed] = False
+            base = base.iloc[kept]
+        edited = sorted(set(edited_rows))
+        if edited:
+            self.add(base.iloc[edited], -1)
+            self.add(new.iloc[edited])
+        if len(appended):
+            self.add(new.iloc[appended.start:appended.stop])
+
+    # ---- dashboard numbers ----
+    @property
+    def available(self) -> int:
+        return self.total - self.in_use
+
+    @property
+    def n_cell_lines(self) -> int:
+        return len(self.cell_lines)
+
+    # ---- trend tables ----
+    def weekly_frozen(self) -> pd.DataFrame:
+        """Week (Monday), Tubes — weeks without freezing included as 0."""
+        if not self.frozen_weekly:
+            return pd.DataFrame({"Week": pd.Series(dtype="datetime64[ns]"), "Tubes": pd.Series(dtype=np.int64)})
+        counts = pd.Series(self.frozen_weekly).sort_index()
+        weeks = pd.date_range(counts.index[0], counts.index[-1], freq="7D")
+        return counts.reindex(weeks, fill_value=0).rename_axis("Week").reset_index(name="Tubes")
+
+    def passage_distribution(self) -> pd.DataFrame:
+        """Cell Name, Passage, Tubes."""
+        rows = [(cell, int(p), n) for (cell, p), n in self.passages.items()]
+        return pd.DataFrame(rows, columns=["Cell Name", "Passage", "Tubes"]).sort_values(
+            ["Cell Name", "Passage"], ignore_index=True)
+
+    def mycoplasma_by_lot(self) -> pd.DataFrame:
+        """Lot, Tubes, Positive, Positive Rate (share of the lot's tubes marked Mycoplasma: Yes)."""
+        lots: Dict[str, List[int]] = {}
+        for (lot, positive), n in self.mycoplasma.items():
+            counts = lots.setdefault(lot, [0, 0])
+            counts[0] += n
+            counts[1] += n if positive else 0
+        out = pd.DataFrame([(lot, t, p) for lot, (t, p) in lots.items()], columns=["Lot", "Tubes", "Positive"])
+        out["Positive Rate"] = out["Positive"] / out["Tubes"].where(out["Tubes"] > 0)
+        return out.sort_values(["Positive Rate", "Lot"], ascending=[False, True], ignore_index=True)
+
+    def box_fill(self, capacities: Optional[Dict[tuple, int]] = None) -> pd.DataFrame:
+        """Tray, Box, Week, Tubes (frozen into the box up to that week), plus Fill when capacities are given.
+
+        One row per week a box received tubes; in between, the fill stays at the previous row.
+        """
+        columns = ["Tray", "Box", "Week", "Tubes"]
+        if not self.box_weekly:
+            return pd.DataFrame(columns=columns + (["Fill"] if capacities is not None else []))
+        out = pd.DataFrame(list(self.box_weekly), columns=columns[:3])
+        out["Tubes"] = np.fromiter(self.box_weekly.values(), dtype=np.int64, count=len(self.box_weekly))
+        out = out.sort_values(columns[:3], ignore_index=True)
+        out["Tubes"] = out.groupby(["Tray", "Box"], sort=False)["Tubes"].cumsum()
+        if capacities is not None:
+            capacity = np.full(len(out), np.nan)
+            if capacities:
+                boxes = pd.MultiIndex.from_frame(out[["Tray", "Box"]])
+                capacity = pd.Series(capacities, dtype=float).reindex(boxes).to_numpy()
+            out["Fill"] = out["Tubes"] / capacity
+        return out
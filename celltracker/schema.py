@@ -0,0 +1,200 @@
+"""Typed in-memory schema for the tube table.
+
+The stores keep the sheet's text ("Yes"/"No", "2025-04-17", ...). coerce()
+turns a loaded frame into compact typed columns once per data version, and
+to_storage() renders it back before saving. Cells the user did not touch keep
+their original text, so loading and saving never rewrites odd or invalid values.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from celltracker.lineage import parse_dates
+
+ID_COLUMNS = ["Tube ID", "Parent Tube"]
+CATEGORY_COLUMNS = ["Cell Name", "Tray", "Box", "Lot", "Operator"]
+BOOL_COLUMNS = ["Inuse", "Mycoplasma"]
+TEXT_COLUMNS = ["Position", "Info"]
+PASSAGE_DTYPE = "Int16"
+
+TRUE_TEXT = {"yes", "y", "true", "1"}
+FALSE_TEXT = {"no", "n", "false", "0", ""}
+
+ISSUE_COLUMNS = ["Row", "Tube ID", "Column", "Value", "Problem"]
+
+
+@dataclass
+class SchemaReport:
+    """Rows that failed validation, plus the original text of non-canonical cells."""
+
+    issues: pd.DataFrame = field(default_factory=lambda: pd.DataFrame(columns=ISSUE_COLUMNS))
+    # (row, column) -> (rendered text at load, original cell value)
+    originals: Dict[Tuple[int, str], Tuple[Any, Any]] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return self.issues.empty
+
+    @property
+    def bad_rows(self) -> int:
+        # merged inventories number rows per sheet
+        return len(self.issues.drop_duplicates([c for c in ("Sheet", "Row") if c in self.issues.columns]))
+
+
+def _text(series: pd.Series) -> pd.Series:
+    """Cell text with blanks as "" (integral floats without the trailing .0)."""
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if (values == values.round()).all():
+            series = series.astype("Int64")
+    return series.astype("string").fillna("").str.strip().astype(object)
+
+
+def in_use(df: pd.DataFrame) -> np.ndarray:
+    """Inuse as a bool array, for typed frames and raw "Yes"/"No" text alike."""
+    if "Inuse" not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    status = df["Inuse"]
+    if pd.api.types.is_bool_dtype(status):
+        return status.to_numpy(dtype=bool)
+    return status.astype(str).str.strip().str.lower().to_numpy() == "yes"
+
+
+def coerce(raw: pd.DataFrame) -> Tuple[pd.DataFrame, SchemaReport]:
+    """Typed copy of a loaded frame and a validation report."""
+    raw = raw.reset_index(drop=True)
+    df = raw.copy()
+    typed_columns = [c for c in ID_COLUMNS + CATEGORY_COLUMNS + BOOL_COLUMNS + TEXT_COLUMNS + ["Passage", "Date"]
+                     if c in df.columns]
+    texts = {col: _text(raw[col]) for col in typed_columns}
+    problems: List[pd.DataFrame] = []
+
+    def flag(mask: np.ndarray, col: str, text: pd.Series, problem: str):
+        rows = np.flatnonzero(mask)
+        if len(rows):
+            problems.append(pd.DataFrame({"Row": rows + 2,  # sheet row (header is row 1)
+                                          "Column": col, "Value": text.to_numpy()[rows], "Problem": problem}))
+
+    for col in ID_COLUMNS:
+        if col in df.columns:
+            ids = texts[col].str.upper()
+            df[col] = ids.where(~ids.isin(["NONE", "NAN"]), "") if col == "Parent Tube" else ids
+    if "Tube ID" in df.columns:
+        ids = df["Tube ID"]
+        flag((ids == "").to_numpy(), "Tube ID", ids, "missing Tube ID")
+        flag((ids.duplicated(keep=False) & (ids != "")).to_numpy(), "Tube ID", ids, "duplicate Tube ID")
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = texts[col].replace("", np.nan).astype("category")
+
+    for col in BOOL_COLUMNS:
+        if col in df.columns:
+            text = texts[col]
+            lower = text.str.lower()
+            flag((~lower.isin(TRUE_TEXT | FALSE_TEXT)).to_numpy(), col, text, "expected Yes/No")
+            df[col] = lower.isin(TRUE_TEXT).to_numpy()
+
+    if "Passage" in df.columns:
+        text = texts["Passage"]
+        numbers = pd.to_numeric(text.replace("", np.nan), errors="coerce")
+        bad = (numbers.isna() | (numbers != numbers.round())) & (text != "")
+        flag(bad.to_numpy(), "Passage", text, "not a whole number")
+        df["Passage"] = numbers.where(~bad).astype(PASSAGE_DTYPE)
+
+    if "Date" in df.columns:
+        text = texts["Date"]
+        dates = parse_dates(text.replace("", np.nan))
+        flag((dates.isna() & (text != "")).to_numpy(), "Date", text, "not a date")
+        df["Date"] = dates
+
+    if "Position" in df.columns:
+        df["Position"] = texts["Position"].str.upper()
+    if "Info" in df.columns:
+        df["Info"] = texts["Info"]
+
+    report = SchemaReport()
+    if problems:
+        issues = pd.concat(problems, ignore_index=True)
+        if "Tube ID" in df.columns:
+            issues["Tube ID"] = df["Tube ID"].to_numpy()[issues["Row"].to_numpy() - 2]
+        report.issues = issues[ISSUE_COLUMNS].sort_values(["Row", "Column"], ignore_index=True)
+
+    # 저장할 때 원래 값으로 되돌릴 셀 (정규화 때문에 텍스트가 달라진 곳만)
+    rendered = to_storage(df)
+    for col in typed_columns:
+        text = _text(rendered[col]) if col == "Passage" else rendered[col]  # the only non-text column
+        differs = np.flatnonzero(text.to_numpy() != texts[col].to_numpy())
+        for r in differs:
+            report.originals[(int(r), col)] = (rendered[col].iat[r], raw[col].iat[r])
+    return df, report
+
+
+def to_storage(df: pd.DataFrame, report: SchemaReport = None, rows: Optional[Sequence[int]] = None) -> pd.DataFrame:
+    """Sheet representation of a typed frame (Yes/No, ISO dates, blank for missing).
+
+    `rows` limits the output to those row positions of df; report positions still refer to df.
+    """
+    out = df.copy() if rows is None else df.iloc[list(rows)].copy()
+    for col in out.columns:
+        values = out[col]
+        if pd.api.types.is_bool_dtype(values):
+            out[col] = np.where(values.to_numpy(dtype=bool), "Yes", "No").astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            text = values.dt.strftime("%Y-%m-%d").where(values.dt.normalize() == values,
+                                                         values.dt.strftime("%Y-%m-%d %H:%M:%S"))
+            out[col] = text.astype(object).where(values.notna(), "")
+        elif isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_extension_array_dtype(values):
+            out[col] = values.astype(object).where(values.notna(), "")
+    if report is not None:
+        positions = {col: i for i, col in enumerate(out.columns)}
+        at = None if rows is None else {r: i for i, r in enumerate(rows)}
+        for (r, col), (rendered, original) in report.originals.items():
+            i = r if at is None else at.get(r)
+            if i is not None and i < len(out) and col in positions and out.iat[i, positions[col]] == rendered:
+                out.iat[i, positions[col]] = original
+    return out
+
+
+def field_value(column: str, value):
+    """A single edit value for column: bool for Inuse/Mycoplasma, text otherwise (None clears).
+
+    Raises ValueError for anything else (lists, objects, "maybe" as a status...).
+    """
+    if column in BOOL_COLUMNS:
+        if isinstance(value, (bool, np.bool_)) or (isinstance(value, int) and value in (0, 1)):
+            return bool(value)
+        if isinstance(value, str) and value.strip().lower() in TRUE_TEXT | FALSE_TEXT:
+            return value.strip().lower() in TRUE_TEXT
+        raise ValueError(f"{column} must be true/false or Yes/No, not {value!r}")
+    if value is None:
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)) or value != value:
+        raise ValueError(f"{column} must be text or a number, not {value!r}")
+    return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+
+
+def append_rows(df: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    """Typed frame with new raw rows (e.g. from the registration form) appended."""
+    typed, _ = coerce(rows.reindex(columns=df.columns))
+    out = pd.concat([df, typed], ignore_index=True)
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype("category")
+    return out
+
+
+def assign(df: pd.DataFrame, rows: np.ndarray, column: str, value) -> pd.DataFrame:
+    """Copy of df with column set to value at the given row positions, keeping the column's dtype."""
+    df = df.copy()
+    values = df[column]
+    if pd.api.types.is_bool_dtype(values) and isinstance(value, str):
+        value = value.strip().lower() in TRUE_TEXT
+    elif isinstance(values.dtype, pd.CategoricalDtype):
+        value = str(value).strip() or np.nan
+        if pd.notna(value) and value not in values.cat.categories:
+            df[column] = values.cat.add_categories([value])
+    df.iloc[np.asarray(rows, dtype=np.int64), df.columns.get_loc(column)] = value
+    return df
@@ -0,0 +1,188 @@
+"""Search index for the Tube Management table.
+
+Queries are whitespace separated terms; all terms must match:
+
+    a549                      any of Tube ID / Cell Name / Lot / Operator contains "a549"
+    cell:A549 box:Box-A1      field filters
+    inuse:no "op:Chae young"  quoted values may contain spaces
+    sheet:u2os                only in the all-sheets inventory
+"""
+import shlex
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 부분 문자열 검색 (3-gram 색인)
+TEXT_FIELDS = {
+    "id": "Tube ID",
+    "cell": "Cell Name",
+    "lot": "Lot",
+    "operator": "Operator",
+}
+# 값이 정확히 같아야 하는 필드
+EXACT_FIELDS = {
+    "parent": "Parent Tube",
+    "tray": "Tray",
+    "box": "Box",
+    "pos": "Position",
+    "passage": "Passage",
+    "myco": "Mycoplasma",
+    "inuse": "Inuse",
+    "sheet": "Sheet",  # 전체 보기(merged inventory)에만 있는 열
+}
+ALIASES = {"tube": "id", "op": "operator", "position": "pos", "mycoplasma": "myco", "status": "inuse"}
+
+GRAM = 3
+
+
+def parse_query(query: str) -> List[Tuple[Optional[str], str]]:
+    """'cell:A549 p2' -> [("cell", "a549"), (None, "p2")]; unknown prefixes are plain text."""
+    try:
+        tokens = shlex.split(query)
+    except ValueError:  # unbalanced quote while typing
+        tokens = query.split()
+    terms = []
+    for token in tokens:
+        field, sep, value = token.partition(":")
+        field = ALIASES.get(field.lower(), field.lower())
+        if sep and (field in TEXT_FIELDS or field in EXACT_FIELDS):
+            terms.append((field, value.strip().lower()))
+        elif token.strip():
+            terms.append((None, token.strip().lower()))
+    return terms
+
+
+def _normalized(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series):
+        return pd.Series(np.where(series.to_numpy(dtype=bool), "yes", "no"), index=series.index)
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if (values == values.round()).all():
+            series = series.astype("Int64")
+    return series.astype("string").fillna("").str.strip().str.lower()
+
+
+class _Column:
+    """Distinct values of one column plus the row -> value code mapping."""
+
+    def __init__(self, series: pd.Series, ngrams: bool):
+        codes, vocab = pd.factorize(_normalized(series).to_numpy(dtype=object))
+        self.codes = codes
+        self.vocab = np.asarray(vocab, dtype=object)
+        self.postings = _gram_postings(self.vocab) if ngrams else None
+        self._last: Tuple[str, np.ndarray] = ("", np.arange(len(self.vocab)))
+
+    def rows(self, matched: np.ndarray) -> np.ndarray:
+        hit = np.zeros(len(self.vocab) + 1, dtype=bool)  # code -1 never matches
+        hit[matched] = True
+        return hit[self.codes]
+
+    def equals(self, value: str) -> np.ndarray:
+        return self.rows(np.flatnonzero(self.vocab == value))
+
+    def contains(self, term: str) -> np.ndarray:
+        return self.rows(self._matching_values(term))
+
+    def _matching_values(self, term: str) -> np.ndarray:
+        last_term, last_hits = self._last
+        if last_term and last_term in term:
+            # 글자를 더 입력한 경우: 직전 결과 안에서만 확인
+            candidates = last_hits
+        elif len(term) >= GRAM:
+            candidates = None
+            for gram in sorted({term[i:i + GRAM] for i in range(len(term) - GRAM + 1)},
+                               key=lambda g: len(self.postings.get(g, ()))):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    candidates = np.empty(0, dtype=np.int64)
+                    break
+                candidates = posting if candidates is None else np.intersect1d(candidates, posting, assume_unique=True)
+                if not len(candidates):
+                    break
+        else:
+            candidates = np.arange(len(self.vocab))
+        hits = candidates[np.fromiter((term in v for v in self.vocab[candidates]), dtype=bool, count=len(candidates))]
+        self._last = (term, hits)
+        return hits
+
+
+def _gram_postings(vocab: np.ndarray) -> Dict[str, np.ndarray]:
+    """3-gram -> sorted indices of the distinct values containing it."""
+    values = pd.Series(vocab, dtype=object)
+    lengths = values.str.len().to_numpy()
+    grams, owners = [], []
+    for start in range(max(0, int(lengths.max(initial=0)) - GRAM + 1)):
+        ok = lengths >= start + GRAM
+        grams.append(values[ok].str[start:start + GRAM].to_numpy(dtype=object))
+        owners.append(np.flatnonzero(ok))
+    if not grams:
+        return {}
+    gram_codes, gram_names = pd.factorize(np.concatenate(grams))
+    owners = np.concatenate(owners)
+    order = np.lexsort((owners, gram_codes))
+    gram_codes, owners = gram_codes[order], owners[order]
+    keep = np.ones(len(owners), dtype=bool)  # a value listed once per gram
+    keep[1:] = (gram_codes[1:] != gram_codes[:-1]) | (owners[1:] != owners[:-1])
+    gram_codes, owners = gram_codes[keep], owners[keep]
+    bounds = np.flatnonzero(np.diff(gram_codes)) + 1
+    return dict(zip(gram_names[gram_codes[np.r_[0, bounds]]], np.split(owners, bounds)))
+
+
+class SearchIndex:
+    """Per-column value dictionaries and 3-gram postings for one sheet.
+
+    Results are row positions into the frame the index was built from, so
+    the caller only materializes the rows it displays.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        self._df = df
+        self.columns: Dict[str, _Column] = {}
+        for field, col in {**TEXT_FIELDS, **EXACT_FIELDS}.items():
+            if col in df.columns:
+                self.columns[field] = _Column(df[col], ngrams=field in TEXT_FIELDS)
+        self._orders: Dict[Tuple[str, bool], np.ndarray] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "SearchIndex":
+        return cls(df.reset_index(drop=True))
+
+    def mask(self, query: str) -> np.ndarray:
+        mask = np.ones(self.n_rows, dtype=bool)
+        for field, value in parse_query(query):
+            if field is None:
+                term = np.zeros(self.n_rows, dtype=bool)
+                for name in TEXT_FIELDS:
+                    if name in self.columns:
+                        term |= self.columns[name].contains(value)
+                mask &= term
+            elif field not in self.columns:
+                mask[:] = False
+            elif field in TEXT_FIELDS:
+                mask &= self.columns[field].contains(value)
+            else:
+                mask &= self.columns[field].equals(value)
+        return mask
+
+    def order(self, column: str, ascending: bool = True) -> np.ndarray:
+        """Row positions sorted by column, computed once per column and direction."""
+        key = (column, ascending)
+        if column not in self._df.columns:
+            raise ValueError(f"cannot sort by {column!r}: no such column")
+        if key not in self._orders:
+            self._orders[key] = (self._df[column].reset_index(drop=True)
+                                 .sort_values(ascending=ascending, kind="stable").index.to_numpy())
+        return self._orders[key]
+
+    def select(self, query: str = "", sort_by: Optional[str] = None, ascending: bool = True,
+               mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions of matching rows, in sort order when sort_by is given."""
+        hits = self.mask(query)
+        if mask is not None:
+            hits &= mask
+        if sort_by is None:
+            return np.flatnonzero(hits)
+        order = self.order(sort_by, ascending)
+        return order[hits[order]]
@@ -0,0 +1,331 @@
+"""HTTP/JSON service over the tube inventory for instruments and scripts (no Streamlit).
+
+    python -m celltracker.service                                # http://127.0.0.1:8765
+    python -m celltracker.service --host 0.0.0.0 --secrets prod.toml --token-env CELLTRACKER_API_TOKEN
+
+Storage, box layouts and telemetry come from the same secrets.toml sections
+as the app. The process keeps one warm core.Inventory, so requests reuse the
+cached frames and indexes instead of reloading the sheet. Sheet "*" is every
+sheet merged (read-only); tube lists go through one request each way.
+
+    GET   /health
+    GET   /sheets
+    GET   /sheets/{sheet}/tubes?q=cell:A549 inuse:no&sort=Date&desc=1&limit=100&as_of=2025-03-01T12:00
+    POST  /sheets/{sheet}/tubes/lookup     {"ids": ["P1_1", ...]}
+    POST  /sheets/{sheet}/tubes            {"tubes": [{"Tube ID": "P2_1", "Cell Name": "A549", ...}], "actor": "..."}
+    PATCH /sheets/{sheet}/tubes            {"ids": [...], "field": "Inuse", "value": true, "actor": "..."}
+    GET   /sheets/{sheet}/lineage/{tube}
+    GET   /sheets/{sheet}/tree?depth=4&focus=P1_1&cell=A549&inuse=no
+    GET   /sheets/{sheet}/boxes
+    GET   /sheets/{sheet}/boxes/{tray}/{box}/free?n=10&contiguous=1
+    POST  /growth/schedule                 {"plan": [{"Cell Line": ..., "Seeding Density": ..., "Target Density": ...}],
+                                            "start": "2025-01-06T09:00"}
+    GET   /history/tubes/{tube}?sheet=A549
+    GET   /history/activity?actor=Johun&since=2025-03-01&until=2025-04-01&limit=500
+    GET   /history/actors?since=2025-03-01
+"""
+import argparse
+import hmac
+import json
+import logging
+import os
+import re
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from celltracker import telemetry
+from celltracker.core import (ALL_SHEETS, BatchRejected, Inventory, box_layouts, get_inventory, open_history,
+                              open_storage)
+from celltracker.events import EventLog
+from celltracker.growth import PLAN_COLUMNS, GrowthTable, predict_schedule
+from celltracker.search import SearchIndex
+
+SECRETS_FILE = ".streamlit/secrets.toml"
+GROWTH_FILE = "growth_rate_20220907.csv"
+MAX_BODY = 32 * 1024 * 1024
+TRUE_TEXT = ("1", "true", "yes", "y")
+
+log = logging.getLogger("celltracker.service")
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def records(df: pd.DataFrame) -> List[dict]:
+    """JSON-ready rows: missing values -> null, Date as YYYY-MM-DD, other timestamps ISO 8601."""
+    if "Date" in df.columns and pd.api.types.is_datetime64_any_dtype(df["Date"]):
+        df = df.assign(Date=df["Date"].dt.strftime("%Y-%m-%d"))
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def load_secrets(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}  # 로컬 SQLite 저장소
+    try:
+        import tomllib
+    except ModuleNotFoundError:  # Python < 3.11: the toml package Streamlit depends on
+        import toml
+        return toml.load(path)
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def _flag(query: Dict[str, str], name: str) -> Optional[bool]:
+    value = query.get(name)
+    return None if value in (None, "") else value.strip().lower() in TRUE_TEXT
+
+
+def _int(query: Dict[str, str], name: str, default: int, minimum: Optional[int] = None) -> int:
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer") from None
+    if minimum is not None and value < minimum:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be at least {minimum}")
+    return value
+
+
+def _list(body: dict, name: str) -> list:
+    value = body.get(name)
+    if not isinstance(value, list):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"body needs a {name!r} list")
+    return value
+
+
+class Service:
+    """Routes (method, path) to the Inventory; handle() is plain Python so scripts can call it in-process too."""
+
+    def __init__(self, inventory: Inventory, growth: GrowthTable, token: Optional[str] = None):
+        self.inventory = inventory
+        self.growth = growth
+        self.token = token
+        self.routes: List[Tuple[str, re.Pattern, Callable]] = [
+            (method, re.compile(f"^{pattern}$"), handler) for method, pattern, handler in [
+                ("GET", r"/health", self.health),
+                ("GET", r"/sheets", self.sheets),
+                ("GET", r"/sheets/([^/]+)/tubes", self.search),
+                ("POST", r"/sheets/([^/]+)/tubes/lookup", self.lookup),
+                ("POST", r"/sheets/([^/]+)/tubes", self.register),
+                ("PATCH", r"/sheets/([^/]+)/tubes", self.update),
+                ("GET", r"/sheets/([^/]+)/lineage/([^/]+)", self.lineage),
+                ("GET", r"/sheets/([^/]+)/tree", self.tree),
+                ("GET", r"/sheets/([^/]+)/boxes", self.boxes),
+                ("GET", r"/sheets/([^/]+)/boxes/([^/]+)/([^/]+)/free", self.free_slots),
+                ("POST", r"/growth/schedule", self.schedule),
+                ("GET", r"/history/tubes/([^/]+)", self.tube_history),
+                ("GET", r"/history/activity", self.activity),
+                ("GET", r"/history/actors", self.actors),
+            ]
+        ]
+
+    def authorized(self, header: Optional[str]) -> bool:
+        if not self.token:
+            return True
+        scheme, _, given = (header or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(given.strip(), self.token)
+
+    def handle(self, method: str, path: str, query: Dict[str, str], body: Optional[dict],
+               authorization: Optional[str] = None) -> Tuple[int, dict]:
+        """(HTTP status, JSON payload) for one request."""
+        allowed = []
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            if handler != self.health and not self.authorized(authorization):
+                return HTTPStatus.UNAUTHORIZED, {"error": "missing or wrong bearer token"}
+            args = [unquote(part) for part in match.groups()]
+            with telemetry.span("handler", route=pattern.pattern):
+                try:
+                    if pattern.pattern.startswith("^/sheets/(") and not self.inventory.has_sheet(args[0]):
+                        return HTTPStatus.NOT_FOUND, {"error": f"no sheet named {args[0]!r}"}
+                    return handler(*args, query=query, body=body or {})
+                except RequestError as e:
+                    return e.status, {"error": str(e), **e.extra}
+                except BatchRejected as e:
+                    return HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(e), "issues": records(e.issues)}
+                except KeyError as e:
+                    return HTTPStatus.NOT_FOUND, {"error": f"not found: {e.args[0] if e.args else ''}"}
+                except ValueError as e:
+                    return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        if allowed:
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"use {' or '.join(allowed)}"}
+        return HTTPStatus.NOT_FOUND, {"error": f"no route for {path}"}
+
+    # ---- handlers ----
+    def health(self, query, body):
+        return HTTPStatus.OK, {"ok": True, "backend": self.inventory.storage.name}
+
+    def sheets(self, query, body):
+        return HTTPStatus.OK, {"sheets": self.inventory.sheet_names(), "all": ALL_SHEETS}
+
+    def search(self, sheet, query, body):
+        sort_by, ascending = query.get("sort") or None, not _flag(query, "desc")
+        if query.get("as_of"):
+            # 과거 시점: 변경 기록에서 다시 만든 프레임을 그 자리에서 색인
+            df, _ = self.inventory.as_of(sheet, query["as_of"])
+            rows = SearchIndex.from_frame(df).select(query.get("q", ""), sort_by=sort_by, ascending=ascending)
+            matched = df.iloc[rows]
+        else:
+            matched = self.inventory.search(sheet, query.get("q", ""), sort_by=sort_by, ascending=ascending)
+        limit = _int(query, "limit", len(matched), minimum=0)
+        return HTTPStatus.OK, {"total": len(matched), "tubes": records(matched.head(limit))}
+
+    def lookup(self, sheet, query, body):
+        found, missing = self.inventory.lookup(sheet, _list(body, "ids"))
+        return HTTPStatus.OK, {"tubes": records(found), "missing": missing}
+
+    def register(self, sheet, query, body):
+        tubes = _list(body, "tubes")
+        if not tubes:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "no tubes to register")
+        registered = self.inventory.register(sheet, pd.DataFrame(tubes), actor=body.get("actor"))
+        return HTTPStatus.CREATED, {"registered": records(registered)}
+
+    def update(self, sheet, query, body):
+        if "field" not in body or "value" not in body:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "body needs 'field' and 'value'")
+        ids = _list(body, "ids")
+        if not all(isinstance(t, (str, int)) and not isinstance(t, bool) for t in ids):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "'ids' must be Tube ID strings")
+        return HTTPStatus.OK, {"updated": self.inventory.update(sheet, ids, body["field"], body["value"],
+                                                                actor=body.get("actor"))}
+
+    def lineage(self, sheet, tube_id, query, body):
+        return HTTPStatus.OK, self.inventory.lineage(sheet, tube_id)
+
+    def tree(self, sheet, query, body):
+        tree = self.inventory.tree(sheet, depth=_int(query, "depth", 4), cell=query.get("cell") or None,
+                                   in_use=_flag(query, "inuse"), focus=query.get("focus") or None)
+        return HTTPStatus.OK, {"tree": tree}
+
+    def boxes(self, sheet, query, body):
+        df, _, version = self.inventory.snapshot(sheet)
+        occupancy = self.inventory.occupancy(sheet, version, df)
+        return HTTPStatus.OK, {"boxes": records(occupancy.summary()), "misplaced": records(occupancy.misplaced())}
+
+    def free_slots(self, sheet, tray, box, query, body):
+        df, _, version = self.inventory.snapshot(sheet)
+        occupancy = self.inventory.occupancy(sheet, version, df)
+        positions = occupancy.free_slots(tray, box, _int(query, "n", 1), bool(_flag(query, "contiguous")))
+        return HTTPStatus.OK, {"tray": tray, "box": box, "positions": positions}
+
+    def schedule(self, query, body):
+        plan = pd.DataFrame(_list(body, "plan"))
+        missing = [c for c in PLAN_COLUMNS if c not in plan.columns]
+        if missing:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"plan rows need {', '.join(missing)}")
+        start = pd.Timestamp(body["start"]).to_pydatetime() if body.get("start") else None
+        return HTTPStatus.OK, {"schedule": records(predict_schedule(self.growth, plan, start=start))}
+
+    def _history(self) -> EventLog:
+        if self.inventory.history is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, "the change log is turned off ([history] enabled = false)")
+        return self.inventory.history
+
+    def tube_history(self, tube_id, query, body):
+        return HTTPStatus.OK, {"events": records(self._history().tube_history(tube_id, query.get("sheet") or None))}
+
+    def activity(self, query, body):
+        limit = _int(query, "limit", 1000, minimum=0)
+        events = self._history().activity(query.get("actor") or None, query.get("since") or None,
+                                          query.get("until") or None, limit=limit)
+        return HTTPStatus.OK, {"events": records(events)}
+
+    def actors(self, query, body):
+        summary = self._history().actor_summary(query.get("since") or None, query.get("until") or None)
+        return HTTPStatus.OK, {"actors": records(summary)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "CellTracker"
+    protocol_version = "HTTP/1.1"  # keep-alive: scripts reuse one connection
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't wait 40 ms for an ACK
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        telemetry.begin(f"{self.command} {url.path}")
+        try:
+            try:
+                status, payload = self._respond(url.path, query)
+            except Exception as e:
+                # 처리하지 못한 오류도 연결을 끊지 말고 JSON으로 알린다
+                log.exception("%s %s failed", self.command, url.path)
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"internal error: {e}"}
+            data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            telemetry.end()
+
+    def _respond(self, path: str, query: Dict[str, str]) -> Tuple[int, dict]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "request body too large"}
+        try:
+            body = json.loads(self.rfile.read(length)) if length else None
+        except json.JSONDecodeError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": f"invalid JSON: {e}"}
+        if body is not None and not isinstance(body, dict):
+            return HTTPStatus.BAD_REQUEST, {"error": "body must be a JSON object"}
+        return self.server.service.handle(self.command, path, query, body, self.headers.get("Authorization"))
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 telemetry가 JSON 한 줄을 남긴다
+
+
+def make_server(service: Service, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the tube inventory as HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--secrets", default=SECRETS_FILE, help="secrets.toml with the app's [storage]/[gspread]")
+    parser.add_argument("--growth", default=GROWTH_FILE, help="growth-rate table for /growth/schedule")
+    parser.add_argument("--token-env", help="require 'Authorization: Bearer <token>' with the token from this "
+                                            "environment variable")
+    args = parser.parse_args(argv)
+
+    secrets = load_secrets(args.secrets)
+    conf = secrets.get("telemetry", {})
+    telemetry.configure(conf.get("log"), conf.get("level", "INFO"), conf.get("read_quota"), conf.get("write_quota"))
+    inventory = get_inventory(open_storage(secrets))
+    inventory.configure_boxes(*box_layouts(secrets.get("boxes", {})))
+    inventory.configure_history(open_history(secrets))
+    token = os.environ.get(args.token_env) if args.token_env else None
+    if args.token_env and not token:
+        parser.error(f"${args.token_env} is not set")
+    server = make_server(Service(inventory, GrowthTable.from_csv(args.growth), token), args.host, args.port)
+    print(f"serving {inventory.storage.name} inventory on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
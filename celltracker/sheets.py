@@ -0,0 +1,197 @@
+"""Process-wide Google Sheets connection shared by every Streamlit session."""
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import gspread
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.http_client import HTTPClient
+from gspread.utils import absolute_range_name, fill_gaps
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+
+from celltracker import telemetry
+
+SPREADSHEET_KEY = "1as7cVD4JwZ5A7Vo8XmY2DEjEhQNHkWhg_8awtyx5M7E"
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+T = TypeVar("T")
+
+# values/{range}:append, spreadsheets/{id}:batchUpdate, ... (a range like A1:Z10 also contains ':')
+_VERBS = {"append", "clear", "batchGet", "batchUpdate", "batchClear", "batchGetByDataFilter",
+          "batchUpdateByDataFilter", "batchClearByDataFilter", "getByDataFilter", "copyTo"}
+_VERB = re.compile(r":(\w+)$")
+_REST = {"GET": "get", "PUT": "update", "POST": "create", "PATCH": "update", "DELETE": "delete"}
+
+
+def api_method(http_method: str, url: str) -> tuple:
+    """('values.batchGet', 'read') for a request; kind is read / write for Sheets quotas, drive for Drive."""
+    path = urlsplit(url).path
+    http_method = http_method.upper()
+    verb = _VERB.search(path)
+    verb = verb.group(1) if verb and verb.group(1) in _VERBS else None
+    if "/drive/" in path:
+        return "drive.files." + _REST.get(http_method, http_method.lower()), "drive"
+    resource = "values" if "/values" in path else "spreadsheets"
+    name = f"{resource}.{verb or _REST.get(http_method, http_method.lower())}"
+    reads = verb in ("batchGet", "batchGetByDataFilter", "getByDataFilter") or (http_method == "GET" and not verb)
+    return name, "read" if reads else "write"
+
+
+class MeteredHTTPClient(HTTPClient):
+    """gspread's HTTP client, reporting every request to telemetry.api_meter (and as a span of the running trace)."""
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        name, kind = api_method(method, endpoint)
+        sent = len(data) if data else len(_json_dumps(json)) if json is not None else 0
+        status, received = 0, 0
+        start = time.perf_counter()
+        try:
+            with telemetry.span("sheets." + name):
+                response = super().request(method, endpoint, params=params, data=data, json=json, files=files,
+                                           headers=headers)
+            status, received = response.status_code, len(response.content)
+            return response
+        except APIError as e:
+            status, received = e.response.status_code, len(e.response.content)
+            raise
+        finally:
+            telemetry.api_meter.record(name, kind, status, time.perf_counter() - start, sent, received,
+                                       session=telemetry.current_session())
+
+
+def _json_dumps(body) -> str:
+    return json.dumps(body, default=str)
+
+
+class SheetsConnection:
+    """One authorized client + spreadsheet handle, with worksheet handles cached by title."""
+
+    def __init__(self, credentials_info: dict, spreadsheet_key: str = SPREADSHEET_KEY,
+                 refresh_margin: timedelta = TOKEN_REFRESH_MARGIN):
+        self.spreadsheet_key = spreadsheet_key
+        self.refresh_margin = refresh_margin
+        self._credentials = Credentials.from_service_account_info(
+            dict(credentials_info), scopes=gspread.auth.DEFAULT_SCOPES
+        )
+        self._lock = threading.RLock()
+        self._client: Optional[gspread.Client] = None
+        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+
+    # ---- token / handle lifecycle ----
+    def _ensure_token(self):
+        creds = self._credentials
+        expiry = creds.expiry
+        if expiry is not None and expiry.tzinfo is None:
+            # google-auth keeps expiry as naive UTC
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        if not creds.token or expiry is None or expiry - datetime.now(timezone.utc) < self.refresh_margin:
+            with telemetry.span("sheets.refresh_token"):
+                creds.refresh(Request())
+
+    @property
+    def client(self) -> gspread.Client:
+        with self._lock:
+            self._ensure_token()
+            if self._client is None:
+                self._client = gspread.authorize(self._credentials, http_client=MeteredHTTPClient)
+            return self._client
+
+    @property
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        client = self.client
+        with self._lock:
+            if self._spreadsheet is None:
+                with telemetry.span("sheets.connect"):
+                    self._spreadsheet = client.open_by_key(self.spreadsheet_key)
+            return self._spreadsheet
+
+    def worksheet(self, sheet_name: str) -> gspread.Worksheet:
+        sh = self.spreadsheet
+        with self._lock:
+            ws = self._worksheets.get(sheet_name)
+            if ws is None:
+                ws = sh.worksheet(sheet_name)
+                self._worksheets[sheet_name] = ws
+            return ws
+
+    def worksheet_titles(self) -> List[str]:
+        sh = self.spreadsheet
+        worksheets = sh.worksheets()
+        with self._lock:
+            # worksheets() already returns fresh handles, keep them
+            self._worksheets = {ws.title: ws for ws in worksheets}
+        return [ws.title for ws in worksheets]
+
+    def revision(self) -> str:
+        """Cheap change marker: the spreadsheet's Drive modifiedTime (no cell data)."""
+        return self._reconnecting(lambda: self.spreadsheet.get_lastUpdateTime())
+
+    def invalidate(self, sheet_name: Optional[str] = None):
+        """Drop a cached worksheet handle (or everything when sheet_name is None)."""
+        with self._lock:
+            if sheet_name is None:
+                self._client = None
+                self._spreadsheet = None
+                self._worksheets.clear()
+            else:
+                self._worksheets.pop(sheet_name, None)
+
+    # ---- calls ----
+    def _reconnecting(self, call: Callable[[], T]) -> T:
+        """call(); on a stale handle or expired token reconnect once and retry."""
+        try:
+            return call()
+        except WorksheetNotFound:
+            self.invalidate()
+            return call()
+        except APIError as e:
+            if e.code == 401:
+                with self._lock:
+                    self._credentials.refresh(Request())
+                self.invalidate()
+            elif e.code in (400, 404):
+                # sheet renamed/deleted/recreated -> handle id no longer valid
+                self.invalidate()
+            else:
+                raise
+            return call()
+
+    def run(self, sheet_name: str, op: Callable[[gspread.Worksheet], T]) -> T:
+        """Run op(worksheet); on a stale handle or expired token reconnect once and retry."""
+        return self._reconnecting(lambda: op(self.worksheet(sheet_name)))
+
+    def batch_values(self, sheet_names: List[str]) -> List[List[list]]:
+        """Every cell of several worksheets in one values.batchGet request (rows padded like get_all_values)."""
+        ranges = [absolute_range_name(name) for name in sheet_names]
+        try:
+            response = self.spreadsheet.values_batch_get(ranges)
+        except APIError as e:
+            if e.code != 401:
+                raise
+            with self._lock:
+                self._credentials.refresh(Request())
+            self.invalidate()
+            response = self.spreadsheet.values_batch_get(ranges)
+        grids = [r.get("values", []) for r in response.get("valueRanges", [])]
+        return [fill_gaps(values) if values else [] for values in grids]
+
+
+_connections: Dict[tuple, SheetsConnection] = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(credentials_info: dict, spreadsheet_key: str = SPREADSHEET_KEY) -> SheetsConnection:
+    """Return the process-wide connection for this service account + spreadsheet."""
+    key = (credentials_info.get("client_email"), spreadsheet_key)
+    with _connections_lock:
+        conn = _connections.get(key)
+        if conn is None:
+            conn = SheetsConnection(credentials_info, spreadsheet_key)
+            _connections[key] = conn
+        return conn
@@ -0,0 +1,446 @@
+"""Storage backends behind load_data / save_data.
+
+Two engines share one interface: the Google Sheets spreadsheet (with the shared
+frame cache and write-behind queue) and a local SQLite file with indexed tube
+tables, which needs no network or service-account secrets.
+
+One-shot import into SQLite:
+    python -m celltracker.storage --db celltracker.db --xlsx tude_data.xlsx
+    python -m celltracker.storage --db celltracker.db --from-sheets secrets.json
+"""
+import argparse
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import pandas as pd
+
+from celltracker.cache import frames
+from celltracker.delta import compute_delta, rebase, to_cell
+from celltracker.writer import SyncStatus, write_queue
+
+DATA_FILE = "tude_data.xlsx"
+DB_FILE = "celltracker.db"
+
+LOAD_WORKERS = 8  # sheets loaded at once by load_many
+
+TUBE_COLUMNS = ["Tube ID", "Cell Name", "Passage", "Parent Tube", "Position", "Date",
+                "Tray", "Box", "Lot", "Mycoplasma", "Operator", "Info", "Inuse"]
+
+
+def empty_frame() -> pd.DataFrame:
+    return pd.DataFrame(columns=TUBE_COLUMNS)
+
+
+def values_frame(values: List[list]) -> pd.DataFrame:
+    """get_all_values() grid -> frame, with numbers parsed per column like get_all_records()."""
+    if not values:
+        return empty_frame()
+    df = pd.DataFrame(values[1:], columns=values[0])
+    for i in range(df.shape[1]):
+        text = df.iloc[:, i]
+        numbers = pd.to_numeric(text, errors="coerce")
+        parsed = numbers.notna()
+        if parsed.any() and (numbers[parsed] == numbers[parsed].round()).all():
+            numbers = numbers.astype("Int64")
+        if parsed.all() and len(text):
+            df.isetitem(i, numbers)
+        elif parsed.any():
+            df.isetitem(i, text.astype(object).where(~parsed, numbers.astype(object)))
+    return df
+
+
+class StorageBackend(ABC):
+    name = ""
+    exact_version = False  # True when version() alone tells whether load() would return new data
+
+    @abstractmethod
+    def sheet_names(self) -> List[str]:
+        """Cell-line sheets available in this store."""
+
+    @abstractmethod
+    def load(self, sheet_name: str) -> pd.DataFrame:
+        """Full tube frame for one sheet."""
+
+    def load_many(self, sheet_names: List[str]) -> Dict[str, pd.DataFrame]:
+        """{sheet name: frame} for several sheets, loaded concurrently on a bounded thread pool."""
+        return dict(zip(sheet_names, _load_pool().map(self.load, sheet_names)))
+
+    @abstractmethod
+    def save(self, df: pd.DataFrame, sheet_name: str) -> Optional[int]:
+        """Persist df as the new content of sheet_name; may return a sync ticket."""
+
+    @abstractmethod
+    def version(self, sheet_name: str) -> Hashable:
+        """Cheap data version of a sheet; changes whenever load() would return new data."""
+
+    def sync_status(self, sheet_name: str) -> SyncStatus:
+        return SyncStatus()
+
+    def retry_sync(self, sheet_name: str):
+        pass
+
+    def discard_sync(self, sheet_name: str):
+        pass
+
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _load_pool() -> ThreadPoolExecutor:
+    # 스레드를 재사용해야 SQLite의 스레드별 연결도 재사용된다
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=LOAD_WORKERS, thread_name_prefix="sheet-load")
+        return _pool
+
+
+# ------------------ Google Sheets ------------------
+class GSheetBackend(StorageBackend):
+    name = "gsheet"
+
+    def __init__(self, connection):
+        self.conn = connection
+
+    def _key(self, sheet_name: str):
+        return (self.conn.spreadsheet_key, sheet_name)
+
+    def sheet_names(self) -> List[str]:
+        return self.conn.worksheet_titles()
+
+    def load(self, sheet_name: str) -> pd.DataFrame:
+        key = self._key(sheet_name)
+        # 아직 동기화되지 않은 로컬 변경이 있으면 그것을 먼저 보여줌
+        pending = write_queue.pending_frame(key)
+        if pending is not None:
+            return pending
+
+        def fetch():
+            return self._frame(self.conn.run(sheet_name, lambda ws: ws.get_all_values()))
+
+        # 시트가 바뀌지 않았으면 공유 캐시에서 바로 반환
+        return frames.get(key, self.conn.revision, fetch)
+
+    def load_many(self, sheet_names: List[str]) -> Dict[str, pd.DataFrame]:
+        """Cached sheets as-is; all the stale ones come back in a single batchGet request."""
+        keys = {name: self._key(name) for name in sheet_names}
+        pending = {name: write_queue.pending_frame(key) for name, key in keys.items()}
+
+        def fetch_many(stale_keys):
+            grids = self.conn.batch_values([key[1] for key in stale_keys])
+            return {key: self._frame(values) for key, values in zip(stale_keys, grids)}
+
+        loaded = frames.get_many([keys[n] for n in sheet_names if pending[n] is None], self.conn.revision, fetch_many)
+        return {n: pending[n] if pending[n] is not None else loaded[keys[n]] for n in sheet_names}
+
+    @staticmethod
+    def _frame(values: List[list]) -> pd.DataFrame:
+        df = values_frame(values)
+        if "Inuse" not in df.columns:
+            df["Inuse"] = "No"
+        return df
+
+    def save(self, df: pd.DataFrame, sheet_name: str) -> int:
+        key = self._key(sheet_name)
+
+        def write(delta, frame):
+            # 바뀐 행/셀만 전송 (새 튜브는 append, 상태 변경은 셀 단위 batch update)
+            cached = frames.peek(key)
+            revision = self.conn.revision()
+            unchanged = (cached is not None and revision is not None and revision == cached.revision
+                         and (cached.frame is delta.base or cached.frame.equals(delta.base)))
+            if delta.base is not None and not unchanged:
+                # 다른 사람이 그 사이에 시트를 수정함: 셀 위치는 행이 밀리면 엉뚱한 튜브를 가리키므로
+                # 최신 내용을 받아 Tube ID 기준으로 다시 맞춘 뒤 그 차이만 보낸다 (겹치면 ConflictError)
+                current = self._frame(self.conn.run(sheet_name, lambda ws: ws.get_all_values()))
+                frame = rebase(delta.base, frame, current)
+                delta = compute_delta(current, frame)
+            try:
+                self.conn.run(sheet_name, delta.apply)
+            except Exception:
+                # batch update와 append는 따로 가는 요청이라 일부가 이미 반영됐을 수 있다:
+                # 기준 프레임을 버려서 재시도는 시트를 다시 받아 이미 들어간 튜브를 건너뛰게 한다
+                frames.invalidate(key)
+                raise
+            frames.put(key, frame, revision=self.conn.revision())
+
+        cached = frames.peek(key)
+        return write_queue.submit(key, df, cached.frame if cached else None, write)
+
+    def version(self, sheet_name: str) -> Hashable:
+        key = self._key(sheet_name)
+        return (frames.version(key), write_queue.submitted(key))
+
+    def sync_status(self, sheet_name: str) -> SyncStatus:
+        return write_queue.status(self._key(sheet_name))
+
+    def retry_sync(self, sheet_name: str):
+        write_queue.retry(self._key(sheet_name))
+
+    def discard_sync(self, sheet_name: str):
+        write_queue.discard(self._key(sheet_name))
+
+
+# ------------------ SQLite ------------------
+# sheet column -> SQL column
+SQL_COLUMNS: Dict[str, str] = {
+    "Tube ID": "tube_id",
+    "Cell Name": "cell_name",
+    "Passage": "passage",
+    "Parent Tube": "parent_tube",
+    "Position": "position",
+    "Date": "date",
+    "Tray": "tray",
+    "Box": "box",
+    "Lot": "lot",
+    "Mycoplasma": "mycoplasma",
+    "Operator": "operator",
+    "Info": "info",
+    "Inuse": "inuse",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    id      INTEGER PRIMARY KEY,
+    name    TEXT NOT NULL UNIQUE,
+    columns TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tubes (
+    sheet_id    INTEGER NOT NULL REFERENCES sheets(id) ON DELETE CASCADE,
+    row_no      INTEGER NOT NULL,
+    tube_id     TEXT,
+    cell_name   TEXT,
+    passage     INTEGER,
+    parent_tube TEXT,
+    position    TEXT,
+    date        TEXT,
+    tray        TEXT,
+    box         TEXT,
+    lot         TEXT,
+    mycoplasma  TEXT,
+    operator    TEXT,
+    info        TEXT,
+    inuse       TEXT,
+    extra       TEXT,
+    PRIMARY KEY (sheet_id, row_no)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_tubes_tube_id  ON tubes (tube_id);
+CREATE INDEX IF NOT EXISTS idx_tubes_parent   ON tubes (parent_tube);
+CREATE INDEX IF NOT EXISTS idx_tubes_location ON tubes (tray, box, position);
+CREATE INDEX IF NOT EXISTS idx_tubes_cell     ON tubes (sheet_id, cell_name);
+CREATE INDEX IF NOT EXISTS idx_tubes_inuse    ON tubes (sheet_id, inuse);
+"""
+
+
+class SQLiteBackend(StorageBackend):
+    """Local store: one row per tube, indexed by id, parent, location, cell line and status."""
+
+    name = "sqlite"
+    exact_version = True  # every save bumps sheets.version, whichever process writes
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self._local = threading.local()
+        # sheet -> (version, frame): what load()/save() last saw, so save() diffs without re-reading the table
+        self._last: Dict[str, Tuple[int, pd.DataFrame]] = {}
+        with self._db() as db:
+            db.executescript(SCHEMA)
+            if "version" not in {r[1] for r in db.execute("PRAGMA table_info(sheets)")}:
+                db.execute("ALTER TABLE sheets ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def _db(self) -> sqlite3.Connection:
+        # Streamlit sessions run on different threads -> one connection per thread
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            self._local.db = db
+        return db
+
+    def _sheet(self, db, sheet_name: str, columns: Optional[List[str]] = None) -> Optional[tuple]:
+        row = db.execute("SELECT id, columns FROM sheets WHERE name = ?", (sheet_name,)).fetchone()
+        if row is None and columns is not None:
+            cur = db.execute("INSERT INTO sheets (name, columns) VALUES (?, ?)",
+                             (sheet_name, json.dumps(columns)))
+            row = (cur.lastrowid, json.dumps(columns))
+        return row
+
+    def sheet_names(self) -> List[str]:
+        return [r[0] for r in self._db().execute("SELECT name FROM sheets ORDER BY id")]
+
+    def load(self, sheet_name: str) -> pd.DataFrame:
+        last = self._last.get(sheet_name)
+        before = self.version(sheet_name)
+        if last is not None and last[0] == before:
+            return last[1].copy()
+        db = self._db()
+        sheet = self._sheet(db, sheet_name)
+        if sheet is None:
+            return empty_frame()
+        sheet_id, columns = sheet[0], json.loads(sheet[1])
+        sql_cols = ", ".join(SQL_COLUMNS.values())
+        df = pd.read_sql_query(
+            f"SELECT {sql_cols}, extra FROM tubes WHERE sheet_id = ? ORDER BY row_no",
+            db, params=(sheet_id,),
+        )
+        df = df.rename(columns={v: k for k, v in SQL_COLUMNS.items()})
+        extra_cols = [c for c in columns if c not in SQL_COLUMNS]
+        if extra_cols:
+            extras = df["extra"].map(lambda s: json.loads(s) if s else {})
+            for col in extra_cols:
+                df[col] = extras.map(lambda d: d.get(col, ""))
+        df = df[columns]
+        if self.version(sheet_name) == before:  # 읽는 도중 다른 저장이 끼어들지 않았을 때만 기억
+            self._last[sheet_name] = (before, df)
+        return df.copy()
+
+    def save(self, df: pd.DataFrame, sheet_name: str) -> None:
+        columns = [str(c) for c in df.columns]
+        saved = df.copy()
+        db = self._db()
+        # 쓰기 잠금을 먼저 잡고 버전을 본다: 비교한 뒤 다른 프로세스가 시트를 고치면 row_no 가 엉뚱한 튜브를 가리킨다
+        db.execute("BEGIN IMMEDIATE")
+        with db:
+            # 마지막으로 읽거나 쓴 프레임이 아직 최신이면(버전이 같으면) 테이블을 다시 읽지 않고 그것과 비교
+            last = self._last.get(sheet_name)
+            if last is not None and last[0] == self.version(sheet_name):
+                base = last[1]
+            else:
+                base = self.load(sheet_name) if sheet_name in self.sheet_names() else None
+            delta = compute_delta(base, df)
+            if delta.is_empty:
+                return None
+            sheet_id = self._sheet(db, sheet_name, columns)[0]
+            db.execute("UPDATE sheets SET version = version + 1 WHERE id = ?", (sheet_id,))
+            version = db.execute("SELECT version FROM sheets WHERE id = ?", (sheet_id,)).fetchone()[0]
+            if delta.full_rewrite is not None:
+                db.execute("UPDATE sheets SET columns = ? WHERE id = ?", (json.dumps(columns), sheet_id))
+                db.execute("DELETE FROM tubes WHERE sheet_id = ?", (sheet_id,))
+                self._insert(db, sheet_id, columns, delta.full_rewrite, start=0)
+            else:
+                for (r, c), value in delta.cells.items():
+                    col = columns[c]
+                    if col in SQL_COLUMNS:
+                        db.execute(f"UPDATE tubes SET {SQL_COLUMNS[col]} = ? WHERE sheet_id = ? AND row_no = ?",
+                                   (value, sheet_id, r))
+                    else:
+                        db.execute("UPDATE tubes SET extra = json_set(coalesce(extra, '{}'), ?, ?) "
+                                   "WHERE sheet_id = ? AND row_no = ?", (f'$."{col}"', value, sheet_id, r))
+                self._insert(db, sheet_id, columns, delta.append_rows, start=delta.base_rows)
+        self._last[sheet_name] = (version, saved)
+        return None
+
+    def version(self, sheet_name: str) -> Hashable:
+        row = self._db().execute("SELECT version FROM sheets WHERE name = ?", (sheet_name,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _insert(db, sheet_id: int, columns: List[str], rows: List[list], start: int):
+        known = [(i, SQL_COLUMNS[c]) for i, c in enumerate(columns) if c in SQL_COLUMNS]
+        unknown = [(i, c) for i, c in enumerate(columns) if c not in SQL_COLUMNS]
+        names = ["sheet_id", "row_no"] + [n for _, n in known] + ["extra"]
+        sql = f"INSERT INTO tubes ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+        db.executemany(sql, (
+            [sheet_id, start + n] + [row[i] for i, _ in known]
+            + [json.dumps({c: row[i] for i, c in unknown}) if unknown else None]
+            for n, row in enumerate(rows)
+        ))
+
+    # ---- indexed queries ----
+    def find(self, tube_id: str) -> pd.DataFrame:
+        """Rows for a Tube ID across all sheets (uses idx_tubes_tube_id)."""
+        return pd.read_sql_query(
+            "SELECT s.name AS sheet, t.* FROM tubes t JOIN sheets s ON s.id = t.sheet_id "
+            "WHERE t.tube_id = ?", self._db(), params=(tube_id,))
+
+    def descendants(self, sheet_name: str, tube_id: str) -> List[str]:
+        """All Tube IDs derived from tube_id within one sheet (Tube IDs repeat across sheets)."""
+        db = self._db()
+        sheet = self._sheet(db, sheet_name)
+        if sheet is None:
+            return []
+        rows = db.execute(
+            "WITH RECURSIVE d(id) AS (SELECT tube_id FROM tubes WHERE sheet_id = ? AND parent_tube = ? "
+            "UNION SELECT t.tube_id FROM tubes t JOIN d ON t.parent_tube = d.id WHERE t.sheet_id = ?) "
+            "SELECT id FROM d", (sheet[0], tube_id, sheet[0])).fetchall()
+        return [r[0] for r in rows]
+
+    def occupancy(self, sheet_name: str) -> pd.DataFrame:
+        """Tubes per (Tray, Box) in one sheet."""
+        return pd.read_sql_query(
+            "SELECT t.tray AS Tray, t.box AS Box, COUNT(*) AS Used FROM tubes t JOIN sheets s ON s.id = t.sheet_id "
+            "WHERE s.name = ? GROUP BY t.tray, t.box ORDER BY t.tray, t.box", self._db(), params=(sheet_name,))
+
+
+# ------------------ import ------------------
+def import_frames(backend: StorageBackend, sheets: Dict[str, pd.DataFrame]) -> Dict[str, int]:
+    """Write each {sheet name: frame} into backend; returns rows written per sheet."""
+    written = {}
+    for name, df in sheets.items():
+        df = df.copy()
+        if "Inuse" not in df.columns:
+            df["Inuse"] = "No"
+        if "Date" in df.columns:
+            df["Date"] = df["Date"].map(to_cell)
+        backend.save(df, name)
+        written[name] = len(df)
+    return written
+
+
+def import_excel(backend: StorageBackend, path: str = DATA_FILE) -> Dict[str, int]:
+    """One sheet per Excel worksheet, same layout as tude_data.xlsx."""
+    return import_frames(backend, pd.read_excel(path, sheet_name=None))
+
+
+def import_gsheet(backend: StorageBackend, source: GSheetBackend) -> Dict[str, int]:
+    return import_frames(backend, {name: source.load(name) for name in source.sheet_names()})
+
+
+_backends: Dict[tuple, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(kind: str, credentials_info: Optional[dict] = None, path: str = DB_FILE) -> StorageBackend:
+    """Process-wide backend instance ("gsheet" or "sqlite")."""
+    key = (kind, credentials_info.get("client_email") if credentials_info else None, path)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if kind == "gsheet":
+                from celltracker.sheets import get_connection
+                backend = GSheetBackend(get_connection(credentials_info))
+            elif kind == "sqlite":
+                backend = SQLiteBackend(path)
+            else:
+                raise ValueError(f"unknown storage backend: {kind}")
+            _backends[key] = backend
+        return backend
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import tube data into the local SQLite store.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--xlsx", help="Excel workbook laid out like tude_data.xlsx")
+    parser.add_argument("--from-sheets", metavar="SERVICE_ACCOUNT_JSON",
+                        help="copy every worksheet of the Google spreadsheet")
+    args = parser.parse_args(argv)
+    target = get_backend("sqlite", path=args.db)
+    if args.xlsx:
+        print(import_excel(target, args.xlsx))
+    if args.from_sheets:
+        with open(args.from_sheets) as f:
+            info = json.load(f)
+        print(import_gsheet(target, get_backend("gsheet", info)))
+    if not (args.xlsx or args.from_sheets):
+        parser.error("nothing to import: pass --xlsx and/or --from-sheets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Paged, status-colored view of the tube table."""
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from celltracker.schema import in_use
+
+IN_USE_ROW = 'background-color: rgba(231, 76, 60, 0.1)'
+AVAILABLE_ROW = 'background-color: rgba(46, 204, 113, 0.1)'
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def page_bounds(n_rows: int, page: int, page_size: int) -> Tuple[int, int, int, int]:
+    """(page, n_pages, start, stop) with page clamped to 1..n_pages."""
+    n_pages = max(1, -(-n_rows // page_size))
+    page = min(max(1, int(page)), n_pages)
+    start = (page - 1) * page_size
+    return page, n_pages, start, min(start + page_size, n_rows)
+
+
+def status_styles(df: pd.DataFrame) -> pd.DataFrame:
+    """Row background per Inuse, built column-wise for the whole frame at once."""
+    row_style = np.where(in_use(df), IN_USE_ROW, AVAILABLE_ROW)
+    return pd.DataFrame(np.repeat(row_style[:, None], df.shape[1], axis=1),
+                        index=df.index, columns=df.columns)
+
+
+def style_by_status(df: pd.DataFrame):
+    styles = status_styles(df)
+    return df.style.apply(lambda _: styles, axis=None)
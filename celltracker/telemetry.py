@@ -0,0 +1,300 @@
+"""Timing spans per rerun, a Sheets API request meter, and JSON-line logs.
+
+    telemetry.begin("rerun")            # top of the script
+    with telemetry.span("load", sheet=name) as fields:
+        df = ...
+        fields["rows"] = len(df)        # extra fields end up in the log line
+    telemetry.end()                     # bottom of the script
+
+Functions decorated with @traced(name) are a span inside a running trace and
+their own trace otherwise (fragment reruns). Outside a trace, span() costs one
+dictionary lookup and records nothing.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Deque, Dict, Hashable, Iterator, List, Optional
+
+log = logging.getLogger("celltracker.telemetry")
+
+API_WINDOW = 60.0             # seconds; Sheets quotas are per minute
+READ_QUOTA_PER_MINUTE = 60    # Sheets API default: requests per minute per user
+WRITE_QUOTA_PER_MINUTE = 60
+QUOTA_WARNING = 0.8           # warn once the last minute reaches this share of a quota
+HISTORY = 20                  # finished traces kept per session
+MAX_SESSIONS = 256
+
+_session_fn: Callable[[], Optional[str]] = lambda: None
+
+
+def set_session_provider(fn: Callable[[], Optional[str]]):
+    """How to tell which user session the calling thread works for (None = no session)."""
+    global _session_fn
+    _session_fn = fn
+
+
+def current_session() -> Optional[str]:
+    try:
+        return _session_fn()
+    except Exception:
+        return None
+
+
+def _context_key() -> Hashable:
+    # 세션마다 스크립트 스레드가 바뀔 수 있으므로 세션 ID 우선, 세션이 없으면 스레드
+    return current_session() or threading.get_ident()
+
+
+# ------------------ spans ------------------
+@dataclass
+class Span:
+    name: str
+    depth: int
+    seconds: float = 0.0
+    fields: dict = field(default_factory=dict)
+
+
+@dataclass
+class Trace:
+    name: str
+    session: Optional[str]
+    started_at: float = field(default_factory=time.time)
+    spans: List[Span] = field(default_factory=list)
+    seconds: float = 0.0
+    api_calls: int = 0
+    api_bytes: int = 0
+    interrupted: bool = False
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+    _depth: int = field(default=0, repr=False)
+
+    def to_record(self) -> dict:
+        return {
+            "event": "trace",
+            "name": self.name,
+            "session": self.session,
+            "ts": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="milliseconds"),
+            "ms": round(self.seconds * 1e3, 2),
+            "interrupted": self.interrupted,
+            "api_calls": self.api_calls,
+            "api_bytes": self.api_bytes,
+            "spans": [{"name": s.name, "depth": s.depth, "ms": round(s.seconds * 1e3, 2), **s.fields}
+                      for s in self.spans],
+        }
+
+
+_open: Dict[Hashable, Trace] = {}
+_history: "OrderedDict[Optional[str], Deque[Trace]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _finish(trace: Trace, interrupted: bool = False):
+    trace.seconds = time.perf_counter() - trace._start
+    trace.interrupted = interrupted
+    with _lock:
+        history = _history.pop(trace.session, None) or deque(maxlen=HISTORY)
+        history.append(trace)
+        _history[trace.session] = history
+        while len(_history) > MAX_SESSIONS:
+            _history.popitem(last=False)
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps(trace.to_record(), default=str))
+
+
+def begin(name: str = "rerun") -> Trace:
+    """Start this session's trace; one left open by an interrupted run (st.rerun, st.stop) is closed first."""
+    key = _context_key()
+    trace = Trace(name, current_session())
+    with _lock:
+        stale = _open.pop(key, None)
+        _open[key] = trace
+        while len(_open) > MAX_SESSIONS:  # sessions that closed in the middle of a run
+            _open.pop(next(iter(_open)))
+    if stale is not None:
+        _finish(stale, interrupted=True)
+    return trace
+
+
+def end() -> Optional[Trace]:
+    """Close and log this session's trace."""
+    with _lock:
+        trace = _open.pop(_context_key(), None)
+    if trace is not None:
+        _finish(trace)
+    return trace
+
+
+def active() -> Optional[Trace]:
+    return _open.get(_context_key())
+
+
+@contextmanager
+def span(name: str, **fields) -> Iterator[dict]:
+    """Time a stage of the running trace; the yielded dict takes extra fields (rows, payload bytes...)."""
+    trace = active()
+    if trace is None:
+        yield fields
+        return
+    s = Span(name, trace._depth, fields=fields)
+    trace.spans.append(s)
+    trace._depth += 1
+    start = time.perf_counter()
+    try:
+        yield s.fields
+    finally:
+        s.seconds = time.perf_counter() - start
+        trace._depth -= 1
+
+
+def traced(name: str):
+    """Decorator: a span inside a running trace, a trace of its own otherwise."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if active() is not None:
+                with span(name):
+                    return fn(*args, **kwargs)
+            begin(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end()
+        return wrapper
+    return decorate
+
+
+def history(session: Optional[str] = None) -> List[Trace]:
+    """Finished traces of a session, oldest first."""
+    with _lock:
+        return list(_history.get(session, ()))
+
+
+def frame_bytes(data) -> int:
+    """Approximate payload of a DataFrame (or a Styler's frame): its values in memory, strings included."""
+    df = getattr(data, "data", data)
+    try:
+        return int(df.memory_usage(deep=True).sum())
+    except AttributeError:
+        return 0
+
+
+# ------------------ Sheets API meter ------------------
+@dataclass
+class ApiCall:
+    at: float
+    session: Optional[str]
+    method: str          # e.g. values.batchGet, drive.files.get
+    kind: str            # read | write | drive
+    status: int          # HTTP status, 0 = no response
+    seconds: float
+    sent: int
+    received: int
+
+
+class RequestMeter:
+    """Counts Sheets/Drive requests and bytes per session, per method and over the last minute."""
+
+    def __init__(self, window: float = API_WINDOW, read_quota: int = READ_QUOTA_PER_MINUTE,
+                 write_quota: int = WRITE_QUOTA_PER_MINUTE):
+        self.window = window
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self._recent: Deque[ApiCall] = deque()
+        self._sessions: "OrderedDict[Optional[str], Counter]" = OrderedDict()
+        self._methods: Dict[str, Counter] = {}
+        self._totals = Counter()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._recent and now - self._recent[0].at > self.window:
+            self._recent.popleft()
+
+    def record(self, method: str, kind: str, status: int, seconds: float, sent: int = 0, received: int = 0,
+               session: Optional[str] = None) -> ApiCall:
+        call = ApiCall(time.time(), session, method, kind, status, seconds, sent, received)
+        size = sent + received
+        with self._lock:
+            self._expire(call.at)
+            self._recent.append(call)
+            in_window = sum(1 for c in self._recent if c.kind == kind)
+            counts = self._sessions.pop(session, None) or Counter()
+            self._sessions[session] = counts
+            while len(self._sessions) > MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+            per_method = self._methods.setdefault(method, Counter())
+            for c in (counts, per_method, self._totals):
+                c["calls"] += 1
+                c["bytes"] += size
+                c[kind] += 1
+                c["errors"] += status >= 400 or status == 0
+                c["ms"] += seconds * 1e3
+        trace = active()
+        if trace is not None:
+            trace.api_calls += 1
+            trace.api_bytes += size
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(json.dumps({"event": "sheets_api", "session": session, "method": method, "kind": kind,
+                                  "status": status, "ms": round(seconds * 1e3, 2), "sent": sent,
+                                  "received": received}))
+        quota = self.quotas.get(kind)
+        if quota and in_window == int(quota * QUOTA_WARNING):
+            log.warning(json.dumps({"event": "quota", "kind": kind, "last_minute": in_window, "quota": quota}))
+        return call
+
+    def last_minute(self) -> Counter:
+        """calls / bytes / read / write / drive / errors over the last window."""
+        with self._lock:
+            self._expire(time.time())
+            out = Counter()
+            for c in self._recent:
+                out["calls"] += 1
+                out["bytes"] += c.sent + c.received
+                out[c.kind] += 1
+                out["errors"] += c.status >= 400 or c.status == 0
+            return out
+
+    def session_totals(self, session: Optional[str]) -> Counter:
+        with self._lock:
+            return Counter(self._sessions.get(session, ()))
+
+    def totals(self) -> Counter:
+        with self._lock:
+            return Counter(self._totals)
+
+    def by_method(self) -> Dict[str, Counter]:
+        with self._lock:
+            return {name: Counter(c) for name, c in self._methods.items()}
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._sessions.clear()
+            self._methods.clear()
+            self._totals.clear()
+
+
+api_meter = RequestMeter()
+
+
+def configure(log_path: Optional[str] = None, level: str = "INFO", read_quota: Optional[int] = None,
+              write_quota: Optional[int] = None):
+    """Send the JSON lines to a file (or "stderr") and set the quotas; safe to call on every rerun.
+
+    Without a log_path only quota warnings reach the root logger; traces are still kept for history().
+    """
+    if read_quota:
+        api_meter.quotas["read"] = int(read_quota)
+    if write_quota:
+        api_meter.quotas["write"] = int(write_quota)
+    if not log_path:
+        return
+    log.setLevel(level.upper())
+    if not any(getattr(h, "_telemetry_target", None) == log_path for h in log.handlers):
+        handler = logging.StreamHandler() if log_path == "stderr" else logging.FileHandler(log_path, encoding="utf-8")
+        handler._telemetry_target = log_path
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
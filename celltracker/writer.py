@@ -0,0 +1,195 @@
+"""Background write-behind queue for sheet mutations."""
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Optional
+
+import pandas as pd
+
+from celltracker.delta import SheetDelta, compute_delta
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 1.0     # seconds, doubled per attempt
+BACKOFF_MAX = 32.0
+COALESCE_DELAY = 0.3   # wait a moment so bursts of clicks become one write
+
+WriteFn = Callable[[SheetDelta, pd.DataFrame], None]
+
+
+def is_retryable(exc: Exception) -> bool:
+    # imported here so the SQLite backend starts without gspread/requests
+    import requests
+    from gspread.exceptions import APIError
+    if isinstance(exc, APIError):
+        return exc.code in RETRYABLE_CODES
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+@dataclass
+class SyncStatus:
+    pending: int = 0             # submitted saves not yet durable
+    in_flight: bool = False
+    error: Optional[str] = None  # last permanent failure, kept until retried
+    last_synced: Optional[float] = None
+
+
+@dataclass
+class _Job:
+    delta: SheetDelta
+    frame: pd.DataFrame
+    write: WriteFn
+    seq: int
+
+
+class WriteBehindQueue:
+    """Merges pending saves per key and writes them from one background thread.
+
+    submit() returns immediately with a ticket; pending_frame() lets readers see
+    the local state before it is durable, and wait()/is_durable() confirm it.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, backoff_base: float = BACKOFF_BASE,
+                 backoff_max: float = BACKOFF_MAX, coalesce_delay: float = COALESCE_DELAY,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.coalesce_delay = coalesce_delay
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._jobs: Dict[Hashable, _Job] = {}
+        self._failed: Dict[Hashable, _Job] = {}
+        self._in_flight: Dict[Hashable, _Job] = {}
+        self._ready: List[Hashable] = []
+        self._submitted: Dict[Hashable, int] = {}
+        self._durable: Dict[Hashable, int] = {}
+        self._status: Dict[Hashable, SyncStatus] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    # ---- producer side ----
+    def submit(self, key: Hashable, frame: pd.DataFrame, base: Optional[pd.DataFrame], write: WriteFn) -> int:
+        """Queue `frame` as the new content for key. `base` is the last durable frame."""
+        frame = frame.copy()
+        with self._cond:
+            seq = self._submitted.get(key, 0) + 1
+            self._submitted[key] = seq
+            job = self._jobs.pop(key, None) or self._failed.pop(key, None)
+            if job is not None:
+                delta = job.delta.merge(compute_delta(job.frame, frame), frame)
+            elif key in self._in_flight:
+                # the in-flight write already carries everything up to its frame
+                delta = compute_delta(self._in_flight[key].frame, frame)
+            else:
+                delta = compute_delta(base, frame)
+            self._jobs[key] = _Job(delta=delta, frame=frame, write=write, seq=seq)
+            status = self._status.setdefault(key, SyncStatus())
+            status.pending = seq - self._durable.get(key, 0)
+            status.error = None
+            if key not in self._ready:
+                self._ready.append(key)
+            self._ensure_worker()
+            self._cond.notify_all()
+        return seq
+
+    def pending_frame(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """Newest not-yet-durable frame for key, if any."""
+        with self._cond:
+            job = self._jobs.get(key) or self._failed.get(key) or self._in_flight.get(key)
+            return job.frame.copy() if job is not None else None
+
+    def submitted(self, key: Hashable) -> int:
+        """Number of saves submitted for key so far (changes whenever pending_frame does)."""
+        with self._cond:
+            return self._submitted.get(key, 0)
+
+    def status(self, key: Hashable) -> SyncStatus:
+        with self._cond:
+            s = self._status.get(key, SyncStatus())
+            return SyncStatus(s.pending, s.in_flight, s.error, s.last_synced)
+
+    def is_durable(self, key: Hashable, ticket: int) -> bool:
+        with self._cond:
+            return self._durable.get(key, 0) >= ticket
+
+    def wait(self, key: Hashable, ticket: int, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._durable.get(key, 0) >= ticket or key in self._failed, timeout
+            ) and self._durable.get(key, 0) >= ticket
+
+    def retry(self, key: Hashable):
+        """Requeue a job that failed permanently."""
+        with self._cond:
+            job = self._failed.pop(key, None)
+            if job is None:
+                return
+            self._jobs[key] = job
+            self._status[key].error = None
+            if key not in self._ready:
+                self._ready.append(key)
+            self._ensure_worker()
+            self._cond.notify_all()
+
+    def discard(self, key: Hashable):
+        """Drop a failed job (its changes are lost)."""
+        with self._cond:
+            job = self._failed.pop(key, None)
+            if job is not None:
+                self._durable[key] = job.seq
+                status = self._status[key]
+                status.pending, status.error = 0, None
+                self._cond.notify_all()
+
+    # ---- worker side ----
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sheets-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: bool(self._ready))
+            self._sleep(self.coalesce_delay)
+            with self._cond:
+                key = self._ready.pop(0)
+                job = self._jobs.pop(key, None)
+                if job is None:
+                    continue
+                self._in_flight[key] = job
+                self._status[key].in_flight = True
+            error = self._write_with_retry(job)
+            with self._cond:
+                del self._in_flight[key]
+                status = self._status[key]
+                status.in_flight = False
+                if error is None:
+                    self._durable[key] = max(self._durable.get(key, 0), job.seq)
+                    status.last_synced = time.time()
+                elif key in self._jobs:
+                    # newer saves arrived meanwhile; keep this delta underneath them
+                    newer = self._jobs[key]
+                    newer.delta = job.delta.merge(newer.delta, newer.frame)
+                else:
+                    self._failed[key] = job
+                    status.error = error
+                status.pending = self._submitted.get(key, 0) - self._durable.get(key, 0)
+                self._cond.notify_all()
+
+    def _write_with_retry(self, job: _Job) -> Optional[str]:
+        for attempt in range(self.max_attempts):
+            try:
+                job.write(job.delta, job.frame)
+                return None
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    return str(e)
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                self._sleep(delay * (0.5 + random.random() / 2))
+        return None
+
+
+# 프로세스 전체에서 하나의 쓰기 큐
+write_queue = WriteBehindQueue()
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from celltracker.boxes import OccupancyIndex
+
+
+def index(positions, box="B1"):
+    return OccupancyIndex.from_frame(pd.DataFrame({"Tube ID": [f"T{i}" for i in range(len(positions))],
+                                                   "Tray": "Tray-1", "Box": box, "Position": positions}))
+
+
+def test_summary_counts_every_tube_in_the_box():
+    occupancy = index(["", "Z99", "A1", "a1"])
+    summary = occupancy.summary()
+    assert summary[["Used", "Remaining", "Misplaced"]].iloc[0].tolist() == [4, 96, 4]
+    problems = occupancy.misplaced().set_index("Tube ID")["Problem"]
+    assert problems.to_dict() == {"T0": "no position", "T1": "not a slot of a 10x10 box",
+                                  "T2": "A1 is claimed twice", "T3": "A1 is claimed twice"}
+
+
+def test_incremental_add_keeps_the_count():
+    occupancy = index(["A1"])
+    occupancy.add("Tray-1", "B1", "A2", "T9")
+    occupancy.add("Tray-1", "B2", "A1", "T10")
+    assert occupancy.summary()["Used"].tolist() == [2, 1]
+    assert occupancy.misplaced().empty
+
+
+def test_contiguous_run_stays_within_one_row():
+    occupancy = index([f"A{c}" for c in range(1, 9)])
+    assert occupancy.free_slots("Tray-1", "B1", 2, contiguous=True) == ["A9", "A10"]
+    assert occupancy.free_slots("Tray-1", "B1", 3, contiguous=True) == ["B1", "B2", "B3"]
+    assert occupancy.free_slots("Tray-1", "B1", 11, contiguous=True) == []
+    assert occupancy.free_slots("Tray-1", "B1", 3) == ["A9", "A10", "B1"]
@@ -0,0 +1,58 @@
+import pandas as pd
+
+from celltracker.cache import FrameCache
+
+
+class GuardedDict(dict):
+    """Fails any access made without the cache's guard held."""
+
+    def __init__(self, guard):
+        super().__init__()
+        self.guard = guard
+
+    def _check(self):
+        assert self.guard.locked(), "entry dict touched without _guard"
+
+    def get(self, *a):
+        self._check()
+        return super().get(*a)
+
+    def __setitem__(self, key, value):
+        self._check()
+        super().__setitem__(key, value)
+
+    def pop(self, *a):
+        self._check()
+        return super().pop(*a)
+
+    def clear(self):
+        self._check()
+        super().clear()
+
+
+def test_every_entry_access_holds_the_guard():
+    cache = FrameCache(check_interval=0)
+    cache._entries = GuardedDict(cache._guard)
+    a, b = pd.DataFrame({"x": [1]}), pd.DataFrame({"x": [2]})
+    revision = iter(["r1", "r2", "r3"]).__next__
+    cache.get("A", revision, lambda: a)
+    cache.get_many(["A", "B"], revision, lambda keys: {"A": a, "B": b})
+    cache.put("B", a)
+    assert cache.peek("B").frame.equals(a)
+    assert cache.version("A") > 0
+    cache.invalidate("A")
+    cache.invalidate()
+    assert cache.version("B") == 0
+
+
+def test_get_many_stores_a_fresh_entry_when_invalidated_mid_fetch():
+    cache = FrameCache(check_interval=0)
+    a = pd.DataFrame({"x": [1]})
+    cache.put("A", a, "r1")
+
+    def fetch(keys):
+        cache.invalidate("A")
+        return {"A": a}
+
+    cache.get_many(["A"], lambda: "r2", fetch)
+    assert cache.peek("A").revision == "r2"
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_inventory
+from celltracker.core import Inventory
+from celltracker.storage import SQLiteBackend
+
+
+def test_failed_register_leaves_the_slot_free(tmp_path, monkeypatch):
+    storage = SQLiteBackend(str(tmp_path / "tubes.db"))
+    storage.save(synthetic_inventory(5), "A549")
+    inventory = Inventory(storage)
+    row = pd.DataFrame([{"Tube ID": "NEW_1", "Cell Name": "A549", "Passage": 1, "Date": "2024-06-09",
+                         "Tray": "Tray-9", "Box": "Box-9", "Position": "A1"}])
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    df, _, version = inventory.snapshot("A549")
+    occupancy = inventory.occupancy("A549", version, df)
+    monkeypatch.setattr(storage, "save", fail)
+    with pytest.raises(OSError):
+        inventory.register("A549", row)
+    assert not occupancy.occupied("Tray-9", "Box-9").any()
+    assert inventory.occupancy("A549", version, df) is occupancy
+
+    monkeypatch.undo()
+    inventory.register("A549", row)
+    df, _, version = inventory.snapshot("A549")
+    assert inventory.occupancy("A549", version, df).occupied("Tray-9", "Box-9").sum() == 1
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fake_sheets import FakeConnection
+from celltracker.cache import frames
+from celltracker.delta import ConflictError, compute_delta, frame_to_rows, rebase
+from celltracker.storage import GSheetBackend, values_frame
+from celltracker.writer import write_queue
+
+HEADER = ["Tube ID", "Cell Name", "Passage", "Inuse"]
+ROWS = [["P1_1", "A549", 1, "No"], ["P1_2", "A549", 1, "No"], ["P2_1", "A549", 2, "Yes"]]
+
+
+def frame(rows=ROWS):
+    return pd.DataFrame([list(r) for r in rows], columns=HEADER)
+
+
+def sheet(rows=ROWS):
+    return FakeConnection({"S": [HEADER] + [list(r) for r in rows]})
+
+
+def grid(conn):
+    return values_frame(conn.worksheets["S"].get_all_values())
+
+
+def test_compute_delta_edits_and_appends():
+    base = frame()
+    new = pd.concat([base, frame([["P3_1", "A549", 3, "No"]])], ignore_index=True)
+    new.loc[1, "Inuse"] = "Yes"
+    delta = compute_delta(base, new)
+    assert delta.full_rewrite is None
+    assert delta.cells == {(1, 3): "Yes"}
+    assert delta.append_rows == [["P3_1", "A549", 3, "No"]]
+    assert delta.base is base
+
+
+def test_compute_delta_ignores_representation_only_differences():
+    base = frame()
+    new = base.astype({"Passage": float})
+    base.loc[0, "Inuse"], new.loc[0, "Inuse"] = "", np.nan
+    assert compute_delta(base, new).is_empty
+
+
+@pytest.mark.parametrize("new", [frame(ROWS[::-1]), frame(ROWS[1:]), frame().rename(columns={"Inuse": "In use"})])
+def test_compute_delta_rewrites_when_rows_or_columns_move(new):
+    delta = compute_delta(frame(), new)
+    assert delta.full_rewrite == frame_to_rows(new)
+    assert compute_delta(None, new).full_rewrite == frame_to_rows(new)
+
+
+def test_apply_turns_the_sheet_into_the_new_frame():
+    conn = sheet()
+    new = pd.concat([frame(), frame([["P3_1", "A549", 3, "No"]])], ignore_index=True)
+    new.loc[[0, 2], "Inuse"] = ["Yes", "No"]
+    compute_delta(frame(), new).apply(conn.worksheets["S"])
+    assert grid(conn).equals(values_frame([HEADER] + frame_to_rows(new)))
+    assert conn.meter.calls["values.batchUpdate"] == 1 and conn.meter.calls["values.append"] == 1
+
+
+def test_merge_folds_later_edits_into_pending_appends():
+    base = frame()
+    first = pd.concat([base, frame([["P3_1", "A549", 3, "No"]])], ignore_index=True)
+    second = first.copy()
+    second.loc[[0, 3], "Inuse"] = "Yes"
+    merged = compute_delta(base, first).merge(compute_delta(first, second), second)
+    assert merged.cells == {(0, 3): "Yes"}
+    assert merged.append_rows == [["P3_1", "A549", 3, "Yes"]]
+    assert merged.base is base
+
+
+def test_rebase_follows_tube_ids_when_rows_moved():
+    base = frame()
+    new = base.copy()
+    new.loc[1, "Inuse"] = "Yes"
+    # 그 사이 다른 사람이 맨 위에 행을 넣고 P2_1 상태를 바꿈
+    current = frame([["P0_1", "A549", 0, "No"], ROWS[0], ROWS[1], ["P2_1", "A549", 2, "No"]])
+    out = rebase(base, new, current)
+    assert out["Tube ID"].tolist() == ["P0_1", "P1_1", "P1_2", "P2_1"]
+    assert out["Inuse"].tolist() == ["No", "No", "Yes", "No"]
+
+
+def test_rebase_appends_each_new_tube_once():
+    base = frame()
+    new = pd.concat([base, frame([["P3_1", "A549", 3, "No"]])], ignore_index=True)
+    once = rebase(base, new, base)
+    assert once["Tube ID"].tolist() == ["P1_1", "P1_2", "P2_1", "P3_1"]
+    assert rebase(base, new, once).equals(once)
+
+
+@pytest.mark.parametrize("current", [
+    frame([ROWS[0], ["P1_2", "A549", 1, "Thawed"], ROWS[2]]),  # same cell changed
+    frame([ROWS[0], ROWS[2]]),                                 # edited tube removed
+    frame([ROWS[0], ROWS[1], ROWS[1]]),                        # duplicated IDs
+])
+def test_rebase_refuses_to_overwrite(current):
+    new = frame()
+    new.loc[1, "Inuse"] = "Yes"
+    with pytest.raises(ConflictError):
+        rebase(frame(), new, current)
+
+
+def test_gsheet_save_lands_on_the_right_tube_after_a_concurrent_insert():
+    conn = sheet()
+    backend = GSheetBackend(conn)
+    frames.invalidate()
+    df = backend.load("S")
+    # 다른 사람이 시트 맨 위에 행을 끼워 넣음
+    conn.worksheets["S"].rows.insert(1, ["P0_1", "A549", "0", "No"])
+    conn._bump()
+    df.loc[df["Tube ID"] == "P1_2", "Inuse"] = "Yes"
+    assert write_queue.wait(backend._key("S"), backend.save(df, "S"), timeout=10)
+    out = grid(conn).set_index("Tube ID")["Inuse"]
+    assert out.to_dict() == {"P0_1": "No", "P1_1": "No", "P1_2": "Yes", "P2_1": "Yes"}
+
+
+def test_gsheet_save_conflict_fails_into_sync_status():
+    conn = sheet()
+    backend = GSheetBackend(conn)
+    frames.invalidate()
+    df = backend.load("S")
+    conn.worksheets["S"].rows[2][3] = "Thawed"
+    conn._bump()
+    df.loc[1, "Inuse"] = "Yes"
+    assert not write_queue.wait(backend._key("S"), backend.save(df, "S"), timeout=10)
+    assert "changed by someone else" in backend.sync_status("S").error
+    assert conn.worksheets["S"].rows[2][3] == "Thawed"
+    backend.discard_sync("S")
@@ -0,0 +1,52 @@
+import random
+import time
+
+import pandas as pd
+
+from celltracker.delta import frame_to_rows
+from celltracker.events import EventLog
+from celltracker.schema import append_rows, assign, coerce, to_storage
+from celltracker.storage import TUBE_COLUMNS
+
+
+def seed_rows(n=12):
+    rows = []
+    for i in range(n):
+        rows.append({"Tube ID": f"P1_{i}", "Cell Name": "A549", "Passage": 1 + i % 3, "Parent Tube": "",
+                     "Position": f"A{i + 1}", "Date": "2025-03-0{}".format(1 + i % 9), "Tray": "Tray-1",
+                     "Box": "Box-1", "Lot": "L1", "Mycoplasma": ["No", "", "Yes"][i % 3],
+                     "Operator": "", "Info": "", "Inuse": ["No", "", "Yes", "yes"][i % 4]})
+    return pd.DataFrame(rows, columns=TUBE_COLUMNS)
+
+
+def cells(df):
+    return [[str(v) for v in row] for row in frame_to_rows(df)]
+
+
+def test_replayed_states_match_what_was_stored(tmp_path):
+    log = EventLog(str(tmp_path / "history.db"), snapshot_every=1000)
+    df, report = coerce(seed_rows())
+    rng = random.Random(7)
+    # 같은 report로 저장을 이어 가면 손대지 않은 셀과 되돌린 셀은 원래 글자("", "yes")로 저장된다
+    log.record("A549", df, df, 0, 1, report)
+    stored = []
+    # 빈 칸/"yes"를 바꿨다가 되돌리는 경우부터
+    scripted = [([1, 3], "Inuse", False), ([1, 3], "Inuse", True), ([1], "Inuse", False), ([3], "Inuse", True),
+                ([1, 4], "Mycoplasma", True), ([1, 4], "Mycoplasma", False)]
+    for step in range(25):
+        rows = rng.sample(range(12), rng.randint(1, 3))
+        if step < len(scripted):
+            new = assign(df, *scripted[step])
+        elif step % 6 == 5:
+            new = append_rows(df, pd.DataFrame([{"Tube ID": f"N{step}", "Cell Name": "A549", "Passage": 2,
+                                                 "Inuse": "No"}]))
+        elif step % 3 == 0:
+            new = assign(df, rows, "Info", rng.choice(["", "thawed", "moved"]))
+        else:
+            new = assign(df, rows, rng.choice(["Inuse", "Mycoplasma"]), rng.random() < 0.5)
+        log.record("A549", df, new, step + 1, step + 2, report)
+        stored.append((time.time(), cells(to_storage(new, report))))
+        df = new
+        time.sleep(0.002)
+    mismatches = [i for i, (when, rows) in enumerate(stored) if cells(log.state("A549", when)) != rows]
+    assert mismatches == []
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_inventory
+from celltracker.core import Inventory
+from celltracker.rollups import Rollup
+from celltracker.schema import assign
+from celltracker.storage import SQLiteBackend
+
+
+def fill(rollup):
+    return rollup.box_fill().groupby(["Tray", "Box"], observed=True)["Tubes"].last().to_dict()
+
+
+def saved_rollup(inventory, df, report, monkeypatch):
+    """Save df and return the rollup after it, failing if the save made it recount the sheet."""
+    inventory.rollup("A549", inventory.version("A549"), inventory.snapshot("A549")[0])
+    monkeypatch.setattr(Rollup, "from_frame", lambda df: pytest.fail("rollup was rebuilt"))
+    inventory.save("A549", df, report)
+    new, _, version = inventory.snapshot("A549")
+    rollup = inventory.rollup("A549", version, new)
+    monkeypatch.undo()
+    return rollup, new
+
+
+def test_moving_a_tube_lowers_the_old_boxs_fill(tmp_path, monkeypatch):
+    storage = SQLiteBackend(str(tmp_path / "tubes.db"))
+    storage.save(synthetic_inventory(30), "A549")
+    inventory = Inventory(storage)
+    df, report, _ = inventory.snapshot("A549")
+    old = (df.at[0, "Tray"], df.at[0, "Box"])
+    start = fill(inventory.rollup("A549", inventory.version("A549"), df))
+
+    moved = assign(assign(df, np.array([0]), "Tray", "Tray-Z"), np.array([0]), "Box", "Box-Z")
+    rollup, new = saved_rollup(inventory, moved, report, monkeypatch)
+    assert fill(rollup)[old] == start[old] - 1
+    assert fill(rollup)[("Tray-Z", "Box-Z")] == 1
+    assert fill(rollup) == fill(Rollup.from_frame(new))
+
+
+def test_removed_rows_are_counted_out(tmp_path, monkeypatch):
+    storage = SQLiteBackend(str(tmp_path / "tubes.db"))
+    storage.save(synthetic_inventory(30), "A549")
+    inventory = Inventory(storage)
+    df, report, _ = inventory.snapshot("A549")
+
+    kept = df.drop(df.index[[3, 7]]).reset_index(drop=True)
+    kept = assign(kept, np.array([0]), "Inuse", True)
+    rollup, new = saved_rollup(inventory, kept, report, monkeypatch)
+    rebuilt = Rollup.from_frame(new)
+    assert rollup.total == rebuilt.total == 28 and rollup.in_use == rebuilt.in_use
+    assert fill(rollup) == fill(rebuilt) and rollup.passages == rebuilt.passages
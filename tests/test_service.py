@@ -0,0 +1,68 @@
+from http import HTTPStatus
+from pathlib import Path
+
+import pytest
+
+from benchmarks.synthetic import synthetic_inventory
+from celltracker.core import Inventory
+from celltracker.growth import GrowthTable
+from celltracker.service import Service
+from celltracker.storage import SQLiteBackend
+
+GROWTH_CSV = Path(__file__).resolve().parent.parent / "growth_rate_20220907.csv"
+
+
+@pytest.fixture
+def service(tmp_path):
+    storage = SQLiteBackend(str(tmp_path / "tubes.db"))
+    storage.save(synthetic_inventory(50), "A549")
+    return Service(Inventory(storage), GrowthTable.from_csv(str(GROWTH_CSV)))
+
+
+@pytest.mark.parametrize("field, value", [("Inuse", None), ("Inuse", {"a": 1}), ("Inuse", "maybe"),
+                                          ("Lot", [1, 2]), ("Info", float("nan"))])
+def test_patch_rejects_values_the_field_cannot_hold(service, field, value):
+    status, payload = service.handle("PATCH", "/sheets/A549/tubes", {},
+                                     {"ids": ["P1_1"], "field": field, "value": value})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert field in payload["error"]
+
+
+def test_patch_stores_numbers_as_text(service):
+    status, _ = service.handle("PATCH", "/sheets/A549/tubes", {}, {"ids": ["P1_1"], "field": "Lot", "value": 2024})
+    assert status == HTTPStatus.OK
+    df, _ = service.inventory.tubes("A549")
+    assert df.loc[df["Tube ID"] == "P1_1", "Lot"].tolist() == ["2024"]
+
+
+def test_register_flags_nested_values(service):
+    status, payload = service.handle("POST", "/sheets/A549/tubes", {},
+                                     {"tubes": [{"Tube ID": ["a"], "Cell Name": "A549"}]})
+    assert status == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert payload["issues"][0]["Problem"] == "not a single value"
+
+
+@pytest.mark.parametrize("method, path", [("GET", "/sheets/nope/tubes"), ("GET", "/sheets/nope/boxes"),
+                                          ("PATCH", "/sheets/nope/tubes"), ("GET", "/sheets/nope/lineage/P1_1")])
+def test_unknown_sheet_is_404(service, method, path):
+    status, payload = service.handle(method, path, {}, {"ids": ["P1_1"], "field": "Lot", "value": "x"})
+    assert status == HTTPStatus.NOT_FOUND
+    assert "nope" in payload["error"]
+
+
+def test_all_sheets_view_is_known(service):
+    status, payload = service.handle("GET", "/sheets/*/tubes", {"limit": "1"}, None)
+    assert status == HTTPStatus.OK and payload["total"] == 50
+
+
+def test_sorting_by_an_unknown_column_is_400(service):
+    status, payload = service.handle("GET", "/sheets/A549/tubes", {"sort": "Nope"}, None)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "Nope" in payload["error"]
+
+
+@pytest.mark.parametrize("path", ["/sheets/A549/tubes", "/history/activity"])
+def test_negative_limit_is_400(service, path):
+    status, payload = service.handle("GET", path, {"limit": "-3"}, None)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "limit" in payload["error"]
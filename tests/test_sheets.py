@@ -0,0 +1,48 @@
+import threading
+
+import requests
+from gspread.exceptions import APIError
+
+from celltracker.sheets import SheetsConnection
+
+
+def api_error(code):
+    response = requests.Response()
+    response.status_code = code
+    response._content = b'{"error": {"code": %d, "message": "expired", "status": "UNAUTHENTICATED"}}' % code
+    return APIError(response)
+
+
+class Credentials:
+    def __init__(self):
+        self.refreshed = 0
+
+    def refresh(self, request):
+        self.refreshed += 1
+
+
+class Spreadsheet:
+    def __init__(self, error=None):
+        self.error = error
+
+    def get_lastUpdateTime(self):
+        if self.error is not None:
+            raise self.error
+        return "2025-03-01T00:00:00Z"
+
+
+def test_revision_reconnects_once_after_an_expired_token(monkeypatch):
+    handles = [Spreadsheet(api_error(401)), Spreadsheet()]
+    conn = SheetsConnection.__new__(SheetsConnection)
+    conn._lock, conn._credentials = threading.RLock(), Credentials()
+    conn._client, conn._spreadsheet, conn._worksheets = None, None, {}
+
+    def spreadsheet(self):
+        # invalidate() 로 버린 핸들 대신 다음 것을 연다
+        if self._spreadsheet is None:
+            self._spreadsheet = handles.pop(0)
+        return self._spreadsheet
+
+    monkeypatch.setattr(SheetsConnection, "spreadsheet", property(spreadsheet))
+    assert conn.revision() == "2025-03-01T00:00:00Z"
+    assert conn._credentials.refreshed == 1 and not handles
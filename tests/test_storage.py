@@ -0,0 +1,71 @@
+import sqlite3
+
+import pandas as pd
+
+from celltracker import storage
+from celltracker.delta import compute_delta
+from celltracker.storage import SQLiteBackend
+
+HEADER = ["Tube ID", "Cell Name", "Passage", "Parent Tube", "Tray", "Box", "Inuse"]
+
+
+def frame(cell):
+    return pd.DataFrame([["P1_1", cell, 1, "", "T1", "B1", "No"],
+                         ["P2_1", cell, 2, "P1_1", "T1", "B1", "No"],
+                         ["P3_1", cell, 3, "P2_1", "T1", "B2", "No"]], columns=HEADER)
+
+
+def test_sqlite_queries_stay_within_one_sheet(tmp_path):
+    store = SQLiteBackend(str(tmp_path / "tubes.db"))
+    store.save(frame("A549"), "A549")
+    store.save(frame("U2OS").iloc[:2], "U2OS")
+    assert sorted(store.descendants("A549", "P1_1")) == ["P2_1", "P3_1"]
+    assert store.descendants("U2OS", "P1_1") == ["P2_1"]
+    assert store.descendants("nope", "P1_1") == []
+    assert store.occupancy("U2OS").to_dict("records") == [{"Tray": "T1", "Box": "B1", "Used": 2}]
+
+
+def test_sqlite_save_diffs_without_rereading_unless_another_writer_saved(tmp_path, monkeypatch):
+    path = str(tmp_path / "tubes.db")
+    store = SQLiteBackend(path)
+    store.save(frame("A549"), "A549")
+    df = store.load("A549")
+    reads, read_sql = [], pd.read_sql_query
+    monkeypatch.setattr(pd, "read_sql_query", lambda *a, **k: reads.append(1) or read_sql(*a, **k))
+    df.loc[0, "Inuse"] = "Yes"
+    store.save(df, "A549")
+    assert reads == [] and store.load("A549").equals(df)
+
+    other = SQLiteBackend(path).load("A549")
+    other.loc[1, "Inuse"] = "Yes"
+    SQLiteBackend(path).save(other, "A549")
+    reads.clear()
+    assert store.load("A549")["Inuse"].tolist() == ["Yes", "Yes", "No"]
+    assert reads
+
+
+def test_sqlite_save_holds_the_write_lock_while_diffing(tmp_path, monkeypatch):
+    path = str(tmp_path / "tubes.db")
+    store = SQLiteBackend(path)
+    store.save(frame("A549"), "A549")
+    df = store.load("A549")
+    df.loc[2, "Inuse"] = "Yes"
+    blocked = []
+
+    def diff_while_someone_reorders(base, new):
+        # 다른 프로세스가 비교와 쓰기 사이에 행 순서를 바꾸려 함
+        other = sqlite3.connect(path, timeout=0.1)
+        try:
+            other.execute("UPDATE tubes SET row_no = 2 - row_no")
+            other.commit()
+        except sqlite3.OperationalError as e:
+            blocked.append(str(e))
+        finally:
+            other.close()
+        return compute_delta(base, new)
+
+    monkeypatch.setattr(storage, "compute_delta", diff_while_someone_reorders)
+    store.save(df, "A549")
+    assert blocked and "locked" in blocked[0]
+    out = SQLiteBackend(path).load("A549")
+    assert out.set_index("Tube ID")["Inuse"].to_dict() == {"P1_1": "No", "P2_1": "No", "P3_1": "Yes"}
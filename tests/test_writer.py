@@ -0,0 +1,42 @@
+import requests
+
+from benchmarks.fake_sheets import FakeConnection
+from celltracker.cache import frames
+from celltracker.storage import GSheetBackend, values_frame
+from celltracker.writer import write_queue
+
+HEADER = ["Tube ID", "Cell Name", "Passage", "Inuse"]
+
+
+class TimeoutAfterAppend:
+    """Worksheet whose first append reaches the sheet but the client sees a timeout
+    (and the spreadsheet's modified time doesn't show it yet)."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.failed = False
+
+    def __getattr__(self, name):
+        return getattr(self.ws, name)
+
+    def append_rows(self, values, **kwargs):
+        if self.failed:
+            return self.ws.append_rows(values, **kwargs)
+        self.failed = True
+        self.ws.rows.extend(list(map(str, r)) for r in values)
+        raise requests.Timeout("read timed out")
+
+
+def test_retried_append_is_not_duplicated(monkeypatch):
+    monkeypatch.setattr(write_queue, "backoff_base", 0.01)
+    conn = FakeConnection({"S": [HEADER, ["P1_1", "A549", "1", "No"]]})
+    flaky = TimeoutAfterAppend(conn.worksheets["S"])
+    conn.worksheets["S"] = flaky
+    backend = GSheetBackend(conn)
+    frames.invalidate()
+    df = backend.load("S")
+    df.loc[len(df)] = ["P2_1", "A549", 2, "No"]
+    assert write_queue.wait(backend._key("S"), backend.save(df, "S"), timeout=10)
+    assert flaky.failed
+    out = values_frame(flaky.ws.get_all_values())
+    assert out["Tube ID"].tolist() == ["P1_1", "P2_1"]